@@ -0,0 +1 @@
+from simplespark.spark_session import session
@@ -1,14 +1,27 @@
 import os.path
+import shlex
+import time
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Callable
 
 from simplespark.environment.config import SimpleSparkConfig
+from simplespark.environment.image import file_sha256, read_image_manifest
 from simplespark.environment.tasks import (
-    BuildTask, SetupWorker, SetupDriver, SetupJavaBin, PrepareConfigFiles,
-    ConnectToHiveMetastore, SetupDelta, SetupActivateScript, SetupDriverJars
+    BuildTask, TaskPlan, SetupWorker, SetupDriver, SetupJavaBin, PrepareConfigFiles,
+    ConnectToHiveMetastore, SetupActivateScript, SetupDriverJars,
+    SetupHistoryServer, SetupThriftServer, SetupMetastoreServer, SetupPythonEnvironment, SetupAgentToken,
+    SetupRemoteShuffle, SetupEnvironmentJars
 )
+from simplespark.utils.buildstats import BuildStats
+from simplespark.utils.disks import format_size
 from simplespark.utils.ssh import SSHUtils
 
 
+# Packages installed from release archives into the libs folder
+COPYABLE_PACKAGES = ['java', 'scala', 'spark', 'hadoop', 'hive', 'celeborn']
+
+
 class Builder(ABC):
 
     def __init__(self, config: SimpleSparkConfig, host: str):
@@ -24,6 +37,9 @@ class Builder(ABC):
             task.run(self.config)
 
 
+    def plan(self, exists: Callable[[str], bool], stats: BuildStats) -> list[tuple[str, TaskPlan]]:
+        return [(task.name(), task.plan(self.config, exists, stats)) for task in self.generate_build_tasks()]
+
     @abstractmethod
     def generate_build_tasks(self) -> list[BuildTask]:
         pass
@@ -35,21 +51,36 @@ class Builder(ABC):
             SetupJavaBin('spark'),
             PrepareConfigFiles(self.host)
         ]
+        # Hadoop is installed on every host for its native libraries, not only for the metastore
+        if self.config.has_package('hadoop'):
+            tasks.insert(3, SetupJavaBin('hadoop'))
+        # Every host runs a Celeborn worker and executors need its Spark client jar
+        if self.config.uses_remote_shuffle():
+            tasks.insert(-1, SetupJavaBin('celeborn'))
+            tasks.append(SetupRemoteShuffle(self.host))
+        # Executors on every host load S3A and Delta jars from the same environment path
+        if self.config.uses_environment_jars():
+            tasks.append(SetupEnvironmentJars())
         return tasks
 
     def _generate_optional_tasks(self) -> list[BuildTask]:
 
         tasks = list()
 
-        package_names = [p.name for p in self.config.packages]
-
+        if self.config.uses_agent():
+            tasks.append(SetupAgentToken())
+        if self.config.python_environment:
+            tasks.append(SetupPythonEnvironment())
+        if self.config.driver.history_server:
+            tasks.append(SetupHistoryServer())
+        if self.config.driver.thrift_server:
+            tasks.append(SetupThriftServer())
+
+        if self.config.driver.metastore_server:
+            tasks.extend([SetupJavaBin('hive'), SetupMetastoreServer()])
         # FIXME do we need to install this on workers?
-        if self.config.metastore_config:
+        if self.config.uses_hive_metastore():
             tasks.append(ConnectToHiveMetastore())
-        # FIXME do we need to install this on workers?
-        if "delta" in package_names:
-            print("FOUND DELTA")
-            tasks.append(SetupDelta())
 
         return tasks
 
@@ -104,20 +135,22 @@ def build_home(config: SimpleSparkConfig):
         config.activate_script_directory,
         config.simplespark_bin_directory,
         config.simplespark_environment_directory,
-        config.simplespark_libs_directory
+        config.simplespark_libs_directory,
+        config.simplespark_downloads_directory,
+        config.simplespark_locks_directory
     ]
 
     for directory in create_dirs:
         if not os.path.exists(directory):
             print(f'Creating directory {directory}')
-            os.makedirs(directory)
+            os.makedirs(directory, exist_ok=True)
 
     with open(config.bash_profile_file, 'a') as f:
         f.write(f"\nexport SIMPLESPARK_HOME={config.simplespark_home}")
         f.write(f"\nexport PATH=$PATH:{config.activate_script_directory}")
 
 
-def build_environment(config: SimpleSparkConfig):
+def build_environment(config: SimpleSparkConfig, image: str = None):
 
     if config.mode == 'local':
         builder = LocalBuilder(config, 'localhost')
@@ -134,13 +167,142 @@ def build_environment(config: SimpleSparkConfig):
 
         for worker_host in worker_hosts:
             print(f'Building worker over SSH: {worker_host}')
-            build_worker_via_ssh(config, worker_host)
+            build_worker_via_ssh(config, worker_host, image=image)
 
     else:
 
         raise Exception(f'Unknown setup type: {config.mode}')
 
 
+@dataclass
+class HostPlan:
+    host: str
+    role: str
+    steps: list[tuple[str, TaskPlan]] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+
+    def estimate_seconds(self, stats: BuildStats) -> float:
+        return sum(step.estimate_seconds(stats) for _, step in self.steps if step.will_run)
+
+
+def _check_full_rebuild(config: SimpleSparkConfig, host_plan: HostPlan, exists: Callable[[str], bool]):
+    """Warn when a host that already has packages installed would reinstall every one of them"""
+
+    package_steps = [step for name, step in host_plan.steps if name.startswith("setup-") and name.endswith("-bin")]
+    if package_steps and all(step.will_run for step in package_steps) and exists(config.simplespark_libs_directory):
+        host_plan.warnings.append("every package reinstalled, check package versions in config")
+
+
+def plan_build(config: SimpleSparkConfig, image: str = None) -> list[HostPlan]:
+    """
+    Work `build_environment` would do on the driver and each worker, without modifying anything.
+
+    Worker paths are checked over SSH. Sizes come from recorded builds or HEAD requests.
+    """
+
+    stats = BuildStats(config.build_stats_path)
+
+    image_paths, image_size = [], 0
+    if image:
+        image_paths = [f"{config.simplespark_home}/{p}" for p in read_image_manifest(image)["paths"]]
+        image_size = os.path.getsize(image)
+
+    def with_image(exists: Callable[[str], bool]) -> Callable[[str], bool]:
+        # Paths shipped in the image count as installed once the import step ran
+        return lambda path: exists(path) or any(path == p or path.startswith(f"{p}/") for p in image_paths)
+
+    if config.mode == 'local':
+        driver_builder = LocalBuilder(config, 'localhost')
+    elif config.mode == 'standalone':
+        driver_builder = StandaloneDriverBuilder(config, config.driver.host)
+    else:
+        raise Exception(f'Unknown setup type: {config.mode}')
+
+    driver_plan = HostPlan(config.driver.host, "driver")
+    if image:
+        driver_plan.steps.append(("import-image", TaskPlan(True, f"import {image}", extract_bytes=image_size)))
+    driver_plan.steps += driver_builder.plan(with_image(os.path.exists), stats)
+    _check_full_rebuild(config, driver_plan, os.path.exists)
+    host_plans = [driver_plan]
+
+    if config.mode != 'standalone':
+        return host_plans
+
+    for host in [w.host for w in config.workers if w.host != config.driver.host]:
+
+        host_plan = HostPlan(host, "worker")
+        host_plans.append(host_plan)
+
+        try:
+            ssh = SSHUtils(host)
+        except Exception as e:
+            host_plan.warnings.append(f"unreachable over SSH: {e}")
+            continue
+
+        def remote_exists(path: str) -> bool:
+            stdin, stdout, stderr = ssh.run(f"test -e {shlex.quote(path)}")
+            return stdout.channel.recv_exit_status() == 0
+
+        try:
+            exists = with_image(remote_exists)
+            host_plan.steps.append(("copy-config", TaskPlan(True, "copy config.json")))
+
+            if image:
+                host_plan.steps.append(("stream-image", TaskPlan(True, f"stream {image}", transfer_bytes=image_size,
+                                                                 extract_bytes=image_size)))
+
+            if config.python_environment:
+                if exists(f"{config.python_environment_directory}/.complete"):
+                    step = TaskPlan(False, "Python environment staged")
+                elif os.path.exists(config.python_environment_archive):
+                    archive_size = os.path.getsize(config.python_environment_archive)
+                    step = TaskPlan(True, f"copy {config.python_environment_archive}", transfer_bytes=archive_size,
+                                    extract_bytes=archive_size)
+                else:
+                    step = TaskPlan(True, "copy Python environment built on driver", unknown_size=True)
+                host_plan.steps.append(("stage-python-environment", step))
+
+            host_plan.steps += StandaloneWorkerBuilder(config, host).plan(exists, stats)
+            _check_full_rebuild(config, host_plan, remote_exists)
+        finally:
+            ssh.close()
+
+    return host_plans
+
+
+def format_build_plan(host_plans: list[HostPlan], stats: BuildStats) -> str:
+
+    lines = []
+    total_seconds, unknown = 0.0, False
+
+    for host_plan in host_plans:
+
+        lines.append(f"{host_plan.host} ({host_plan.role})")
+        for name, step in host_plan.steps:
+            lines.append(f"  {'run ' if step.will_run else 'skip'}  {name:32}  {step.detail}"
+                         + (f" ({format_size(step.download_bytes)})" if step.download_bytes else ""))
+
+        running = [step for _, step in host_plan.steps if step.will_run]
+        host_unknown = any(step.unknown_size for step in running)
+        seconds = host_plan.estimate_seconds(stats)
+        lines.append(f"  {len(running)} run, {len(host_plan.steps) - len(running)} skipped, "
+                     f"download {format_size(sum(s.download_bytes for s in running))}, "
+                     f"transfer {format_size(sum(s.transfer_bytes for s in running))}, "
+                     f"estimated {seconds:.0f}s{'+' if host_unknown else ''}")
+        for warning in host_plan.warnings:
+            lines.append(f"  WARNING: {warning}")
+
+        total_seconds += seconds
+        unknown = unknown or host_unknown
+
+    # Workers are built one after another, so host estimates add up
+    lines.append(f"Estimated build time {total_seconds:.0f}s{'+' if unknown else ''} "
+                 f"(download {format_size(stats.bytes_per_second('download'))}/s, "
+                 f"transfer {format_size(stats.bytes_per_second('transfer'))}/s)")
+
+    return "\n".join(lines)
+
+
 def build_worker(config: SimpleSparkConfig, host: str):
 
     if config.mode == 'standalone':
@@ -149,7 +311,7 @@ def build_worker(config: SimpleSparkConfig, host: str):
         raise RuntimeError(f'Unsupported setup_type: {config.mode}')
 
 
-def build_worker_via_ssh(config: SimpleSparkConfig, host: str):
+def build_worker_via_ssh(config: SimpleSparkConfig, host: str, copy_packages: bool = False, image: str = None):
 
     ssh = SSHUtils(host)
 
@@ -170,27 +332,86 @@ def build_worker_via_ssh(config: SimpleSparkConfig, host: str):
     #
     # simplespark_binary_call = f"{config.simplespark_bin_directory}/{binary_download.split('/')[-1]}"
 
+    # Installed image provides package homes and python environment, worker build then only renders configs.
+    # Streamed before config.json is copied, the image's copy of config.json is older than the driver's
+    if image:
+        stream_image_via_ssh(config, ssh, image)
+
     # Copy over config json from driver to worker
     environment_directory = f"{config.simplespark_environment_directory}/{config.name}"
     ssh.create_directory(config.simplespark_environment_directory)
     ssh.create_directory(environment_directory)
     ssh.copy(config.simplespark_config_file_path, config.simplespark_config_file_path)
-
-    # Copy over packages from driver to worker
-    # ssh.create_directory(config.simplespark_libs_directory)
-    # for package in config.packages:
-    #     package_path = config.get_package_home_directory(package.name)
-    #     if os.path.exists(package_path):
-    #         ssh.create_directory(f"{config.simplespark_libs_directory}/{package.name}")
-    #         package_directory = config.get_package_home_directory(package.name)
-    #         print(f'Copying over {package} to {package_directory}')
-    #         ssh.copy_directory(package_directory, package_directory)
-    #     else:
-    #         print(f'Skipping, package {package.name}:{package.version} does not exist in libs folder')
+    if config.has_object_store_keys():
+        ssh.sftp.chmod(config.simplespark_config_file_path, 0o600)
+
+    if config.uses_agent():
+        ssh.copy(config.agent_token_path, config.agent_token_path)
+        ssh.sftp.chmod(config.agent_token_path, 0o600)
+
+    # Copy over packages from driver to worker so the worker build skips downloads
+    if copy_packages:
+        for package in config.packages:
+            if package.name not in COPYABLE_PACKAGES:
+                continue
+            package_directory = config.get_package_home_directory(package.name)
+            if not os.path.exists(package_directory):
+                print(f'Skipping, package {package.name}:{package.version} does not exist in libs folder')
+            elif ssh.directory_exists(package_directory):
+                print(f'Package {package.name}:{package.version} already on {host}')
+            else:
+                print(f'Copying over {package.name}:{package.version} to {package_directory}')
+                ssh.copy_directory_archive(package_directory, package_directory)
+
+    if config.python_environment:
+        stage_python_environment_via_ssh(config, ssh)
 
     # Run build `worker` command on machine
     stdin, stdout, stderr = ssh.run(f'. {config.bash_profile_file}; '
                                     f'simplespark worker {config.simplespark_config_file_path} {host}')
 
     print(stdout.readlines())
-    print(stderr.readlines())
\ No newline at end of file
+    print(stderr.readlines())
+
+
+def stream_image_via_ssh(config: SimpleSparkConfig, ssh: SSHUtils, image: str):
+    """Pipe image archive into `simplespark image import -` on host, no copy of the archive is stored remotely"""
+
+    print(f"Streaming image {image} to {ssh.host}")
+    started = time.monotonic()
+    stdin, stdout, stderr = ssh.run(f'. {config.bash_profile_file}; '
+                                    f'simplespark image import - --simplespark-home {config.simplespark_home} '
+                                    f'--checksum {file_sha256(image)}')
+
+    with open(image, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            stdin.write(chunk)
+    stdin.channel.shutdown_write()
+
+    if stdout.channel.recv_exit_status() != 0:
+        raise Exception(f"Failed to import image on {ssh.host}: {stderr.read().decode()}")
+    BuildStats.record(config.build_stats_path, "transfer", os.path.getsize(image), time.monotonic() - started)
+
+
+def stage_python_environment_via_ssh(config: SimpleSparkConfig, ssh: SSHUtils):
+
+    environment_directory = config.python_environment_directory
+
+    if ssh.file_exists(f"{environment_directory}/.complete"):
+        print(f"Python environment already staged on {ssh.host}")
+        return
+
+    print(f"Staging Python environment on {ssh.host} at {environment_directory}")
+    started = time.monotonic()
+    ssh.run(f"rm -rf {environment_directory}")[1].channel.recv_exit_status()
+    ssh.copy_archive(config.python_environment_archive, os.path.dirname(environment_directory))
+    # `copy_archive` raises unless tar exited 0, so the marker only exists for complete extracts
+    ssh.run(f"touch {environment_directory}/.complete")[1].channel.recv_exit_status()
+    BuildStats.record(config.build_stats_path, "transfer", os.path.getsize(config.python_environment_archive),
+                      time.monotonic() - started)
+
+    # Environment links to the base interpreter, which must exist at the same path on every host
+    stdin, stdout, stderr = ssh.run(f"{config.pyspark_python} --version")
+    if stdout.channel.recv_exit_status() != 0:
+        raise Exception(f"Staged Python environment does not run on {ssh.host}, "
+                        f"`{config.python_environment.python}` must be installed: {stderr.read().decode()}")
@@ -1,3 +1,5 @@
+import hashlib
+import itertools
 import os
 from dataclasses import dataclass, asdict
 import json
@@ -10,24 +12,210 @@ class DriverConfig:
     cores: int = None
     driver_memory: str = None
     executor_memory: str = None
+    executor_cores: int = None
     connect_server: bool = False
-    # history_server: bool = False
+    history_server: bool = False
+    metastore_server: bool = False
     thrift_server: bool = False
 
 
+@dataclass
+class DynamicAllocationConfig:
+    enabled: bool = True
+    min_executors: int = 0
+    max_executors: int = None
+    initial_executors: int = None
+    executor_idle_timeout: str = "60s"
+    cached_executor_idle_timeout: str = None
+    scheduler_backlog_timeout: str = "1s"
+    shuffle_tracking: bool = False
+    external_shuffle_service: bool = True
+    shuffle_service_port: int = 7337
+
+
+@dataclass
+class DecommissionConfig:
+    enabled: bool = True
+    shuffle_blocks: bool = True
+    rdd_blocks: bool = True
+    fallback_storage_path: str = None
+
+
+@dataclass
+class RemoteShuffleConfig:
+    enabled: bool = True
+    push_based: bool = False
+    master_port: int = 9097
+    master_memory: str = "1g"
+    worker_memory: str = "1g"
+    worker_offheap_memory: str = "4g"
+    replicate: bool = False
+    storage_dirs: List[str] = None
+
+
+@dataclass
+class ObjectStoreConfig:
+    endpoint: str = None
+    region: str = None
+    access_key: str = None
+    secret_key: str = None
+    credentials_provider: str = None
+    path_style_access: bool = False
+    ssl_enabled: bool = True
+    committer: str = "magic"
+    conflict_mode: str = "append"
+    fast_upload_buffer: str = "disk"
+    fast_upload_active_blocks: int = 4
+    max_connections: int = 200
+    max_threads: int = 64
+    multipart_size: str = "128M"
+    multipart_threshold: str = "256M"
+    hadoop_aws_version: str = None
+    aws_sdk_version: str = None
+
+
+@dataclass
+class DeltaConfig:
+    optimize_write: bool = True
+    auto_compact: bool = True
+    num_indexed_cols: int = None
+    checkpoint_interval: int = None
+    tables: List[str] = None
+    zorder_by: Dict[str, List[str]] = None
+    vacuum_retention_hours: int = 168
+    schedule: str = None
+
+
+@dataclass
+class AgentConfig:
+    enabled: bool = True
+    port: int = 7380
+    bind_host: str = "127.0.0.1"
+    tunnel: bool = True
+
+
+@dataclass
+class JvmConfig:
+    presets: bool = True
+    gc: str = None
+    driver_java_options: str = None
+    executor_java_options: str = None
+
+
+@dataclass
+class HistoryServerConfig:
+    event_log_dir: str = None
+    compression_codec: str = "zstd"
+    rolling_enabled: bool = True
+    rolling_max_file_size: str = "128m"
+    max_files_to_retain: int = 10
+    store_path: str = None
+    store_max_disk_usage: str = "10g"
+    hybrid_store_enabled: bool = False
+    cleaner_enabled: bool = True
+    cleaner_interval: str = "1d"
+    cleaner_max_age: str = "7d"
+    cleaner_max_num: int = None
+    update_interval: str = "10s"
+    ui_port: int = 18080
+
+
+@dataclass
+class ThriftServerConfig:
+    port: int = 10000
+    driver_memory: str = None
+    incremental_collect: bool = True
+    fair_scheduler: bool = True
+    scheduler_pool: str = "thriftserver"
+    pool_weight: int = 1
+    pool_min_share: int = 0
+    min_worker_threads: int = 5
+    max_worker_threads: int = 100
+    session_check_interval: str = "15m"
+    idle_session_timeout: str = "1h"
+    idle_operation_timeout: str = "30m"
+    retained_sessions: int = 200
+    retained_statements: int = 200
+    cached_tables: List[str] = None
+    session_pools: List[str] = None
+
+
+@dataclass
+class MetastoreServerConfig:
+    port: int = 9083
+    connection_pool: str = "HikariCP"
+    max_pool_size: int = 10
+    min_server_threads: int = 200
+    max_server_threads: int = 1000
+    cached_store: bool = False
+    aggregate_stats_cache: bool = True
+    heap_size_mb: int = None
+    client_partition_cache_size: str = "250m"
+    client_metadata_cache_ttl_seconds: int = 3600
+
+
+# Spark minor version each Delta Lake minor release is built for
+DELTA_SPARK_VERSIONS: dict[tuple[int, int], tuple[int, int]] = {
+    (1, 0): (3, 1), (1, 1): (3, 2), (1, 2): (3, 2), (2, 0): (3, 2), (2, 1): (3, 3), (2, 2): (3, 3),
+    (2, 3): (3, 3), (2, 4): (3, 4), (3, 0): (3, 5), (3, 1): (3, 5), (3, 2): (3, 5), (3, 3): (3, 5),
+    (4, 0): (4, 0),
+}
+
+
+def parse_version(version: str) -> tuple[int, ...]:
+    """Numeric prefix of a version string, `3.5.5` -> (3, 5, 5), `2.13.11-RC1` -> (2, 13, 11)"""
+
+    parts = []
+    for part in version.split('.'):
+        digits = ''.join(itertools.takewhile(str.isdigit, part))
+        if not digits:
+            break
+        parts.append(int(digits))
+        if len(digits) != len(part):
+            break
+
+    return tuple(parts)
+
+
+# Java major versions supported by each Spark minor line
+SPARK_JAVA_VERSIONS: dict[tuple[int, int], set[int]] = {
+    (3, 0): {8, 11}, (3, 1): {8, 11}, (3, 2): {8, 11},
+    (3, 3): {8, 11, 17}, (3, 4): {8, 11, 17},
+    (3, 5): {8, 11, 17, 21},
+    (4, 0): {17, 21}, (4, 1): {17, 21},
+}
+
+# Oldest Scala patch release running on each Java major version
+SCALA_MIN_JAVA_VERSIONS: dict[tuple[int, int], dict[int, tuple[int, ...]]] = {
+    (2, 12): {11: (2, 12, 4), 17: (2, 12, 15), 21: (2, 12, 18)},
+    (2, 13): {11: (2, 13, 0), 17: (2, 13, 6), 21: (2, 13, 11)},
+}
+
+
 @dataclass
 class PackageConfig:
     name: str
     version: str
 
+    @property
+    def java_major_version(self) -> int:
+        """Temurin versions are `8u442-b06` for JDK 8 and `17.0.14+7` style from JDK 11"""
+        return int(self.version.split('u')[0]) if 'u' in self.version else parse_version(self.version)[0]
+
     @property
     def package_file_name(self) -> str:
 
+        java_major_version = self.java_major_version if self.name == "java" else None
+
         NAME_MAP = {
-            "java": f"OpenJDK8U-jdk_x64_linux_hotspot_"
-                    f"{self.version.replace('+', '_').replace('-', '')}.tar.gz",
+            "java": f"OpenJDK8U-jdk_x64_linux_hotspot_{self.version.replace('+', '_').replace('-', '')}.tar.gz"
+                    if java_major_version == 8 else
+                    f"OpenJDK{java_major_version}U-jdk_x64_linux_hotspot_{self.version.replace('+', '_')}.tar.gz",
             "scala": f"scala-{self.version}.tgz",
-            "spark": f"spark-{self.version}-bin-hadoop3.tgz"
+            "spark": f"spark-{self.version}-bin-hadoop3.tgz",
+            "hadoop": f"hadoop-{self.version}.tar.gz",
+            "hive": f"hive-standalone-metastore-{self.version}-bin.tar.gz",
+            "celeborn": f"apache-celeborn-{self.version}-bin.tgz",
         }
 
         package_file_name = NAME_MAP.get(self.name)
@@ -38,11 +226,16 @@ class PackageConfig:
     @property
     def package_releases_url(self) -> str:
 
+        java_major_version = self.java_major_version if self.name == "java" else None
+
         URL_MAP: dict[str, str] = {
-            "java": "https://github.com/adoptium/temurin8-binaries/releases/download",
+            "java": f"https://github.com/adoptium/temurin{java_major_version}-binaries/releases/download",
             "scala": "https://downloads.lightbend.com/scala",
             "spark": "https://downloads.apache.org/spark",
             # "spark": f"https://archive.apache.org/dist/spark/",
+            "hadoop": "https://archive.apache.org/dist/hadoop/common",
+            "hive": "https://archive.apache.org/dist/hive",
+            "celeborn": "https://archive.apache.org/dist/celeborn",
         }
 
         package_releases_url = URL_MAP.get(self.name)
@@ -54,10 +247,15 @@ class PackageConfig:
     @property
     def package_version_directory(self) -> str:
 
+        java_major_version = self.java_major_version if self.name == "java" else None
+
         DIRECTORY_MAP: dict[str, str] = {
-            "java": f"jdk{self.version.replace('+', '%2B')}",
+            "java": f"jdk{self.version}" if java_major_version == 8 else f"jdk-{self.version.replace('+', '%2B')}",
             "scala": self.version,
             "spark": f"spark-{self.version}",
+            "hadoop": f"hadoop-{self.version}",
+            "hive": f"hive-standalone-metastore-{self.version}",
+            "celeborn": f"celeborn-{self.version}",
         }
 
         package_version_directory = DIRECTORY_MAP.get(self.name)
@@ -76,6 +274,11 @@ class WorkerConfig:
     cores: int = None
     memory: str = None
     instances: int = None
+    local_dirs: List[str] = None
+    discover_local_dirs: bool = False
+    tmpfs_local_dir: bool = False
+    min_local_dir_free_space: str = None
+    excluded: bool = False
 
 
 @dataclass
@@ -87,6 +290,18 @@ class MavenConfig:
     jdbc_prefix: str = ""
 
 
+# AWS SDK each `hadoop-aws` release was built against, Hadoop 3.4 moved to the v2 SDK bundle
+HADOOP_AWS_SDK_BUNDLES: dict[str, MavenConfig] = {
+    "3.3.1": MavenConfig("com.amazonaws", "aws-java-sdk-bundle", "1.11.901"),
+    "3.3.2": MavenConfig("com.amazonaws", "aws-java-sdk-bundle", "1.11.1026"),
+    "3.3.4": MavenConfig("com.amazonaws", "aws-java-sdk-bundle", "1.12.262"),
+    "3.3.5": MavenConfig("com.amazonaws", "aws-java-sdk-bundle", "1.12.316"),
+    "3.3.6": MavenConfig("com.amazonaws", "aws-java-sdk-bundle", "1.12.367"),
+    "3.4.0": MavenConfig("software.amazon.awssdk", "bundle", "2.23.19"),
+    "3.4.1": MavenConfig("software.amazon.awssdk", "bundle", "2.24.6"),
+}
+
+
 @dataclass
 class JdbcConfig:
     config_name: str
@@ -96,10 +311,33 @@ class JdbcConfig:
     db_user: str
     db_pass: str
 
+    @property
+    def db_type(self) -> str:
+        # Hive schema tool names differ from JDBC URL prefixes for some databases
+        DB_TYPE_MAP = {"postgresql": "postgres", "sqlserver": "mssql"}
+        return DB_TYPE_MAP.get(self.db_connector.jdbc_prefix, self.db_connector.jdbc_prefix)
+
+    @property
+    def jdbc_driver(self) -> str:
+        return self.db_connector.driver
+
     def get_url(self, database = '') -> str:
         return f"jdbc:{self.db_connector.jdbc_prefix}://{self.db_host}:{self.db_port}/{database}"
 
 
+@dataclass
+class PythonEnvironmentConfig:
+    lockfile: str
+    python: str = "python3"
+    lock_hash: str = None
+
+    def __post_init__(self):
+        # Lockfile only exists on the build host, workers use the hash stored in config.json
+        if os.path.exists(self.lockfile):
+            with open(self.lockfile, 'rb') as f:
+                self.lock_hash = hashlib.sha256(self.python.encode() + f.read()).hexdigest()[:16]
+
+
 @dataclass
 class SimpleSparkConfig:
     name: str
@@ -108,14 +346,69 @@ class SimpleSparkConfig:
     mode: str
     packages: List[PackageConfig]
     driver: DriverConfig
+    daemonless: bool = False
     derby_path: str = None
     warehouse_path: str = None
     metastore_config: JdbcConfig = None
+    history_config: HistoryServerConfig = None
+    thrift_config: ThriftServerConfig = None
+    metastore_server_config: MetastoreServerConfig = None
+    dynamic_allocation: DynamicAllocationConfig = None
+    decommission: DecommissionConfig = None
+    python_environment: PythonEnvironmentConfig = None
+    jvm: JvmConfig = None
+    remote_shuffle: RemoteShuffleConfig = None
+    object_store: ObjectStoreConfig = None
+    delta: DeltaConfig = None
+    agent: AgentConfig = None
     workers: List[WorkerConfig] = None
     jdbc_drivers: Dict[str, MavenConfig] = None
 
     def __post_init__(self):
         self._package_map: dict[str, PackageConfig] = {p.name: p for p in self.packages}
+        if self.daemonless and self.mode != 'local':
+            raise Exception(f"`daemonless` only supported in local mode, not {self.mode}")
+        if self.driver.history_server and self.history_config is None:
+            self.history_config = HistoryServerConfig()
+        if self.driver.thrift_server and self.thrift_config is None:
+            self.thrift_config = ThriftServerConfig()
+        if self.driver.metastore_server:
+            if self.metastore_server_config is None:
+                self.metastore_server_config = MetastoreServerConfig()
+            # Metastore server runs from the Hive package on top of Hadoop's client libraries
+            missing = [p for p in ('hive', 'hadoop') if not self.has_package(p)]
+            if missing:
+                names = " and ".join(f"`{p}`" for p in missing)
+                raise Exception(f"`metastore_server` requires the {names} package{'s' if len(missing) > 1 else ''}")
+        if self.has_package('java'):
+            self.check_java_compatibility()
+        if self.remote_shuffle and self.remote_shuffle.push_based:
+            raise Exception("Spark's native push-based shuffle only runs on YARN, "
+                            "use `remote_shuffle` with the `celeborn` package for standalone clusters")
+        if self.uses_remote_shuffle() and not self.has_package('celeborn'):
+            raise Exception("`remote_shuffle` requires the `celeborn` package")
+        # Celeborn replaces the external shuffle service, both enabled would route shuffle to two services
+        if self.uses_remote_shuffle() and self.uses_external_shuffle_service():
+            print("Disabling external shuffle service, shuffle data is served by Celeborn")
+            self.dynamic_allocation.external_shuffle_service = False
+        # Spark refuses to start more than one worker per host with the shuffle service enabled
+        if self.uses_external_shuffle_service() and any((w.instances or 1) > 1 for w in self.workers or []):
+            print("WARNING: External shuffle service does not support multiple worker instances per host, "
+                  "using `shuffle_tracking` instead")
+            self.dynamic_allocation.external_shuffle_service = False
+            self.dynamic_allocation.shuffle_tracking = True
+        if self.has_package('delta'):
+            if self.delta is None:
+                self.delta = DeltaConfig()
+            self.check_delta_compatibility()
+        elif self.delta is not None:
+            raise Exception("`delta` config requires the `delta` package")
+        if self.object_store:
+            if self.object_store.committer not in ("magic", "directory", "partitioned"):
+                raise Exception(f"Unknown S3A committer {self.object_store.committer}, "
+                                "options: magic, directory, partitioned")
+            if (self.object_store.access_key is None) != (self.object_store.secret_key is None):
+                raise Exception("Set both `object_store.access_key` and `secret_key`, or neither")
 
     def __str__(self) -> str:
 
@@ -145,6 +438,17 @@ class SimpleSparkConfig:
             'packages': lambda c: [PackageConfig(**p) for p in c['packages']],
             'workers': lambda c: [WorkerConfig(**w) for w in c['workers']],
             'metastore_config': lambda c: JdbcConfig(**c['metastore_config']),
+            'history_config': lambda c: HistoryServerConfig(**c['history_config']),
+            'thrift_config': lambda c: ThriftServerConfig(**c['thrift_config']),
+            'metastore_server_config': lambda c: MetastoreServerConfig(**c['metastore_server_config']),
+            'dynamic_allocation': lambda c: DynamicAllocationConfig(**c['dynamic_allocation']),
+            'decommission': lambda c: DecommissionConfig(**c['decommission']),
+            'jvm': lambda c: JvmConfig(**c['jvm']),
+            'remote_shuffle': lambda c: RemoteShuffleConfig(**c['remote_shuffle']),
+            'object_store': lambda c: ObjectStoreConfig(**c['object_store']),
+            'delta': lambda c: DeltaConfig(**c['delta']),
+            'python_environment': lambda c: PythonEnvironmentConfig(**c['python_environment']),
+            'agent': lambda c: AgentConfig(**c['agent']),
             'jdbc_drivers': lambda c: {k: MavenConfig(**v) for k, v in c['jdbc_drivers'].items()}
         }
 
@@ -179,10 +483,83 @@ class SimpleSparkConfig:
     def activate_script_path(self) -> str:
         return f"{self.activate_script_directory}/{self.name}.spark"
 
+    @property
+    def agent_token_path(self) -> str:
+        return f"{self.simplespark_environment_directory}/{self.name}/agent.token"
+
+    @property
+    def build_stats_path(self) -> str:
+        return f"{self.simplespark_home}/build-stats.json"
+
+    @property
+    def celeborn_conf_directory(self) -> str:
+        return f"{self.simplespark_environment_directory}/{self.name}/celeborn-conf"
+
+    @property
+    def celeborn_master_endpoint(self) -> str:
+        return f"{self.driver.host}:{self.remote_shuffle.master_port}"
+
+    @property
+    def collected_logs_directory(self) -> str:
+        return f"{self.simplespark_environment_directory}/{self.name}/logs"
+
+    @property
+    def environment_jars_directory(self) -> str:
+        return f"{self.simplespark_environment_directory}/{self.name}/jars"
+
+    @property
+    def event_log_directory(self) -> str:
+        if self.history_config and self.history_config.event_log_dir:
+            return self.history_config.event_log_dir
+        return f"{self.simplespark_environment_directory}/{self.name}/event-logs"
+
+    @property
+    def history_store_directory(self) -> str:
+        if self.history_config and self.history_config.store_path:
+            return self.history_config.store_path
+        return f"{self.simplespark_environment_directory}/{self.name}/history-store"
+
     @property
     def hive_config_path(self) -> str:
         return f"{self.spark_conf_directory}/hive-site.xml"
 
+    @property
+    def metastore_conf_directory(self) -> str:
+        return f"{self.simplespark_environment_directory}/{self.name}/metastore-conf"
+
+    @property
+    def metastore_derby_url(self) -> str:
+        derby_home = self.derby_path or f"{self.simplespark_environment_directory}/{self.name}"
+        return f"jdbc:derby:;databaseName={derby_home}/metastore_db;create=true"
+
+    @property
+    def metastore_uri(self) -> str:
+        return f"thrift://{self.driver.host}:{self.metastore_server_config.port}"
+
+    @property
+    def python_environment_archive(self) -> str:
+        return f"{self.python_environment_directory}.tar.gz"
+
+    @property
+    def python_environment_directory(self) -> str:
+        return f"{self.simplespark_home}/pyenvs/{self.python_environment.lock_hash}"
+
+    @property
+    def pyspark_python(self) -> str:
+        return f"{self.python_environment_directory}/bin/python"
+
+    @property
+    def probe_results_path(self) -> str:
+        return f"{self.simplespark_environment_directory}/{self.name}/probe-results.json"
+
+    @property
+    def runs_database_path(self) -> str:
+        return f"{self.simplespark_home}/runs.db"
+
+    @property
+    def run_directory(self) -> str:
+        return f"{self.simplespark_environment_directory}/{self.name}/run"
+
     @property
     def simplespark_bin_directory(self) -> str:
         return f"{self.simplespark_home}/bin"
@@ -191,6 +568,10 @@ class SimpleSparkConfig:
     def simplespark_config_file_path(self) -> str:
         return f"{self.simplespark_environment_directory}/{self.name}/config.json"
 
+    @property
+    def simplespark_downloads_directory(self) -> str:
+        return f"{self.simplespark_home}/downloads"
+
     @property
     def simplespark_environment_directory(self) -> str:
         return f"{self.simplespark_home}/environments"
@@ -199,10 +580,18 @@ class SimpleSparkConfig:
     def simplespark_libs_directory(self) -> str:
         return f"{self.simplespark_home}/libs"
 
+    @property
+    def simplespark_locks_directory(self) -> str:
+        return f"{self.simplespark_home}/locks"
+
     @property
     def spark_home(self) -> str:
         return self.get_package_home_directory('spark')
 
+    @property
+    def hadoop_native_library_directory(self) -> str:
+        return f"{self.get_package_home_directory('hadoop')}/lib/native"
+
     @property
     def spark_conf_directory(self) -> str:
         return f"{self.simplespark_environment_directory}/{self.name}/conf"
@@ -215,14 +604,56 @@ class SimpleSparkConfig:
     def spark_env_sh_path(self) -> str:
         return f"{self.spark_conf_directory}/spark-env.sh"
 
+    @property
+    def spark_connect_port(self) -> int:
+        return 15002
+
+    @property
+    def spark_connect_url(self) -> str:
+        return f"sc://{self.driver.host}:{self.spark_connect_port}"
+
     @property
     def spark_jars_path(self) -> str:
         return f"{self.spark_home}/jars"
 
+    @property
+    def fair_scheduler_file_path(self) -> str:
+        return f"{self.spark_conf_directory}/fairscheduler.xml"
+
+    @property
+    def thrift_server_args_path(self) -> str:
+        return f"{self.spark_conf_directory}/thriftserver.args"
+
+    @property
+    def thrift_jdbc_url(self) -> str:
+        return f"jdbc:hive2://{self.driver.host}:{self.thrift_config.port}/default"
+
+    def get_thrift_session_url(self, pool: str) -> str:
+        """JDBC URL whose session runs its queries in scheduler `pool` instead of the shared default pool"""
+        return f"{self.thrift_jdbc_url}?spark.sql.thriftserver.scheduler.pool={pool}"
+
+    @property
+    def local_master(self) -> str:
+        """In-process `local[N,F]` master sized from the local worker config with standalone task retries"""
+
+        worker_config = self.get_worker_config(self.driver.host) if self.workers else None
+        if worker_config is None or worker_config.cores is None:
+            threads = "*"
+        else:
+            threads = worker_config.cores * (worker_config.instances or 1)
+
+        return f"local[{threads},4]"
+
     @property
     def spark_master(self) -> str:
+        if self.daemonless:
+            return self.local_master
         return f"spark://{self.driver.host}:7077"
 
+    @property
+    def spark_master_ui_url(self) -> str:
+        return f"http://{self.driver.host}:8080"
+
     def get_package_config(self, package: str) -> PackageConfig:
         if not self.has_package(package):
             raise Exception(f"Package {package} does not defined in config")
@@ -231,21 +662,85 @@ class SimpleSparkConfig:
     def get_package_home_directory(self, package: str) -> str:
         return f"{self.simplespark_libs_directory}/{package}/{self.get_package_version(package)}"
 
+    def check_java_compatibility(self):
+        """Raise when selected JDK can't run the selected Spark, Scala or Hive metastore versions"""
+
+        java_version = self.get_package_config('java').java_major_version
+
+        if self.has_package('spark'):
+            spark_version = parse_version(self.get_package_version('spark'))
+            supported = SPARK_JAVA_VERSIONS.get(spark_version[:2])
+            if supported is not None and java_version not in supported:
+                raise Exception(f"Spark {self.get_package_version('spark')} does not support Java {java_version}, "
+                                f"supported versions: {sorted(supported)}")
+
+        if self.has_package('scala'):
+            scala_version = parse_version(self.get_package_version('scala'))
+            minimum = SCALA_MIN_JAVA_VERSIONS.get(scala_version[:2], {}).get(java_version)
+            if minimum is not None and scala_version < minimum:
+                raise Exception(f"Java {java_version} requires Scala {'.'.join(map(str, minimum))} or later, "
+                                f"found {self.get_package_version('scala')}")
+
+        # Hive 3 metastore server only runs on Java 8, Hive 4.1 moved to Java 17
+        if self.driver.metastore_server and self.has_package('hive'):
+            hive_version = parse_version(self.get_package_version('hive'))
+            if hive_version[0] < 4 and java_version != 8:
+                raise Exception(f"Hive {self.get_package_version('hive')} metastore server requires Java 8, "
+                                f"found Java {java_version}")
+            if hive_version >= (4, 1) and java_version < 17:
+                raise Exception(f"Hive {self.get_package_version('hive')} metastore server requires Java 17 or "
+                                f"later, found Java {java_version}")
+
+    def check_delta_compatibility(self):
+        """Raise when the Delta Lake release was built for a different Spark minor version"""
+
+        delta_version = parse_version(self.get_package_version('delta'))
+        spark_version = parse_version(self.get_package_version('spark'))
+        expected = DELTA_SPARK_VERSIONS.get(delta_version[:2])
+        if expected is not None and spark_version[:2] != expected:
+            raise Exception(f"Delta {self.get_package_version('delta')} requires Spark "
+                            f"{'.'.join(map(str, expected))}, found {self.get_package_version('spark')}")
+
     def get_package_version(self, package_name: str) -> str:
         package_config = self.get_package_config(package_name)
         return package_config.version
 
     def get_worker_config(self, host: str) -> WorkerConfig | None:
         worker_config = None
-        for worker in self.workers:
+        for worker in self.workers or []:
             if host == worker.host:
                 worker_config = worker
                 break
         return worker_config
 
+    def get_active_workers(self) -> list[WorkerConfig]:
+        """Workers not excluded from `start`, e.g. after `probe` flagged them as degraded"""
+        return [w for w in self.workers or [] if not w.excluded]
+
     def has_package(self, package: str) -> bool:
         return package in self._package_map
 
+    def uses_agent(self) -> bool:
+        return self.agent is not None and self.agent.enabled
+
+    def uses_decommission(self) -> bool:
+        return self.decommission is not None and self.decommission.enabled
+
+    def uses_remote_shuffle(self) -> bool:
+        return self.remote_shuffle is not None and self.remote_shuffle.enabled
+
+    def uses_environment_jars(self) -> bool:
+        return self.object_store is not None or self.has_package('delta')
+
+    def has_object_store_keys(self) -> bool:
+        return self.object_store is not None and self.object_store.access_key is not None
+
+    def uses_external_shuffle_service(self) -> bool:
+        return self.dynamic_allocation is not None and self.dynamic_allocation.external_shuffle_service
+
+    def uses_hive_metastore(self) -> bool:
+        return self.metastore_config is not None or self.driver.metastore_server
+
     def to_json(self, remove_nulls: bool = True) -> str:
 
         def remove_nulls_from_dict(d: dict[str, Any]):
@@ -269,4 +764,7 @@ class SimpleSparkConfig:
         as_string = str(self)
 
         with open(json_path, 'w') as write_file:
+            # Object store keys are stored in plain text, keep them readable by the owner only
+            if self.has_object_store_keys():
+                os.chmod(json_path, 0o600)
             write_file.write(as_string)
@@ -0,0 +1,265 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tarfile
+import time
+
+from simplespark.environment.config import SimpleSparkConfig
+from simplespark.utils.archive import check_member
+from simplespark.utils.locking import FileLock
+
+
+MANIFEST_NAME = "simplespark-image.json"
+
+# Environment sub-directories holding runtime state that should not be shipped
+EXCLUDED_ENVIRONMENT_PATHS = {"run", "event-logs", "history-store", "logs", "agent.token"}
+
+# Text files larger than this are never scanned for paths to rewrite
+MAX_REWRITE_FILE_SIZE = 1024 * 1024
+
+
+class HashingReader:
+    """File wrapper computing SHA-256 of every byte read, used to verify archives while streaming"""
+
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file.read(size)
+        self.sha256.update(data)
+        return data
+
+    def drain(self):
+        while self.read(1024 * 1024):
+            pass
+
+
+def file_sha256(path: str) -> str:
+
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+def _image_paths(config: SimpleSparkConfig) -> list[str]:
+    """Paths relative to SIMPLESPARK_HOME included in the environment image"""
+
+    paths = []
+
+    for package in config.packages:
+        if os.path.exists(config.get_package_home_directory(package.name)):
+            paths.append(f"libs/{package.name}/{package.version}")
+
+    environment_directory = f"environments/{config.name}"
+    for entry in sorted(os.listdir(f"{config.simplespark_home}/{environment_directory}")):
+        if entry not in EXCLUDED_ENVIRONMENT_PATHS:
+            paths.append(f"{environment_directory}/{entry}")
+
+    paths.append(f"activate/{config.name}.spark")
+
+    if config.python_environment and os.path.exists(config.python_environment_directory):
+        paths.append(os.path.relpath(config.python_environment_directory, config.simplespark_home))
+
+    return paths
+
+
+def _find_rewrite_files(config: SimpleSparkConfig, paths: list[str]) -> list[str]:
+    """Find small text files containing the absolute SIMPLESPARK_HOME path, skipping package homes"""
+
+    home_bytes = config.simplespark_home.encode()
+    rewrite_files = []
+
+    for path in paths:
+        if path.startswith("libs/"):
+            continue
+
+        full_path = f"{config.simplespark_home}/{path}"
+        file_paths = [full_path] if os.path.isfile(full_path) else [
+            os.path.join(root, f) for root, _, files in os.walk(full_path) for f in files
+        ]
+
+        for file_path in file_paths:
+            if os.path.islink(file_path) or os.path.getsize(file_path) > MAX_REWRITE_FILE_SIZE:
+                continue
+            with open(file_path, 'rb') as f:
+                content = f.read()
+            if b'\0' not in content and home_bytes in content:
+                rewrite_files.append(os.path.relpath(file_path, config.simplespark_home))
+
+    return rewrite_files
+
+
+def _redacted_files(config: SimpleSparkConfig) -> dict[str, bytes]:
+    """Image copies of files holding object store keys, with the keys removed so images can be shared"""
+
+    if not config.has_object_store_keys():
+        return {}
+
+    redacted = {}
+
+    if os.path.exists(config.simplespark_config_file_path):
+        with open(config.simplespark_config_file_path, 'r') as f:
+            config_json = json.load(f)
+        config_json["object_store"].pop("access_key", None)
+        config_json["object_store"].pop("secret_key", None)
+        redacted[config.simplespark_config_file_path] = json.dumps(config_json, indent=2).encode()
+
+    if os.path.exists(config.spark_conf_file_path):
+        with open(config.spark_conf_file_path, 'r') as f:
+            lines = [line for line in f
+                     if not line.startswith(("spark.hadoop.fs.s3a.access.key ", "spark.hadoop.fs.s3a.secret.key "))]
+        redacted[config.spark_conf_file_path] = "".join(lines).encode()
+
+    return {os.path.relpath(path, config.simplespark_home): content for path, content in redacted.items()}
+
+
+def export_image(config: SimpleSparkConfig, output_path: str) -> str:
+    """Write environment image archive and `.sha256` file next to it, returns archive checksum"""
+
+    paths = _image_paths(config)
+
+    manifest = {
+        "name": config.name,
+        "simplespark_home": config.simplespark_home,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "paths": paths,
+        "rewrite": _find_rewrite_files(config, paths),
+    }
+
+    with tarfile.open(output_path, "w:gz") as archive:
+
+        # Manifest goes first so import knows how to handle every following member
+        manifest_bytes = json.dumps(manifest, indent=2).encode()
+        manifest_info = tarfile.TarInfo(MANIFEST_NAME)
+        manifest_info.size = len(manifest_bytes)
+        manifest_info.mtime = int(time.time())
+        archive.addfile(manifest_info, io.BytesIO(manifest_bytes))
+
+        redacted = _redacted_files(config)
+        for path in paths:
+            print(f"Adding {path}")
+            archive.add(f"{config.simplespark_home}/{path}", arcname=path,
+                        filter=lambda member: None if member.name in redacted else member)
+
+        for path, content in redacted.items():
+            print(f"Adding {path} without object store keys")
+            info = tarfile.TarInfo(path)
+            info.size = len(content)
+            info.mtime = int(time.time())
+            info.mode = 0o600
+            archive.addfile(info, io.BytesIO(content))
+
+    checksum = file_sha256(output_path)
+    with open(f"{output_path}.sha256", 'w') as f:
+        f.write(f"{checksum}  {os.path.basename(output_path)}\n")
+
+    return checksum
+
+
+def read_image_manifest(archive_path: str) -> dict:
+    """Manifest of an image archive, only the first member is decompressed"""
+
+    with tarfile.open(archive_path, mode="r|gz") as archive:
+        manifest_member = archive.next()
+        if manifest_member is None or manifest_member.name != MANIFEST_NAME:
+            raise Exception(f"{archive_path} is not a simplespark image, missing {MANIFEST_NAME}")
+        return json.load(archive.extractfile(manifest_member))
+
+
+def _install_path(staging_directory: str, target_home: str, path: str):
+
+    source = f"{staging_directory}/{path}"
+    target = f"{target_home}/{path}"
+
+    if not os.path.exists(source):
+        return
+
+    # Package homes and Python environments are immutable once installed, locks shared with build tasks
+    if path.startswith(("libs/", "pyenvs/")):
+        kind, name = path.split('/', 1)
+        lock_name = name.replace('/', '-') if kind == "libs" else f"pyenv-{os.path.basename(name)}"
+        with FileLock(f"{target_home}/locks/{lock_name}.lock"):
+            if os.path.exists(target):
+                print(f"Already installed: {path}")
+                return
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.rename(source, target)
+        return
+
+    if os.path.isdir(target) and not os.path.islink(target):
+        shutil.rmtree(target)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(source, target)
+
+
+def import_image(archive_path: str, simplespark_home: str = None, checksum: str = None) -> dict:
+    """
+    Install environment image in a single streaming pass, rewriting SIMPLESPARK_HOME paths.
+
+    Members are extracted to a staging directory while the archive checksum is computed,
+    nothing is moved into place unless the checksum matches. Use `-` to read from stdin.
+    """
+
+    if checksum is None and archive_path != '-' and os.path.exists(f"{archive_path}.sha256"):
+        with open(f"{archive_path}.sha256", 'r') as f:
+            checksum = f.read().split()[0]
+
+    source = sys.stdin.buffer if archive_path == '-' else open(archive_path, 'rb')
+    reader = HashingReader(source)
+    staging_directory = None
+
+    try:
+        with tarfile.open(fileobj=reader, mode="r|gz") as archive:
+
+            manifest_member = archive.next()
+            if manifest_member is None or manifest_member.name != MANIFEST_NAME:
+                raise Exception(f"{archive_path} is not a simplespark image, missing {MANIFEST_NAME}")
+            manifest = json.load(archive.extractfile(manifest_member))
+
+            source_home = manifest["simplespark_home"]
+            target_home = simplespark_home or source_home
+            rewrite_files = set(manifest["rewrite"])
+
+            staging_directory = f"{target_home}/.image-staging-{os.getpid()}"
+            os.makedirs(staging_directory)
+
+            for member in archive:
+                if member is manifest_member:
+                    continue
+                # Checksum is only known once the stream ends, so every member is checked before writing
+                check_member(member, staging_directory)
+                if member.name in rewrite_files and member.isfile():
+                    content = archive.extractfile(member).read()
+                    content = content.replace(source_home.encode(), target_home.encode())
+                    target_path = f"{staging_directory}/{member.name}"
+                    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                    with open(target_path, 'wb') as f:
+                        f.write(content)
+                    os.chmod(target_path, member.mode)
+                else:
+                    archive.extract(member, staging_directory)
+
+        reader.drain()
+        if checksum is not None and reader.sha256.hexdigest() != checksum:
+            raise Exception(f"Image checksum mismatch, expected {checksum} got {reader.sha256.hexdigest()}")
+        if checksum is None:
+            print("WARNING: No checksum provided, image integrity not verified")
+
+        for path in manifest["paths"]:
+            _install_path(staging_directory, target_home, path)
+
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if staging_directory and os.path.exists(staging_directory):
+            shutil.rmtree(staging_directory)
+
+    manifest["simplespark_home"] = target_home
+    return manifest
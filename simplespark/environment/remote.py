@@ -0,0 +1,166 @@
+import base64
+import os
+import stat
+import subprocess
+from typing import Callable
+
+from simplespark.environment.build import build_worker_via_ssh
+from simplespark.environment.config import SimpleSparkConfig
+from simplespark.utils.agent import AgentClient, AgentError, read_token
+from simplespark.utils.logs import HostShell
+from simplespark.utils.ssh import SSHUtils
+
+
+# Agent connections are opened once per host and reused for every command
+_agent_clients: dict[str, AgentClient | None] = {}
+
+
+def get_worker_actions(config: SimpleSparkConfig, host: str) -> dict[str, str]:
+    """Shell commands for each named worker action, shared by the agent and the SSH fallback"""
+
+    return {
+        "start-worker": f"bash $SPARK_HOME/sbin/start-worker.sh {config.spark_master}",
+        "stop-worker": "bash $SPARK_HOME/sbin/stop-worker.sh",
+        "decommission-worker": "bash $SPARK_HOME/sbin/decommission-worker.sh",
+        "status": "bash $SPARK_HOME/sbin/spark-daemon.sh status org.apache.spark.deploy.worker.Worker 1",
+        "build": f"simplespark worker {config.simplespark_config_file_path} {host}",
+        "native-check": "$HADOOP_HOME/bin/hadoop checknative -a",
+        "start-shuffle-worker": "bash $CELEBORN_HOME/sbin/start-worker.sh",
+        "stop-shuffle-worker": "bash $CELEBORN_HOME/sbin/stop-worker.sh",
+    }
+
+
+def run_on_worker(config: SimpleSparkConfig, host: str, command: str,
+                  on_output: Callable[[str], None] = None) -> int:
+    """Run `command` on worker host inside the activated environment, printing output and returning exit code"""
+
+    if on_output is None:
+        on_output = print
+
+    ssh = SSHUtils(host)
+    i, o, e = ssh.run(f". {config.bash_profile_file}; source {config.activate_script_path}; {command}")
+    for line in o.readlines():
+        on_output(line)
+    for line in e.readlines():
+        on_output(line)
+    exit_code = o.channel.recv_exit_status()
+    ssh.close()
+
+    return exit_code
+
+
+def open_host_shell(config: SimpleSparkConfig, host: str) -> HostShell:
+    """Shell on `host` with the environment and `spark-env.sh` loaded, the driver host runs commands locally"""
+
+    prefix = (f". {config.bash_profile_file}; source {config.activate_script_path}; "
+              f"source {config.spark_env_sh_path} > /dev/null 2>&1; ")
+
+    return HostShell(host, prefix, local=host in ('localhost', config.driver.host))
+
+
+def get_agent_client(config: SimpleSparkConfig, host: str) -> AgentClient | None:
+
+    if not config.uses_agent():
+        return None
+
+    if host not in _agent_clients:
+        try:
+            ssh = SSHUtils(host) if config.agent.tunnel else None
+            token = read_token(config.agent_token_path)
+            _agent_clients[host] = AgentClient.connect(host, config.agent.port, token, ssh)
+        except Exception as e:
+            print(f"Agent not available on {host}, falling back to SSH: {e}")
+            _agent_clients[host] = None
+
+    return _agent_clients[host]
+
+
+def drop_agent_client(host: str, error: Exception):
+    """Forget a broken agent connection so this and later commands use SSH"""
+
+    print(f"Agent on {host} failed, falling back to SSH: {error}")
+    client = _agent_clients.get(host)
+    if client is not None:
+        client.close()
+    _agent_clients[host] = None
+
+
+def run_worker_action(config: SimpleSparkConfig, host: str, action: str,
+                      on_output: Callable[[str], None] = None) -> int:
+    """Run named action through the worker's agent when available, otherwise over plain SSH"""
+
+    client = get_agent_client(config, host)
+    if client is not None:
+        try:
+            return client.run(action, on_output=on_output)
+        except AgentError as e:
+            drop_agent_client(host, e)
+
+    return run_on_worker(config, host, get_worker_actions(config, host)[action], on_output)
+
+
+def sync_file_to_worker(config: SimpleSparkConfig, host: str, path: str):
+
+    # Permissions are mirrored, config.json is owner only when it holds object store keys
+    file_mode = stat.S_IMODE(os.stat(path).st_mode)
+
+    client = get_agent_client(config, host)
+    if client is not None:
+        with open(path, 'rb') as f:
+            content = base64.b64encode(f.read()).decode()
+        try:
+            exit_code = client.run("sync", {"path": path, "content": content, "mode": file_mode})
+        except AgentError as e:
+            drop_agent_client(host, e)
+        else:
+            if exit_code != 0:
+                raise Exception(f"Failed to sync {path} to {host}")
+            return
+
+    ssh = SSHUtils(host)
+    ssh.copy(path, path)
+    ssh.sftp.chmod(path, file_mode)
+    ssh.close()
+
+
+def rebuild_worker(config: SimpleSparkConfig, host: str):
+
+    if get_agent_client(config, host) is None:
+        build_worker_via_ssh(config, host)
+        return
+
+    sync_file_to_worker(config, host, config.simplespark_config_file_path)
+    if run_worker_action(config, host, "build") != 0:
+        raise Exception(f"Build failed on {host}")
+
+
+def create_agent_action_handler(config: SimpleSparkConfig, host: str) -> Callable[[str, dict, Callable], int]:
+    """Action handler run by the agent, commands inherit the agent's already activated environment"""
+
+    worker_actions = get_worker_actions(config, host)
+    simplespark_home = os.path.realpath(config.simplespark_home)
+
+    def handle_action(action: str, args: dict, output: Callable[[str], None]) -> int:
+
+        if action == "sync":
+            path = os.path.realpath(args["path"])
+            if not path.startswith(f"{simplespark_home}/"):
+                raise Exception(f"Sync path {path} outside of SIMPLESPARK_HOME")
+            with open(path, 'wb') as f:
+                if "mode" in args:
+                    os.chmod(path, args["mode"])
+                f.write(base64.b64decode(args["content"]))
+            output(f"Wrote {path}\n")
+            return 0
+
+        if action not in worker_actions:
+            raise Exception(f"Unknown action {action}")
+
+        process = subprocess.Popen(["bash", "-c", worker_actions[action]], stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, text=True)
+        for line in process.stdout:
+            output(line)
+
+        return process.wait()
+
+    return handle_action
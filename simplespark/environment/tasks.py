@@ -1,15 +1,70 @@
 import shutil
 import socket
+import subprocess
+import time
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
 import os
 import tarfile
+from typing import Callable
 
 from urllib.request import urlretrieve
-
-from simplespark.environment.config import SimpleSparkConfig, JdbcConfig, WorkerConfig
+from xml.sax.saxutils import escape
+
+from simplespark.environment.config import (
+    HADOOP_AWS_SDK_BUNDLES, SimpleSparkConfig, JdbcConfig, JvmConfig, MavenConfig, WorkerConfig, parse_version
+)
+from simplespark.utils.agent import write_token
+from simplespark.utils.archive import safe_members
+from simplespark.utils.buildstats import BuildStats
+from simplespark.utils.disks import discover_data_disks, format_size, parse_size
+from simplespark.utils.jars import find_jar_version, find_scala_binary_version
+from simplespark.utils.locking import FileLock
 from simplespark.utils.maven import MavenDownloader
 
 
+# Garbage collector flags, G1 settings follow the Spark tuning guide for cache heavy heaps
+GC_OPTIONS: dict[str, list[str]] = {
+    "G1": ["-XX:+UseG1GC", "-XX:InitiatingHeapOccupancyPercent=35", "-XX:+ParallelRefProcEnabled",
+           "-XX:+UseStringDeduplication"],
+    "ZGC": ["-XX:+UseZGC"],
+    "Parallel": ["-XX:+UseParallelGC"],
+}
+
+# Default collector per JDK major version, generational ZGC is production ready from JDK 21
+DEFAULT_GC: dict[int, str] = {8: "G1", 11: "G1", 17: "G1", 21: "ZGC"}
+
+
+def generate_site_xml(properties: dict) -> str:
+    """Render Hadoop style `*-site.xml` configuration file"""
+
+    xml_properties = "".join(
+        f"""
+        <property>
+            <name>{name}</name>
+            <value>{escape(str(value))}</value>
+        </property>"""
+        for name, value in properties.items()
+    )
+
+    return f"<configuration>{xml_properties}\n</configuration>\n"
+
+
+@dataclass
+class TaskPlan:
+    will_run: bool
+    detail: str = ""
+    download_bytes: int = 0
+    extract_bytes: int = 0
+    transfer_bytes: int = 0
+    unknown_size: bool = False
+
+    def estimate_seconds(self, stats: BuildStats) -> float:
+        return (stats.estimate_seconds("download", self.download_bytes)
+                + stats.estimate_seconds("extract", self.extract_bytes)
+                + stats.estimate_seconds("transfer", self.transfer_bytes))
+
+
 class BuildTask(ABC):
 
     @abstractmethod
@@ -20,6 +75,14 @@ class BuildTask(ABC):
     def run(self, config: SimpleSparkConfig):
         pass
 
+    def plan(self, config: SimpleSparkConfig, exists: Callable[[str], bool], stats: BuildStats) -> TaskPlan:
+        """
+        What `run` would do on a host, without changing anything.
+
+        `exists` checks paths on the planned host. Tasks only rendering config files always run.
+        """
+        return TaskPlan(True, "render config")
+
 
 class SetupJavaBin(BuildTask):
 
@@ -32,39 +95,77 @@ class SetupJavaBin(BuildTask):
     def run(self, config: SimpleSparkConfig):
 
         package_config = config.get_package_config(self.package)
-        package_directory = f'{config.simplespark_libs_directory}/{self.package}'
-        if not os.path.exists(package_directory):
-            os.makedirs(package_directory)
+        package_home = config.get_package_home_directory(self.package)
 
-        download_url = package_config.package_download_url
-        download_path = f"{config.simplespark_home}/{package_config.package_file_name}"
+        # Builds for other environments on this host may share the same package version
+        with FileLock(f"{config.simplespark_locks_directory}/{self.package}-{package_config.version}.lock"):
 
-        if not os.path.exists(config.get_package_home_directory(self.package)):
+            staging_directory = f"{config.simplespark_libs_directory}/.staging-{self.package}-{package_config.version}"
+            download_path = f"{config.simplespark_downloads_directory}/{package_config.package_file_name}"
+            self.recover_partial_state(staging_directory, download_path)
 
-            print(f"Downloading {self.package} binary from:")
-            print(download_url)
+            if os.path.exists(package_home):
+                print(f"Package version already downloaded at {package_home}")
+                return
 
-            urlretrieve(download_url, download_path)
+            if os.path.exists(download_path):
+                print(f"Reusing {self.package} download at {download_path}")
+            else:
+                print(f"Downloading {self.package} binary from:")
+                print(package_config.package_download_url)
+
+                os.makedirs(config.simplespark_downloads_directory, exist_ok=True)
+                started = time.monotonic()
+                urlretrieve(package_config.package_download_url, f"{download_path}.part")
+                BuildStats.record(config.build_stats_path, "download", os.path.getsize(f"{download_path}.part"),
+                                  time.monotonic() - started, package_config.package_download_url)
+                os.rename(f"{download_path}.part", download_path)
+
+            # Extract into private staging directory so the shared libs directory never sees partial packages
+            os.makedirs(staging_directory)
+            started = time.monotonic()
+            with tarfile.open(download_path, "r") as lib_tarfile:
+                lib_tarfile.extractall(staging_directory, members=safe_members(lib_tarfile, staging_directory))
+                # Assumes single folder in extract with package extracted within
+                extracted_folder_path = f"{staging_directory}/{lib_tarfile.getnames()[0].split('/')[0]}"
+            BuildStats.record(config.build_stats_path, "extract", os.path.getsize(download_path),
+                              time.monotonic() - started)
+
+            print(f"Move unpacked lib from {extracted_folder_path} to {package_home}")
+            os.makedirs(f"{config.simplespark_libs_directory}/{self.package}", exist_ok=True)
+            os.rename(extracted_folder_path, package_home)
+
+            shutil.rmtree(staging_directory)
+            os.remove(download_path)
 
-            lib_tarfile = tarfile.open(download_path, "r")
-            lib_tarfile.extractall(config.simplespark_libs_directory)
+    def plan(self, config: SimpleSparkConfig, exists: Callable[[str], bool], stats: BuildStats) -> TaskPlan:
 
-            # Assumes single folder in extract with package extracted within
-            extracted_folder_path = f"{config.simplespark_libs_directory}/{lib_tarfile.getnames()[0]}"
+        package_config = config.get_package_config(self.package)
+        package_home = config.get_package_home_directory(self.package)
+        download_path = f"{config.simplespark_downloads_directory}/{package_config.package_file_name}"
 
-            print(f"Move unpacked lib from {extracted_folder_path} to {config.get_package_home_directory(self.package)}")
-            if not os.path.exists(f"{config.simplespark_libs_directory}/{self.package}"):
-                os.makedirs(f"{config.simplespark_libs_directory}/{self.package}")
+        if exists(package_home):
+            return TaskPlan(False, f"{self.package} {package_config.version} installed")
 
-            shutil.copytree(extracted_folder_path, config.get_package_home_directory(self.package))
+        size = stats.get_size(package_config.package_download_url)
+        if exists(download_path):
+            return TaskPlan(True, f"extract cached {package_config.package_file_name}",
+                            extract_bytes=size or 0, unknown_size=size is None)
 
-            lib_tarfile.close()
-            os.remove(download_path)
-            shutil.rmtree(extracted_folder_path)
+        return TaskPlan(True, f"download {package_config.package_download_url}", download_bytes=size or 0,
+                        extract_bytes=size or 0, unknown_size=size is None)
 
-        else:
+    @staticmethod
+    def recover_partial_state(staging_directory: str, download_path: str):
+        """Remove leftovers of a build that crashed while holding the package lock"""
 
-            print(f"Package version already downloaded at {config.get_package_home_directory(self.package)}")
+        if os.path.exists(staging_directory):
+            print(f"Removing partial extract at {staging_directory}")
+            shutil.rmtree(staging_directory)
+
+        if os.path.exists(f"{download_path}.part"):
+            print(f"Removing partial download at {download_path}.part")
+            os.remove(f"{download_path}.part")
 
 
 class PrepareConfigFiles(BuildTask):
@@ -80,11 +181,11 @@ class PrepareConfigFiles(BuildTask):
         environment_directory = f"{config.simplespark_environment_directory}/{config.name}"
         if not os.path.exists(environment_directory):
             print(f"Creating environment directory: {environment_directory}")
-            os.mkdir(environment_directory)
+            os.makedirs(environment_directory, exist_ok=True)
 
         if not os.path.exists(config.spark_conf_directory):
             print(f"Creating environment directory: {config.spark_conf_directory}")
-            os.mkdir(config.spark_conf_directory)
+            os.makedirs(config.spark_conf_directory, exist_ok=True)
 
         print(f"Setup spark-env.sh bash script at {config.spark_env_sh_path}")
         with open(config.spark_env_sh_path, 'w') as env_sh_file:
@@ -93,6 +194,15 @@ class PrepareConfigFiles(BuildTask):
             env_sh_file.write(f'export SPARK_LOCAL_IP={self.host}\n')
             env_sh_file.write(f'export SPARK_HOST_IP={config.driver.host}\n')
 
+            if config.python_environment:
+                env_sh_file.write(f'export PYSPARK_PYTHON={config.pyspark_python}\n')
+
+            # Native libhadoop lets Hadoop codecs and CRC checks skip their pure Java fallbacks
+            if config.has_package('hadoop'):
+                env_sh_file.write(f'export HADOOP_HOME={config.get_package_home_directory("hadoop")}\n')
+                env_sh_file.write(f'export LD_LIBRARY_PATH={config.hadoop_native_library_directory}'
+                                  ':$LD_LIBRARY_PATH\n')
+
 
 class DownloadJDBCDrivers(BuildTask):
 
@@ -106,21 +216,98 @@ class DownloadJDBCDrivers(BuildTask):
             MavenDownloader.download_jar(jdbc_driver, config.spark_jars_path)
 
 
-class SetupDelta(BuildTask):
+class SetupEnvironmentJars(BuildTask):
 
     def name(self) -> str:
-        return "setup-delta"
+        return "setup-environment-jars"
+
+    @staticmethod
+    def resolve_object_store_jars(config: SimpleSparkConfig, scala_version: str) -> list[MavenConfig]:
+        """S3A connector jars matching the Hadoop client bundled with Spark, mixing versions breaks at runtime"""
+
+        store_config = config.object_store
+
+        hadoop_version = store_config.hadoop_aws_version or find_jar_version(config.spark_jars_path,
+                                                                             "hadoop-client-api")
+        if hadoop_version is None:
+            raise Exception(f"No Hadoop client found in {config.spark_jars_path}, "
+                            "set `object_store.hadoop_aws_version` for Spark builds without Hadoop")
+
+        if store_config.aws_sdk_version:
+            sdk_jar = (MavenConfig("software.amazon.awssdk", "bundle", store_config.aws_sdk_version)
+                       if parse_version(hadoop_version) >= (3, 4)
+                       else MavenConfig("com.amazonaws", "aws-java-sdk-bundle", store_config.aws_sdk_version))
+        elif hadoop_version in HADOOP_AWS_SDK_BUNDLES:
+            sdk_jar = HADOOP_AWS_SDK_BUNDLES[hadoop_version]
+        else:
+            raise Exception(f"Unknown AWS SDK for hadoop-aws {hadoop_version}, set `object_store.aws_sdk_version`")
+
+        return [
+            MavenConfig("org.apache.hadoop", "hadoop-aws", hadoop_version),
+            sdk_jar,
+            # Committer bindings so Spark SQL writes go through the S3A committers
+            MavenConfig("org.apache.spark", f"spark-hadoop-cloud_{scala_version}", config.get_package_version('spark')),
+        ]
+
+    @staticmethod
+    def resolve_delta_jars(config: SimpleSparkConfig, scala_version: str) -> list[MavenConfig]:
+        """
+        Delta jars for the Scala build of Spark, `delta-core` was renamed `delta-spark` in Delta 3.0.
+
+        `delta-storage` was split out of `delta-core` in Delta 1.1, earlier versions have no such artifact.
+        """
+
+        delta_version = config.get_package_version('delta')
+        artifact = "delta-spark" if parse_version(delta_version) >= (3, 0) else "delta-core"
+
+        jars = [MavenConfig("io.delta", f"{artifact}_{scala_version}", delta_version)]
+        if parse_version(delta_version) >= (1, 1):
+            jars.append(MavenConfig("io.delta", "delta-storage", delta_version))
+
+        return jars
+
+    @staticmethod
+    def resolve_jars(config: SimpleSparkConfig) -> list[MavenConfig]:
+
+        scala_version = find_scala_binary_version(config.spark_jars_path)
+
+        jars = []
+        if config.object_store:
+            jars += SetupEnvironmentJars.resolve_object_store_jars(config, scala_version)
+        if config.has_package('delta'):
+            jars += SetupEnvironmentJars.resolve_delta_jars(config, scala_version)
+
+        return jars
+
+    def plan(self, config: SimpleSparkConfig, exists: Callable[[str], bool], stats: BuildStats) -> TaskPlan:
+
+        # Versions are read from the jars of the installed Spark, on this host
+        if not os.path.exists(config.spark_jars_path):
+            return TaskPlan(True, "resolve jars once Spark is installed", unknown_size=True)
+
+        missing = [jar for jar in self.resolve_jars(config)
+                   if not exists(f"{config.environment_jars_directory}/{jar.artifact_id}-{jar.version}.jar")]
+        if not missing:
+            return TaskPlan(False, "jars downloaded")
+
+        sizes = [stats.get_size(MavenDownloader.jar_url(jar)) for jar in missing]
+        return TaskPlan(True, f"download {', '.join(f'{j.artifact_id}-{j.version}' for j in missing)}",
+                        download_bytes=sum(s or 0 for s in sizes), unknown_size=None in sizes)
 
     def run(self, config: SimpleSparkConfig):
 
-        print("Adding Delta libraries to spark_defaults.conf file")
+        jars = self.resolve_jars(config)
+        os.makedirs(config.environment_jars_directory, exist_ok=True)
 
-        # TODO overwrite delta configs instead of appending
-        with open(config.spark_conf_file_path, 'a') as spark_config_file:
-            spark_config_file \
-                .write(f"spark.jars.packages io.delta:delta-spark_2.12:{config.get_package_version('delta')}\n")
-            spark_config_file.write("spark.sql.extensions io.delta.sql.DeltaSparkSessionExtension\n")
-            spark_config_file.write("spark.sql.catalog.spark_catalog org.apache.spark.sql.delta.catalog.DeltaCatalog\n")
+        # Directory holds only resolved jars, stale versions next to new ones fail unpredictably at runtime
+        expected_files = {f"{jar.artifact_id}-{jar.version}.jar" for jar in jars}
+        for file_name in os.listdir(config.environment_jars_directory):
+            if file_name.endswith(".jar") and file_name not in expected_files:
+                print(f"Removing stale jar {file_name}")
+                os.remove(f"{config.environment_jars_directory}/{file_name}")
+
+        for jar in jars:
+            MavenDownloader.download_jar(jar, config.environment_jars_directory)
 
 
 class SetupDriver(BuildTask):
@@ -134,7 +321,9 @@ class SetupDriver(BuildTask):
 
         with open(config.spark_conf_file_path, 'w') as spark_config_file:
 
-            if config.driver.host == 'localhost':
+            if config.daemonless:
+                local_master_url = config.local_master
+            elif config.driver.host == 'localhost':
                 local_master_url = f"spark://{socket.gethostname()}:7077"
             else:
                 local_master_url = f"spark://{config.driver.host}:7077"
@@ -143,25 +332,82 @@ class SetupDriver(BuildTask):
             if config.driver.cores:
                 spark_config_file.write(f"spark.driver.cores {config.driver.cores}\n")
 
-            if config.driver.driver_memory:
-                spark_config_file.write(f"spark.driver.memory {config.driver.driver_memory}\n")
+            # Executors run inside the driver JVM without daemons, so it gets the worker's memory
+            driver_memory = config.driver.driver_memory
+            if config.daemonless and driver_memory is None and config.workers:
+                local_worker = config.get_worker_config(config.driver.host)
+                driver_memory = local_worker.memory if local_worker else None
+
+            if driver_memory:
+                spark_config_file.write(f"spark.driver.memory {driver_memory}\n")
 
             if config.driver.executor_memory:
                 spark_config_file.write(f"spark.executor.memory {config.driver.executor_memory}\n")
 
-            if config.derby_path:
-                spark_config_file.write("spark.driver.extraJavaOptions "
-                                        f"-Dderby.system.home={config.derby_path}\n")
+            if config.driver.executor_cores:
+                spark_config_file.write(f"spark.executor.cores {config.driver.executor_cores}\n")
+
+            if config.dynamic_allocation:
+                for key, value in self.generate_dynamic_allocation_settings(config).items():
+                    spark_config_file.write(f"{key} {value}\n")
+
+            if config.python_environment:
+                spark_config_file.write(f"spark.pyspark.python {config.pyspark_python}\n")
+                spark_config_file.write(f"spark.pyspark.driver.python {config.pyspark_python}\n")
+
+            if config.uses_decommission():
+                spark_config_file.write("spark.decommission.enabled true\n")
+                spark_config_file.write("spark.storage.decommission.enabled true\n")
+                spark_config_file.write("spark.storage.decommission.shuffleBlocks.enabled "
+                                        f"{str(config.decommission.shuffle_blocks).lower()}\n")
+                spark_config_file.write("spark.storage.decommission.rddBlocks.enabled "
+                                        f"{str(config.decommission.rdd_blocks).lower()}\n")
+                if config.decommission.fallback_storage_path:
+                    spark_config_file.write("spark.storage.decommission.fallbackStorage.path "
+                                            f"{config.decommission.fallback_storage_path}\n")
+
+            for key, value in self.generate_java_options(config).items():
+                spark_config_file.write(f"{key} {value}\n")
+
+            if config.has_package('hadoop'):
+                spark_config_file.write(f"spark.driver.extraLibraryPath {config.hadoop_native_library_directory}\n")
+                spark_config_file.write(f"spark.executor.extraLibraryPath {config.hadoop_native_library_directory}\n")
+
+            for key, value in self.generate_class_path_settings(config).items():
+                spark_config_file.write(f"{key} {value}\n")
+
+            if config.uses_remote_shuffle():
+                for key, value in self.generate_remote_shuffle_settings(config).items():
+                    spark_config_file.write(f"{key} {value}\n")
+
+            if config.object_store:
+                for key, value in self.generate_object_store_settings(config).items():
+                    spark_config_file.write(f"{key} {value}\n")
+
+            if config.has_package('delta'):
+                for key, value in self.generate_delta_settings(config).items():
+                    spark_config_file.write(f"{key} {value}\n")
 
             if config.warehouse_path:
                 spark_config_file.write(f"spark.sql.warehouse.dir {config.warehouse_path}\n")
 
-            if config.metastore_config:
+            if config.driver.metastore_server:
+                metastore_server_config = config.metastore_server_config
                 spark_config_file.write(f"spark.sql.catalogImplementation hive\n")
-                spark_config_file.write(f"javax.jdo.option.ConnectionURL {config.metastore_config.get_url('metastore_db')}\n")
-                spark_config_file.write(f"javax.jdo.option.ConnectionUserName {config.metastore_config.db_user}")
-                spark_config_file.write(f"javax.jdo.option.ConnectionPassword {config.metastore_config.db_pass}")
-                spark_config_file.write(f"javax.jdo.option.ConnectionDriverName {config.metastore_config.jdbc_driver}")
+                spark_config_file.write(f"spark.hadoop.hive.metastore.uris {config.metastore_uri}\n")
+                # Client side metadata caching to avoid repeated metastore round trips
+                spark_config_file.write("spark.sql.hive.metastorePartitionPruning true\n")
+                spark_config_file.write("spark.sql.hive.manageFilesourcePartitions true\n")
+                spark_config_file.write("spark.sql.hive.filesourcePartitionFileCacheSize "
+                                        f"{parse_size(metastore_server_config.client_partition_cache_size)}\n")
+                spark_config_file.write("spark.sql.metadataCacheTTLSeconds "
+                                        f"{metastore_server_config.client_metadata_cache_ttl_seconds}\n")
+            elif config.metastore_config:
+                spark_config_file.write(f"spark.sql.catalogImplementation hive\n")
+                spark_config_file.write(f"spark.hadoop.javax.jdo.option.ConnectionURL {config.metastore_config.get_url('metastore_db')}\n")
+                spark_config_file.write(f"spark.hadoop.javax.jdo.option.ConnectionUserName {config.metastore_config.db_user}\n")
+                spark_config_file.write(f"spark.hadoop.javax.jdo.option.ConnectionPassword {config.metastore_config.db_pass}\n")
+                spark_config_file.write(f"spark.hadoop.javax.jdo.option.ConnectionDriverName {config.metastore_config.jdbc_driver}\n")
 
             # Add `conf/workers` file if running in standalone mode
             # if config.mode == 'standalone':
@@ -175,14 +421,397 @@ class SetupDriver(BuildTask):
             #             print(f'Adding worker: {w.host}')
             #             wf.write(w.host + '\n')
 
+        # Keys from config are stored in plain text, keep them readable by the owner only
+        if config.has_object_store_keys():
+            os.chmod(config.spark_conf_file_path, 0o600)
+
         with open(config.spark_env_sh_path, 'a') as spark_env_sh_file:
             spark_env_sh_file.write(f"export SPARK_MASTER_HOST={config.driver.host}\n")
 
             worker_on_driver = config.get_worker_config(config.driver.host)
             if worker_on_driver:
-                spark_env_sh_file.write(f'export SPARK_WORKER_CORES={worker_on_driver.cores}\n')
-                spark_env_sh_file.write(f'export SPARK_WORKER_MEMORY={worker_on_driver.memory}\n')
-                spark_env_sh_file.write(f'export SPARK_WORKER_INSTANCES={worker_on_driver.instances}\n')
+                SetupWorker.write_worker_env(config, worker_on_driver, spark_env_sh_file)
+
+    @staticmethod
+    def generate_java_options(config: SimpleSparkConfig) -> dict[str, str]:
+        """Driver/executor JVM flags, GC and heap presets for the JDK first so user options override them"""
+
+        jvm_config = config.jvm or JvmConfig()
+        driver_options, executor_options = [], []
+
+        if jvm_config.presets and config.has_package('java'):
+            java_version = config.get_package_config('java').java_major_version
+            gc = jvm_config.gc or DEFAULT_GC.get(java_version, "G1")
+            if gc not in GC_OPTIONS:
+                raise Exception(f"Unknown garbage collector {gc}, options: {list(GC_OPTIONS)}")
+            if gc == "ZGC" and java_version < 17:
+                raise Exception(f"ZGC requires Java 17 or later, found Java {java_version}")
+
+            gc_options = GC_OPTIONS[gc] + (["-XX:+ZGenerational"] if gc == "ZGC" and java_version >= 21 else [])
+            driver_options += gc_options
+            # Larger regions keep shuffle and broadcast buffers from becoming humongous allocations
+            executor_options += gc_options + (["-XX:G1HeapRegionSize=16m"] if gc == "G1" else [])
+
+        if config.derby_path:
+            driver_options.append(f"-Dderby.system.home={config.derby_path}")
+
+        if jvm_config.driver_java_options:
+            driver_options.append(jvm_config.driver_java_options)
+        if jvm_config.executor_java_options:
+            executor_options.append(jvm_config.executor_java_options)
+
+        settings = {
+            "spark.driver.extraJavaOptions": " ".join(driver_options),
+            "spark.executor.extraJavaOptions": " ".join(executor_options),
+        }
+
+        return {k: v for k, v in settings.items() if v}
+
+    @staticmethod
+    def get_class_path_entries(config: SimpleSparkConfig) -> list[str]:
+        """Jars added to driver and executor class paths, every host installs the same paths"""
+
+        entries = []
+        if config.uses_remote_shuffle():
+            entries.append(f"{config.get_package_home_directory('celeborn')}/spark/*")
+        if config.uses_environment_jars():
+            entries.append(f"{config.environment_jars_directory}/*")
+
+        return entries
+
+    @staticmethod
+    def generate_class_path_settings(config: SimpleSparkConfig) -> dict[str, str]:
+
+        entries = SetupDriver.get_class_path_entries(config)
+        if not entries:
+            return {}
+
+        class_path = ":".join(entries)
+        return {"spark.driver.extraClassPath": class_path, "spark.executor.extraClassPath": class_path}
+
+    @staticmethod
+    def generate_remote_shuffle_settings(config: SimpleSparkConfig) -> dict[str, str]:
+        """Route shuffle through Celeborn workers, which merge map outputs so reducers fetch few large blocks"""
+
+        settings = {
+            "spark.shuffle.manager": "org.apache.spark.shuffle.celeborn.SparkShuffleManager",
+            "spark.serializer": "org.apache.spark.serializer.KryoSerializer",
+            "spark.celeborn.master.endpoints": config.celeborn_master_endpoint,
+            "spark.celeborn.client.push.replicate.enabled": str(config.remote_shuffle.replicate).lower(),
+            "spark.shuffle.service.enabled": "false",
+            # Celeborn serves reducer reads itself, local shuffle reader would bypass it
+            "spark.sql.adaptive.localShuffleReader.enabled": "false",
+        }
+
+        # Spark 3.5 lets dynamic allocation release executors whose shuffle data lives in Celeborn
+        if parse_version(config.get_package_version('spark')) >= (3, 5):
+            settings["spark.shuffle.sort.io.plugin.class"] = "org.apache.spark.shuffle.celeborn.CelebornShuffleDataIO"
+
+        return settings
+
+    @staticmethod
+    def generate_object_store_settings(config: SimpleSparkConfig) -> dict[str, str]:
+        """
+        S3A filesystem settings with upload buffering, connection pool and multipart sizes tuned for bulk writes.
+
+        Output goes through the S3A magic or staging committers, the default rename based committer
+        copies every file on commit and is neither fast nor safe on object stores.
+
+        Keys are only written when set in config, otherwise S3A resolves credentials through
+        `credentials_provider` or its default chain (environment variables, instance profile).
+        """
+
+        store_config = config.object_store
+        if store_config.access_key:
+            print(f"WARNING: Object store keys are written in plain text to {config.spark_conf_file_path}, "
+                  "prefer `credentials_provider` or AWS_ACCESS_KEY_ID/AWS_SECRET_ACCESS_KEY")
+
+        s3a_settings = {
+            "fs.s3a.impl": "org.apache.hadoop.fs.s3a.S3AFileSystem",
+            "fs.s3a.endpoint": store_config.endpoint,
+            "fs.s3a.endpoint.region": store_config.region,
+            "fs.s3a.access.key": store_config.access_key,
+            "fs.s3a.secret.key": store_config.secret_key,
+            "fs.s3a.aws.credentials.provider": store_config.credentials_provider,
+            "fs.s3a.path.style.access": str(store_config.path_style_access).lower(),
+            "fs.s3a.connection.ssl.enabled": str(store_config.ssl_enabled).lower(),
+            # Skip bucket existence check on every filesystem instance
+            "fs.s3a.bucket.probe": "0",
+            "fs.s3a.fast.upload.buffer": store_config.fast_upload_buffer,
+            "fs.s3a.fast.upload.active.blocks": store_config.fast_upload_active_blocks,
+            # Every upload thread holds a connection, pool must be larger than the thread count
+            "fs.s3a.connection.maximum": max(store_config.max_connections, store_config.max_threads * 2),
+            "fs.s3a.threads.max": store_config.max_threads,
+            "fs.s3a.multipart.size": store_config.multipart_size,
+            "fs.s3a.multipart.threshold": store_config.multipart_threshold,
+            "fs.s3a.committer.name": store_config.committer,
+            "fs.s3a.committer.magic.enabled": str(store_config.committer == "magic").lower(),
+            "mapreduce.outputcommitter.factory.scheme.s3a": "org.apache.hadoop.fs.s3a.commit.S3ACommitterFactory",
+        }
+        if store_config.committer != "magic":
+            s3a_settings["fs.s3a.committer.staging.conflict-mode"] = store_config.conflict_mode
+
+        settings = {f"spark.hadoop.{k}": v for k, v in s3a_settings.items() if v is not None}
+        settings["spark.sql.sources.commitProtocolClass"] = \
+            "org.apache.spark.internal.io.cloud.PathOutputCommitProtocol"
+        settings["spark.sql.parquet.output.committer.class"] = \
+            "org.apache.spark.internal.io.cloud.BindingParquetOutputCommitter"
+
+        return settings
+
+    @staticmethod
+    def generate_delta_settings(config: SimpleSparkConfig) -> dict[str, str]:
+        """Delta catalog plus write and table property defaults, applied to tables created by this environment"""
+
+        delta_config = config.delta
+
+        settings = {
+            "spark.sql.extensions": "io.delta.sql.DeltaSparkSessionExtension",
+            "spark.sql.catalog.spark_catalog": "org.apache.spark.sql.delta.catalog.DeltaCatalog",
+        }
+
+        # Optimized writes and auto compaction are part of open source Delta from 3.1
+        if parse_version(config.get_package_version('delta')) >= (3, 1):
+            settings["spark.databricks.delta.optimizeWrite.enabled"] = str(delta_config.optimize_write).lower()
+            settings["spark.databricks.delta.autoCompact.enabled"] = str(delta_config.auto_compact).lower()
+        elif delta_config.optimize_write or delta_config.auto_compact:
+            print(f"WARNING: Delta {config.get_package_version('delta')} does not support optimized writes "
+                  "or auto compaction, use `delta maintain` to compact tables")
+
+        defaults = "spark.databricks.delta.properties.defaults"
+        if delta_config.num_indexed_cols is not None:
+            settings[f"{defaults}.dataSkippingNumIndexedCols"] = delta_config.num_indexed_cols
+        if delta_config.checkpoint_interval is not None:
+            settings[f"{defaults}.checkpointInterval"] = delta_config.checkpoint_interval
+
+        return settings
+
+    @staticmethod
+    def generate_dynamic_allocation_settings(config: SimpleSparkConfig) -> dict[str, str]:
+
+        allocation_config = config.dynamic_allocation
+
+        if allocation_config.enabled and not (allocation_config.external_shuffle_service
+                                              or allocation_config.shuffle_tracking
+                                              or config.uses_remote_shuffle()):
+            raise Exception("Dynamic allocation requires `external_shuffle_service`, `shuffle_tracking` "
+                            "or `remote_shuffle`")
+
+        settings = {
+            "spark.dynamicAllocation.enabled": str(allocation_config.enabled).lower(),
+            "spark.dynamicAllocation.minExecutors": allocation_config.min_executors,
+            "spark.dynamicAllocation.maxExecutors": allocation_config.max_executors,
+            "spark.dynamicAllocation.initialExecutors": allocation_config.initial_executors,
+            "spark.dynamicAllocation.executorIdleTimeout": allocation_config.executor_idle_timeout,
+            "spark.dynamicAllocation.cachedExecutorIdleTimeout": allocation_config.cached_executor_idle_timeout,
+            "spark.dynamicAllocation.schedulerBacklogTimeout": allocation_config.scheduler_backlog_timeout,
+            "spark.dynamicAllocation.shuffleTracking.enabled": str(allocation_config.shuffle_tracking).lower(),
+            "spark.shuffle.service.enabled": str(allocation_config.external_shuffle_service).lower(),
+        }
+        if allocation_config.external_shuffle_service:
+            settings["spark.shuffle.service.port"] = allocation_config.shuffle_service_port
+
+        return {k: v for k, v in settings.items() if v is not None}
+
+
+class SetupHistoryServer(BuildTask):
+
+    def name(self) -> str:
+        return "setup-history-server"
+
+    def run(self, config: SimpleSparkConfig):
+
+        history_config = config.history_config
+
+        for directory in [config.event_log_directory, config.history_store_directory]:
+            if not os.path.exists(directory):
+                print(f"Creating directory: {directory}")
+                os.makedirs(directory)
+
+        print(f"Adding event log and history server settings to {config.spark_conf_file_path}")
+
+        settings = {
+            "spark.eventLog.enabled": "true",
+            "spark.eventLog.dir": config.event_log_directory,
+            "spark.eventLog.compress": "true",
+            "spark.eventLog.compression.codec": history_config.compression_codec,
+            "spark.eventLog.rolling.enabled": str(history_config.rolling_enabled).lower(),
+            "spark.eventLog.rolling.maxFileSize": history_config.rolling_max_file_size,
+            "spark.history.fs.logDirectory": config.event_log_directory,
+            "spark.history.fs.update.interval": history_config.update_interval,
+            "spark.history.fs.eventLog.rolling.maxFilesToRetain": history_config.max_files_to_retain,
+            "spark.history.store.path": config.history_store_directory,
+            "spark.history.store.maxDiskUsage": history_config.store_max_disk_usage,
+            "spark.history.store.hybridStore.enabled": str(history_config.hybrid_store_enabled).lower(),
+            "spark.history.fs.cleaner.enabled": str(history_config.cleaner_enabled).lower(),
+            "spark.history.fs.cleaner.interval": history_config.cleaner_interval,
+            "spark.history.fs.cleaner.maxAge": history_config.cleaner_max_age,
+            "spark.history.fs.cleaner.maxNum": history_config.cleaner_max_num,
+            "spark.history.ui.port": history_config.ui_port,
+        }
+
+        with open(config.spark_conf_file_path, 'a') as spark_config_file:
+            for key, value in settings.items():
+                if value is not None:
+                    spark_config_file.write(f"{key} {value}\n")
+
+
+class SetupThriftServer(BuildTask):
+
+    def name(self) -> str:
+        return "setup-thrift-server"
+
+    @staticmethod
+    def generate_fair_scheduler_xml(config: SimpleSparkConfig) -> str:
+
+        """
+        Default pool for sessions that don't choose one, plus one pool per entry of `session_pools`.
+
+        Pools share the cluster fairly with each other, so a session in its own pool is never queued
+        behind long queries of other sessions. Pool names not listed are created by Spark on first use.
+        """
+
+        thrift_config = config.thrift_config
+        pool_names = [thrift_config.scheduler_pool] + [
+            p for p in thrift_config.session_pools or [] if p != thrift_config.scheduler_pool
+        ]
+
+        pools = "".join(f"""
+            <pool name="{escape(pool)}">
+                <schedulingMode>FAIR</schedulingMode>
+                <weight>{thrift_config.pool_weight}</weight>
+                <minShare>{thrift_config.pool_min_share}</minShare>
+            </pool>"""
+            for pool in pool_names
+        )
+
+        xml = f"""<?xml version="1.0"?>
+        <allocations>{pools}
+        </allocations>
+        """
+
+        return xml
+
+    @staticmethod
+    def generate_start_arguments(config: SimpleSparkConfig) -> list[str]:
+
+        thrift_config = config.thrift_config
+
+        arguments = []
+        if thrift_config.driver_memory:
+            arguments.append(f"--driver-memory {thrift_config.driver_memory}")
+
+        spark_settings = {
+            "spark.sql.thriftServer.incrementalCollect": str(thrift_config.incremental_collect).lower(),
+            "spark.sql.thriftServer.ui.retainedSessions": thrift_config.retained_sessions,
+            "spark.sql.thriftServer.ui.retainedStatements": thrift_config.retained_statements,
+        }
+        if thrift_config.fair_scheduler:
+            spark_settings["spark.scheduler.mode"] = "FAIR"
+            spark_settings["spark.scheduler.allocation.file"] = config.fair_scheduler_file_path
+            spark_settings["spark.sql.thriftserver.scheduler.pool"] = thrift_config.scheduler_pool
+
+        hive_settings = {
+            "hive.server2.thrift.port": thrift_config.port,
+            "hive.server2.thrift.min.worker.threads": thrift_config.min_worker_threads,
+            "hive.server2.thrift.max.worker.threads": thrift_config.max_worker_threads,
+            "hive.server2.session.check.interval": thrift_config.session_check_interval,
+            "hive.server2.idle.session.timeout": thrift_config.idle_session_timeout,
+            "hive.server2.idle.operation.timeout": thrift_config.idle_operation_timeout,
+        }
+
+        arguments.extend([f"--conf {k}={v}" for k, v in spark_settings.items() if v is not None])
+        arguments.extend([f"--hiveconf {k}={v}" for k, v in hive_settings.items() if v is not None])
+
+        return arguments
+
+    def run(self, config: SimpleSparkConfig):
+
+        if config.thrift_config.fair_scheduler:
+            print(f"Writing fair scheduler pools to {config.fair_scheduler_file_path}")
+            with open(config.fair_scheduler_file_path, 'w') as f:
+                f.write(self.generate_fair_scheduler_xml(config))
+
+        print(f"Writing Thrift server arguments to {config.thrift_server_args_path}")
+        with open(config.thrift_server_args_path, 'w') as f:
+            for argument in self.generate_start_arguments(config):
+                f.write(f"{argument}\n")
+
+
+class SetupPythonEnvironment(BuildTask):
+
+    def name(self) -> str:
+        return "setup-python-environment"
+
+    def plan(self, config: SimpleSparkConfig, exists: Callable[[str], bool], stats: BuildStats) -> TaskPlan:
+
+        if exists(f"{config.python_environment_directory}/.complete"):
+            if exists(config.python_environment_archive):
+                return TaskPlan(False, "Python environment staged")
+            return TaskPlan(True, "pack staged Python environment", unknown_size=True)
+
+        return TaskPlan(True, f"create Python environment from {config.python_environment.lockfile}",
+                        unknown_size=True)
+
+    @staticmethod
+    def pack_environment(config: SimpleSparkConfig):
+        """Archive shipped once to each worker, see `build_worker_via_ssh`"""
+
+        environment_directory = config.python_environment_directory
+        print(f"Packing Python environment to {config.python_environment_archive}")
+
+        # Marker stays out of the archive, workers create it only after a complete extract
+        def without_marker(member: tarfile.TarInfo) -> tarfile.TarInfo | None:
+            return None if os.path.basename(member.name) == ".complete" else member
+
+        with tarfile.open(f"{config.python_environment_archive}.part", "w:gz") as archive:
+            archive.add(environment_directory, arcname=os.path.basename(environment_directory),
+                        filter=without_marker)
+        os.rename(f"{config.python_environment_archive}.part", config.python_environment_archive)
+
+    def run(self, config: SimpleSparkConfig):
+
+        python_config = config.python_environment
+        if python_config.lock_hash is None:
+            raise Exception(f"Python lockfile {python_config.lockfile} not found")
+
+        environment_directory = config.python_environment_directory
+        complete_marker = f"{environment_directory}/.complete"
+
+        with FileLock(f"{config.simplespark_locks_directory}/pyenv-{python_config.lock_hash}.lock"):
+
+            if os.path.exists(complete_marker):
+                # Images ship the staged environment without its archive
+                if not os.path.exists(config.python_environment_archive):
+                    self.pack_environment(config)
+                print(f"Python environment already staged at {environment_directory}")
+                return
+
+            if os.path.exists(environment_directory):
+                print(f"Removing partial Python environment at {environment_directory}")
+                shutil.rmtree(environment_directory)
+
+            print(f"Creating Python environment from {python_config.lockfile} at {environment_directory}")
+            subprocess.run([python_config.python, "-m", "venv", environment_directory], check=True)
+            subprocess.run([f"{environment_directory}/bin/python", "-m", "pip", "install", "--no-input",
+                            "-r", python_config.lockfile], check=True)
+
+            self.pack_environment(config)
+            open(complete_marker, 'w').close()
+
+
+class SetupAgentToken(BuildTask):
+
+    def name(self) -> str:
+        return "setup-agent-token"
+
+    def run(self, config: SimpleSparkConfig):
+
+        if os.path.exists(config.agent_token_path):
+            print(f"Agent token already exists at {config.agent_token_path}")
+        else:
+            print(f"Generating agent token at {config.agent_token_path}")
+            write_token(config.agent_token_path)
 
 
 class SetupWorker(BuildTask):
@@ -198,10 +827,90 @@ class SetupWorker(BuildTask):
         print('Setting up worker configuration')
 
         with open(config.spark_env_sh_path, 'a') as env_sh_file:
+            self.write_worker_env(config, self.worker_config, env_sh_file)
+
+    @staticmethod
+    def write_worker_env(config: SimpleSparkConfig, worker_config: WorkerConfig, env_sh_file):
+
+        env_sh_file.write(f'export SPARK_WORKER_CORES={worker_config.cores}\n')
+        env_sh_file.write(f'export SPARK_WORKER_MEMORY={worker_config.memory}\n')
+        env_sh_file.write(f'export SPARK_WORKER_INSTANCES={worker_config.instances}\n')
+
+        worker_opts = []
+
+        # Standalone workers host the external shuffle service in their own JVM
+        if config.uses_external_shuffle_service():
+            worker_opts.append("-Dspark.shuffle.service.enabled=true")
+            worker_opts.append(f"-Dspark.shuffle.service.port={config.dynamic_allocation.shuffle_service_port}")
+
+        # Worker only reacts to decommission signal (SIGPWR) when enabled in its own config
+        if config.uses_decommission():
+            worker_opts.append("-Dspark.decommission.enabled=true")
+
+        if worker_opts:
+            env_sh_file.write(f'export SPARK_WORKER_OPTS="{" ".join(worker_opts)}"\n')
+
+        local_dirs, worker_dir = SetupWorker.resolve_scratch_layout(config, worker_config)
+        if local_dirs:
+            print(f'Using local dirs: {",".join(local_dirs)}')
+            env_sh_file.write(f'export SPARK_LOCAL_DIRS={",".join(local_dirs)}\n')
+        if worker_dir:
+            print(f'Using worker dir: {worker_dir}')
+            env_sh_file.write(f'export SPARK_WORKER_DIR={worker_dir}\n')
+
+    @staticmethod
+    def resolve_scratch_layout(config: SimpleSparkConfig, worker_config: WorkerConfig) -> tuple[list[str], str]:
+        """
+        Build shuffle/spill scratch layout for worker, returns `SPARK_LOCAL_DIRS` entries and `SPARK_WORKER_DIR`.
+
+        Each scratch root (explicit `local_dirs` or discovered data disks) gets a `local` directory for
+        shuffle and spill files, the root with the most free space also holds the `work` directory.
+        """
 
-            env_sh_file.write(f'export SPARK_WORKER_CORES={self.worker_config.cores}\n')
-            env_sh_file.write(f'export SPARK_WORKER_MEMORY={self.worker_config.memory}\n')
-            env_sh_file.write(f'export SPARK_WORKER_INSTANCES={self.worker_config.instances}\n')
+        min_free_bytes = 0
+        if worker_config.min_local_dir_free_space:
+            min_free_bytes = parse_size(worker_config.min_local_dir_free_space)
+
+        # Map of scratch root to available bytes
+        scratch_roots: dict[str, int] = {}
+
+        for local_dir in worker_config.local_dirs or []:
+            os.makedirs(local_dir, exist_ok=True)
+            available_bytes = shutil.disk_usage(local_dir).free
+            if available_bytes < min_free_bytes:
+                raise Exception(f"Local dir {local_dir} only has {format_size(available_bytes)} free, "
+                                f"requires {worker_config.min_local_dir_free_space}")
+            scratch_roots[local_dir] = available_bytes
+
+        if worker_config.discover_local_dirs:
+            for disk in discover_data_disks():
+                if disk.available_bytes < min_free_bytes:
+                    print(f'Skipping disk {disk.mount_point}, only {format_size(disk.available_bytes)} free')
+                    continue
+                print(f'Found data disk {disk.device} at {disk.mount_point} '
+                      f'with {format_size(disk.available_bytes)} free')
+                scratch_roots[f"{disk.mount_point}/simplespark/{config.name}"] = disk.available_bytes
+
+            if len(scratch_roots) == 0:
+                print('No data disks found, Spark will use default local dir')
+
+        local_dirs = [f"{root}/local" for root in scratch_roots]
+
+        worker_dir = None
+        if len(scratch_roots) > 0:
+            worker_dir = f"{max(scratch_roots, key=scratch_roots.get)}/work"
+
+        # Spark hashes scratch files evenly across local dirs, so tmpfs takes an equal share of spill files
+        if worker_config.tmpfs_local_dir:
+            if os.path.isdir("/dev/shm"):
+                local_dirs.append(f"/dev/shm/simplespark/{config.name}")
+            else:
+                print('Skipping tmpfs local dir, /dev/shm does not exist')
+
+        for directory in local_dirs + ([worker_dir] if worker_dir else []):
+            os.makedirs(directory, exist_ok=True)
+
+        return local_dirs, worker_dir
 
 
 class ConnectToHiveMetastore(BuildTask):
@@ -212,54 +921,119 @@ class ConnectToHiveMetastore(BuildTask):
     @staticmethod
     def generate_hive_site_xml(config: SimpleSparkConfig) -> str:
 
-        jdbc_config: JdbcConfig = config.metastore_config
+        if config.driver.metastore_server:
+            properties = {"hive.metastore.uris": config.metastore_uri}
+        else:
+            jdbc_config: JdbcConfig = config.metastore_config
+            properties = {
+                "javax.jdo.option.ConnectionURL": jdbc_config.get_url('metastore_db'),
+                "javax.jdo.option.ConnectionDriverName": jdbc_config.jdbc_driver,
+                "javax.jdo.option.ConnectionUserName": jdbc_config.db_user,
+                "javax.jdo.option.ConnectionPassword": jdbc_config.db_pass,
+                "hive.metastore.db.type": jdbc_config.db_type,
+            }
 
-        xml = f"""<configuration>
-        <property>
-            <name>javax.jdo.option.ConnectionURL</name>
-            <value>{jdbc_config.get_url('metastore_db')}</value>
-        </property>
-        <property>
-            <name>javax.jdo.option.ConnectionDriverName</name>
-            <value>{jdbc_config.jdbc_driver}</value>
-        </property>
-        <property>
-            <name>javax.jdo.option.ConnectionUserName</name>
-            <value>{jdbc_config.db_user}</value>
-        </property>
-        <property>
-            <name>javax.jdo.option.ConnectionPassword</name>
-            <value>{jdbc_config.db_pass}</value>
-        </property>
-        <property>
-            <name>hive.metastore.warehouse.dir</name>
-            <value>{config.warehouse_path}</value>
-        </property>
-        <property>
-            <name>hive.metastore.db.type</name>
-            <value>{jdbc_config.db_type}</value>
-        </property>
-        </configuration>
-        """
+        if config.warehouse_path:
+            properties["hive.metastore.warehouse.dir"] = config.warehouse_path
 
-        return xml
+        return generate_site_xml(properties)
 
     def run(self, config: SimpleSparkConfig):
 
-        if config.metastore_config is None:
-            raise Exception("Must specify `metastore_config` to cluster Hive metastore")
-
-        supported_types = {t for t in config.jdbc_drivers.keys()}
-        if config.metastore_config.db_type not in supported_types:
-            raise Exception(
-                f"Metastore db_type '{config.metastore_config.db_type}' "
-                f"not a supported type: [{','.join(supported_types)}]"
-            )
+        if not config.uses_hive_metastore():
+            raise Exception("Must specify `metastore_config` or `driver.metastore_server` to connect to Hive metastore")
 
         with open(config.hive_config_path, "w") as hc:
             hc.write(self.generate_hive_site_xml(config))
 
 
+class SetupMetastoreServer(BuildTask):
+
+    def name(self) -> str:
+        return "setup-metastore-server"
+
+    @staticmethod
+    def get_environment(config: SimpleSparkConfig) -> dict[str, str]:
+
+        environment = os.environ.copy()
+        environment["JAVA_HOME"] = config.get_package_home_directory('java')
+        environment["HADOOP_HOME"] = config.get_package_home_directory('hadoop')
+        environment["METASTORE_HOME"] = config.get_package_home_directory('hive')
+        environment["METASTORE_CONF_DIR"] = config.metastore_conf_directory
+        if config.metastore_server_config.heap_size_mb:
+            environment["HADOOP_HEAPSIZE"] = str(config.metastore_server_config.heap_size_mb)
+
+        return environment
+
+    @staticmethod
+    def generate_metastore_site_xml(config: SimpleSparkConfig) -> str:
+
+        server_config = config.metastore_server_config
+
+        # Embedded Derby stands in for the database when no `metastore_config` is defined
+        if config.metastore_config:
+            jdbc_config: JdbcConfig = config.metastore_config
+            properties = {
+                "javax.jdo.option.ConnectionURL": jdbc_config.get_url('metastore_db'),
+                "javax.jdo.option.ConnectionDriverName": jdbc_config.jdbc_driver,
+                "javax.jdo.option.ConnectionUserName": jdbc_config.db_user,
+                "javax.jdo.option.ConnectionPassword": jdbc_config.db_pass,
+            }
+        else:
+            properties = {
+                "javax.jdo.option.ConnectionURL": config.metastore_derby_url,
+                "javax.jdo.option.ConnectionDriverName": "org.apache.derby.jdbc.EmbeddedDriver",
+            }
+
+        properties |= {
+            "metastore.thrift.port": server_config.port,
+            "metastore.server.min.threads": server_config.min_server_threads,
+            "metastore.server.max.threads": server_config.max_server_threads,
+            "datanucleus.connectionPoolingType": server_config.connection_pool,
+            "datanucleus.connectionPool.maxPoolSize": server_config.max_pool_size,
+            "metastore.aggregate.stats.cache.enabled": str(server_config.aggregate_stats_cache).lower(),
+            "metastore.schema.verification": "true",
+            "datanucleus.schema.autoCreateAll": "false",
+        }
+
+        if server_config.cached_store:
+            properties["metastore.rawstore.impl"] = "org.apache.hadoop.hive.metastore.cache.CachedStore"
+
+        if config.warehouse_path:
+            properties["metastore.warehouse.dir"] = config.warehouse_path
+
+        return generate_site_xml(properties)
+
+    def run(self, config: SimpleSparkConfig):
+
+        if not os.path.exists(config.metastore_conf_directory):
+            print(f"Creating metastore conf directory: {config.metastore_conf_directory}")
+            os.makedirs(config.metastore_conf_directory)
+
+        metastore_site_path = f"{config.metastore_conf_directory}/metastore-site.xml"
+        print(f"Writing metastore server config to {metastore_site_path}")
+        with open(metastore_site_path, "w") as f:
+            f.write(self.generate_metastore_site_xml(config))
+
+        metastore_home = config.get_package_home_directory('hive')
+        if config.metastore_config:
+            MavenDownloader.download_jar(config.metastore_config.db_connector, f"{metastore_home}/lib")
+            db_type = config.metastore_config.db_type
+        else:
+            db_type = "derby"
+
+        schematool = f"{metastore_home}/bin/schematool"
+        environment = self.get_environment(config)
+
+        schema_info = subprocess.run([schematool, "-dbType", db_type, "-info"],
+                                     env=environment, capture_output=True, text=True)
+        if schema_info.returncode == 0:
+            print("Metastore schema already initialized")
+        else:
+            print(f"Initializing {db_type} metastore schema")
+            subprocess.run([schematool, "-dbType", db_type, "-initSchema"], env=environment, check=True)
+
+
 class SetupDriverJars(BuildTask):
 
     def name(self) -> str:
@@ -267,10 +1041,17 @@ class SetupDriverJars(BuildTask):
 
     def run(self, config: SimpleSparkConfig):
 
+        jdbc_connectors = list(config.jdbc_drivers.values()) if config.jdbc_drivers else []
+
+        # Driver connects straight to the metastore database unless a metastore server is used
+        if config.metastore_config and not config.driver.metastore_server:
+            jdbc_connectors.append(config.metastore_config.db_connector)
+
         packages = []
-        if config.jdbc_drivers:
-            for jdbc_maven in config.jdbc_drivers.values():
-                packages.append(f"{jdbc_maven.group_id}:{jdbc_maven.artifact_id}:{jdbc_maven.version}")
+        for jdbc_maven in jdbc_connectors:
+            package = f"{jdbc_maven.group_id}:{jdbc_maven.artifact_id}:{jdbc_maven.version}"
+            if package not in packages:
+                packages.append(package)
 
         if len(packages) > 0:
             with open(config.spark_conf_file_path, 'a') as f:
@@ -278,6 +1059,52 @@ class SetupDriverJars(BuildTask):
 
 
 
+class SetupRemoteShuffle(BuildTask):
+
+    def __init__(self, host: str):
+        self.host = host
+
+    def name(self) -> str:
+        return "setup-remote-shuffle"
+
+    def run(self, config: SimpleSparkConfig):
+
+        shuffle_config = config.remote_shuffle
+        run_directory = f"{config.run_directory}/celeborn"
+
+        storage_dirs = shuffle_config.storage_dirs
+        if storage_dirs is None:
+            worker_config = config.get_worker_config(self.host)
+            local_dirs = worker_config.local_dirs if worker_config else None
+            storage_dirs = ([f"{d}/celeborn" for d in local_dirs] if local_dirs
+                            else [f"{config.simplespark_environment_directory}/{config.name}/celeborn-data"])
+
+        for directory in [config.celeborn_conf_directory, run_directory] + storage_dirs:
+            os.makedirs(directory, exist_ok=True)
+
+        settings = {
+            "celeborn.master.endpoints": config.celeborn_master_endpoint,
+            "celeborn.master.host": config.driver.host,
+            "celeborn.master.port": shuffle_config.master_port,
+            "celeborn.worker.storage.dirs": ",".join(storage_dirs),
+            "celeborn.worker.commitFiles.threads": 128,
+            "celeborn.client.push.replicate.enabled": str(shuffle_config.replicate).lower(),
+        }
+
+        print(f"Writing Celeborn config to {config.celeborn_conf_directory}")
+        with open(f"{config.celeborn_conf_directory}/celeborn-defaults.conf", 'w') as f:
+            for key, value in settings.items():
+                f.write(f"{key} {value}\n")
+
+        with open(f"{config.celeborn_conf_directory}/celeborn-env.sh", 'w') as f:
+            f.write(f"export JAVA_HOME={config.get_package_home_directory('java')}\n")
+            f.write(f"export CELEBORN_MASTER_MEMORY={shuffle_config.master_memory}\n")
+            f.write(f"export CELEBORN_WORKER_MEMORY={shuffle_config.worker_memory}\n")
+            f.write(f"export CELEBORN_WORKER_OFFHEAP_MEMORY={shuffle_config.worker_offheap_memory}\n")
+            f.write(f"export CELEBORN_PID_DIR={run_directory}\n")
+            f.write(f"export CELEBORN_LOG_DIR={run_directory}/logs\n")
+
+
 class SetupActivateScript(BuildTask):
 
     def name(self) -> str:
@@ -290,10 +1117,20 @@ class SetupActivateScript(BuildTask):
             "SCALA_HOME": config.get_package_home_directory('scala'),
             "SPARK_HOME": config.get_package_home_directory('spark'),
             "SPARK_CONF_DIR": config.spark_conf_directory,
-            "SIMPLESPARK_ENVIRONMENT_NAME": config.name
+            "SIMPLESPARK_ENVIRONMENT_NAME": config.name,
+            "MASTER": config.spark_master
         }
         new_path_additions = ["$JAVA_HOME/bin", "$SCALA_HOME/bin", "$SPARK_HOME/bin"]
 
+        if config.uses_remote_shuffle():
+            new_env_variables["CELEBORN_HOME"] = config.get_package_home_directory('celeborn')
+            new_env_variables["CELEBORN_CONF_DIR"] = config.celeborn_conf_directory
+
+        if config.has_package('hadoop'):
+            new_env_variables["HADOOP_HOME"] = config.get_package_home_directory('hadoop')
+            new_env_variables["LD_LIBRARY_PATH"] = f"{config.hadoop_native_library_directory}:$LD_LIBRARY_PATH"
+            new_path_additions.append("$HADOOP_HOME/bin")
+
         with open(config.activate_script_path, 'w') as f:
 
             # Add `export` command for each new environment variable
@@ -2,18 +2,18 @@
 from simplespark.environment.config import *
 
 DEFAULT_PACKAGES = [
-    PackageConfig("java", "8u442-b06"),
+    PackageConfig("java", "17.0.14+7"),
     PackageConfig("scala", "2.12.18"),
     PackageConfig("spark", "3.5.5"),
     PackageConfig("delta", "3.2.0"),
-    PackageConfig("hadoop", "3.3.1"),
-    PackageConfig("hive", "3.1.2")
+    PackageConfig("hadoop", "3.3.4"),
+    PackageConfig("hive", "4.1.0")
 ]
 
 
 DEFAULT_JDBC_CONNECTORS = [
     MavenConfig("com.mysql", "mysql-connector-j", "9.2.0", "com.mysql.cj.jdbc.Driver", "mysql"),
-    MavenConfig("org.postgresql", "postgresql", "42.7.4", "org.postgresql.Driver", "postgres")
+    MavenConfig("org.postgresql", "postgresql", "42.7.4", "org.postgresql.Driver", "postgresql")
 ]
 
 
@@ -45,7 +45,6 @@ class Templates:
                        with_delta: bool = False) -> SimpleSparkConfig:
 
         packages = DEFAULT_PACKAGES.copy()
-        Templates._drop_package(packages, 'hadoop')
 
         if not with_delta:
             Templates._drop_package(packages, 'delta')
@@ -68,7 +67,6 @@ class Templates:
                             with_delta: bool = False) -> SimpleSparkConfig:
 
         packages = DEFAULT_PACKAGES.copy()
-        Templates._drop_package(packages, 'hadoop')
 
         if not with_delta:
             Templates._drop_package(packages, 'delta')
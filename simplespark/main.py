@@ -1,28 +1,94 @@
+from dataclasses import replace
+import hashlib
+import json
+import math
 import os
+import re
+import shlex
 import socket
+import subprocess
+import sys
+import tempfile
+import time
 
 import typer
 
-from simplespark.environment.build import build_environment, build_worker, build_home
-from simplespark.environment.config import SimpleSparkConfig
+from simplespark.environment.build import (
+    build_environment, build_worker, build_home, build_worker_via_ssh, format_build_plan, plan_build
+)
+from simplespark.environment.config import SimpleSparkConfig, WorkerConfig
+from simplespark.environment.image import export_image, import_image
+from simplespark.environment.remote import (
+    create_agent_action_handler, get_agent_client, open_host_shell, rebuild_worker, run_on_worker, run_worker_action
+)
+from simplespark.environment.tasks import SetupMetastoreServer
 from simplespark.environment.templates import Templates
-from simplespark.utils.shell import ShellManager
-from simplespark.utils.ssh import SSHUtils
+from simplespark.utils.agent import AgentServer, read_token
+from simplespark.utils.buildstats import BuildStats
+from simplespark.utils.daemon import start_daemon, stop_daemon
+from simplespark.utils.delta import (
+    MAINTAIN_SCRIPT, generate_cron_command, generate_maintain_arguments, parse_maintain_output
+)
+from simplespark.utils.disks import format_size, parse_size
+from simplespark.utils.eventlog import (
+    analyze_event_log, find_event_log, find_latest_event_log, format_stage_table, summarize_event_log
+)
+from simplespark.utils.logs import collect_logs, follow_logs, generate_list_command
+from simplespark.utils.master import get_host_workers, get_master_state
+from simplespark.utils.native import parse_checknative_output, run_checknative
+from simplespark.utils.network import wait_for_port
+from simplespark.utils.objectstore import CHECK_SCRIPT, parse_check_output
+from simplespark.utils.probe import find_outliers, format_probe_table, run_probe
+from simplespark.utils.runs import RunRecord, RunStore
+from simplespark.utils.shell import CommandReturn, ShellManager
+from simplespark.utils.thrift_bench import run_bench
+
+# Standalone application IDs appear in spark-submit logs, local mode IDs only in the event log
+APPLICATION_ID_PATTERN = re.compile(r"\bapp-\d{14}-\d{4,}\b")
 
 app = typer.Typer()
+scale_app = typer.Typer(help="Add or remove individual standalone workers")
+app.add_typer(scale_app, name="scale")
+runs_app = typer.Typer(help="History of submitted jobs and regression reports")
+app.add_typer(runs_app, name="runs")
+agent_app = typer.Typer(help="Persistent worker agents for low latency remote commands")
+app.add_typer(agent_app, name="agent")
+image_app = typer.Typer(help="Export and import relocatable environment images")
+app.add_typer(image_app, name="image")
+delta_app = typer.Typer(help="Delta Lake table maintenance")
+app.add_typer(delta_app, name="delta")
+
+
+def get_active_config() -> SimpleSparkConfig:
+
+    environment_name = os.environ.get("SIMPLESPARK_ENVIRONMENT_NAME", None)
+    if environment_name is None:
+        raise Exception("Environment not activated, activate environment using `source <name>.env`")
+
+    return SimpleSparkConfig.get_simplespark_config(environment_name)
 
 
 @app.command()
-def build(config_paths: str):
+def build(config_paths: str, image: str = None, plan: bool = False):
 
     config_files: list[str] = config_paths.split(',')
     config = SimpleSparkConfig.read(*config_files)
 
+    # Plan only reads local and worker state, nothing below runs
+    if plan:
+        print(format_build_plan(plan_build(config, image), BuildStats(config.build_stats_path)))
+        return
+
     simplespark_home = os.environ.get("SIMPLESPARK_HOME", "")
     if config.simplespark_home != simplespark_home:
         print('Setting up new SIMPLESPARK_HOME directory')
         build_home(config)
 
+    # Image installs package homes up front, build tasks then skip their downloads
+    if image:
+        print(f"Importing image {image}")
+        import_image(image, config.simplespark_home)
+
     environment_directory = f"{config.simplespark_environment_directory}/{config.name}"
     if not os.path.exists(environment_directory):
         print(f"Creating environment directory: {environment_directory}")
@@ -34,14 +100,13 @@ def build(config_paths: str):
     config.write()
 
     print('Setup simplespark environment')
-    build_environment(config)
+    build_environment(config, image)
 
     print(f"Run `source {config.name}.spark` to activate environment")
     print(f"Note: May need to run `source {config.bash_profile_file}` first to update environment variables")
 
 
-# FIXME implement after bug fixes
-# @app.command()
+@app.command()
 def run(name: str, code_directory: str, main_file: str):
 
     config = SimpleSparkConfig.get_simplespark_config(name)
@@ -50,59 +115,483 @@ def run(name: str, code_directory: str, main_file: str):
     shell = ShellManager(config)
 
     # Identify name of code directory using folder name
-    code_name = code_directory.split("/")[-1]
+    code_name = code_directory.rstrip("/").split("/")[-1]
     code_destination = f"{config.simplespark_home}/archive/{code_name}.zip"
 
     print(f"Packaging code at {code_directory}")
     print(f"Copying code to {code_destination}")
-    shell.archive_and_copy(code_directory, code_destination)
+    code_hash = shell.archive_and_copy(code_directory, code_destination)
 
     print(f"Running file {main_file}")
-    shell.spark_submit_python(main_file, code_destination)
+    started_at = time.time()
+    result = shell.spark_submit_python(main_file, code_destination)
+    wall_seconds = time.time() - started_at
+
+    record = RunRecord(
+        environment=config.name,
+        job=f"{code_name}/{main_file}",
+        started_at=time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started_at)),
+        code_hash=code_hash,
+        config_hash=hash_config(config),
+        wall_seconds=wall_seconds,
+        exit_code=result.returncode
+    )
+    collect_run_metrics(config, record, result.stdout, started_at)
+
+    store = RunStore(config.runs_database_path)
+    run_id = store.add(record)
+    store.close()
+    print(f"Recorded run {run_id}: {record.job} app {record.app_id} exit {record.exit_code} "
+          f"in {wall_seconds:.1f}s")
+
+
+def hash_config(config: SimpleSparkConfig) -> str:
+
+    config_hash = hashlib.sha256(json.dumps(config.to_json(), sort_keys=True).encode())
+    if os.path.exists(config.spark_conf_file_path):
+        with open(config.spark_conf_file_path, 'rb') as f:
+            config_hash.update(f.read())
+
+    return config_hash.hexdigest()
+
+
+def collect_run_metrics(config: SimpleSparkConfig, record: RunRecord, output: str, started_at: float):
+    """Fill application ID and metrics from the event log, falling back to the master API"""
+
+    match = APPLICATION_ID_PATTERN.search(output)
+    record.app_id = match.group(0) if match else None
+
+    event_log = None
+    if os.path.isdir(config.event_log_directory):
+        event_log = (find_event_log(config.event_log_directory, record.app_id) if record.app_id
+                     else find_latest_event_log(config.event_log_directory, started_at))
+
+    if event_log is not None:
+        try:
+            summary = summarize_event_log(event_log)
+            record.app_id = record.app_id or summary.app_id
+            record.executor_run_time_ms = summary.executor_run_time_ms
+            record.shuffle_bytes = summary.shuffle_read_bytes + summary.shuffle_write_bytes
+            record.metrics = summary.to_dict()
+            return
+        except Exception as e:
+            print(f"WARNING: Could not read event log {event_log}: {e}")
+
+    if record.app_id and not config.daemonless:
+        try:
+            state = get_master_state(config.spark_master_ui_url)
+            for app in state.get("completedapps", []) + state.get("activeapps", []):
+                if app.get("id") == record.app_id:
+                    record.metrics = {k: app.get(k) for k in ("duration", "cores", "memoryperslave", "state")}
+        except OSError as e:
+            print(f"WARNING: Could not reach master for application metrics: {e}")
+
+
+@app.command()
+def analyze(event_log: str, output_format: str = "table", top: int = None):
+    """Stage report for an event log path, or an application ID in the active environment's event log directory"""
+
+    if not os.path.exists(event_log):
+        config = get_active_config()
+        app_event_log = find_event_log(config.event_log_directory, event_log)
+        if app_event_log is None:
+            raise Exception(f"No event log found at {event_log} or for application in {config.event_log_directory}")
+        event_log = app_event_log
+
+    reports = analyze_event_log(event_log)
+    if top is not None:
+        reports = sorted(reports, key=lambda r: r.duration_ms or 0, reverse=True)[:top]
+
+    match output_format:
+        case "table":
+            print(format_stage_table(reports))
+        case "json":
+            print(json.dumps([r.to_dict() for r in reports], indent=2))
+        case _:
+            raise Exception(f"Unknown output format {output_format}, use `table` or `json`")
+
+
+@app.command()
+def probe(apply: bool = False, exclude_outliers: bool = False, threshold: float = 0.3,
+          size_mb: int = 256, seconds: float = 2.0):
+
+    config = get_active_config()
+    if not config.workers:
+        raise Exception("No workers configured to probe")
+
+    hosts = [w.host for w in config.workers]
+    python = config.python_environment.python if config.python_environment else "python3"
+    directories = {w.host: (w.local_dirs or ["/tmp"])[0] for w in config.workers}
+    local_hosts = {'localhost', config.driver.host}
+
+    print(f"Probing {len(hosts)} hosts")
+    results = run_probe(hosts, python, directories, local_hosts, size_mb, seconds)
+    outliers = find_outliers(results, threshold)
+    print(format_probe_table(results, outliers))
+
+    os.makedirs(os.path.dirname(config.probe_results_path), exist_ok=True)
+    with open(config.probe_results_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {config.probe_results_path}")
+
+    if not (apply or exclude_outliers):
+        return
+
+    for w in config.workers:
+        result = results.get(w.host, {})
+        instances = w.instances or 1
+        if apply and result.get("cores"):
+            # Leave 10% (at least 1g) of host memory to the OS and daemons
+            usable_memory = result["memory_bytes"] - max(parse_size("1g"), result["memory_bytes"] // 10)
+            w.cores = max(1, result["cores"] // instances)
+            w.memory = f"{max(1, usable_memory // instances // parse_size('1g'))}g"
+            print(f"{w.host}: cores {w.cores}, memory {w.memory} per instance")
+        if exclude_outliers:
+            w.excluded = w.host in outliers
+            if w.excluded:
+                print(f"{w.host}: excluded from start ({', '.join(outliers[w.host])})")
+
+    config.write()
+    print("Config updated, rebuild workers (`restart --rolling --rebuild`) to apply capacity changes")
+
+
+@runs_app.command("list")
+def runs_list(job: str = None, limit: int = 20):
+
+    config = get_active_config()
+    store = RunStore(config.runs_database_path)
+
+    print(f"{'ID':>5}  {'STARTED':19}  {'EXIT':>4}  {'WALL':>8}  {'SHUFFLE':>10}  {'APP':28}  JOB")
+    for r in store.list_runs(config.name, job, limit):
+        shuffle = format_size(r.shuffle_bytes) if r.shuffle_bytes is not None else '-'
+        print(f"{r.id:>5}  {r.started_at:19}  {r.exit_code:>4}  {r.wall_seconds:>7.1f}s  {shuffle:>10}  "
+              f"{r.app_id or '-':28}  {r.job}")
+
+    store.close()
+
+
+@runs_app.command("compare")
+def runs_compare(threshold: float = 0.2, baseline_runs: int = 5, job: str = None):
+
+    config = get_active_config()
+    store = RunStore(config.runs_database_path)
+    regressions = store.find_regressions(config.name, threshold, baseline_runs, job)
+    store.close()
+
+    if not regressions:
+        print(f"No regressions above {threshold:.0%} against median of last {baseline_runs} runs")
+        return
+
+    for r in regressions:
+        print(f"REGRESSION {r.job} run {r.run_id}: {r.metric} {r.baseline:.1f} -> {r.latest:.1f} (+{r.change:.0%})")
+
+    raise typer.Exit(code=1)
 
 
 @app.command()
 def start():
 
-    environment_name = os.environ.get("SIMPLESPARK_ENVIRONMENT_NAME", None)
-    if environment_name is None:
-        raise Exception("Environment not activated, activate environment using `source <name>.env`")
-    config = SimpleSparkConfig.get_simplespark_config(environment_name)
+    config = get_active_config()
+
+    # Shuffle service must accept registrations before the first executor starts
+    if config.uses_remote_shuffle():
+        start_remote_shuffle(config)
+
+    if config.daemonless:
+        print(f"Daemonless local mode, applications run in-process with {config.spark_master}")
+    else:
+        start_cluster(config)
+
+    # Metastore must be up before any Spark driver process connects to it
+    if config.driver.metastore_server:
+        start_metastore_server(config)
+
+    if config.driver.connect_server:
+        os.system("bash $SPARK_HOME/sbin/start-connect-server.sh")
+        print(f"Started Spark Connect server on {config.driver.host}")
+
+    if config.driver.thrift_server:
+        start_thrift_server(config)
+
+    if config.driver.history_server:
+        os.system("bash $SPARK_HOME/sbin/start-history-server.sh")
+        print(f"Started history server on {config.driver.host}:{config.history_config.ui_port}")
+
+
+def get_remote_shuffle_hosts(config: SimpleSparkConfig) -> list[str]:
+    if config.mode == 'local':
+        return [config.driver.host]
+    return [w.host for w in config.get_active_workers()]
+
+
+def start_remote_shuffle(config: SimpleSparkConfig):
+
+    print(f"Starting Celeborn master at {config.celeborn_master_endpoint}")
+    os.system("bash $CELEBORN_HOME/sbin/start-master.sh")
+
+    for host in get_remote_shuffle_hosts(config):
+        print(f"Starting Celeborn worker {host}")
+        if host in ('localhost', config.driver.host):
+            os.system("bash $CELEBORN_HOME/sbin/start-worker.sh")
+        else:
+            run_worker_action(config, host, "start-shuffle-worker")
+
+
+def stop_remote_shuffle(config: SimpleSparkConfig):
+
+    for host in get_remote_shuffle_hosts(config):
+        print(f"Stopping Celeborn worker {host}")
+        if host in ('localhost', config.driver.host):
+            os.system("bash $CELEBORN_HOME/sbin/stop-worker.sh")
+        else:
+            run_worker_action(config, host, "stop-shuffle-worker")
+
+    os.system("bash $CELEBORN_HOME/sbin/stop-master.sh")
+    print("Stopped Celeborn master")
+
+
+def start_cluster(config: SimpleSparkConfig):
 
     print(f"Starting master at {config.spark_master}")
     os.system("bash $SPARK_HOME/sbin/start-master.sh")
 
-    start_worker_command = f"bash $SPARK_HOME/sbin/start-worker.sh {config.spark_master}"
-
     if config.mode == "local":
-        os.system(start_worker_command)
+        os.system(f"bash $SPARK_HOME/sbin/start-worker.sh {config.spark_master}")
     elif config.mode == "standalone":
         for w in config.workers:
+            if w.excluded:
+                print(f'Skipping excluded worker {w.host}')
+                continue
             print(f'Starting worker {w.host}')
-            ssh = SSHUtils(w.host)
-            i,o,e = ssh.run(f". {config.bash_profile_file}; source {config.activate_script_path}; "
-                            f"{start_worker_command}")
-            for line in o.readlines():
-                print(line)
-            for line in e.readlines():
-                print(line)
+            run_worker_action(config, w.host, "start-worker")
+
+    if config.uses_external_shuffle_service():
+        check_shuffle_services(config)
+
+
+def check_shuffle_services(config: SimpleSparkConfig):
+
+    # External shuffle service runs inside each worker daemon, so it follows worker start/stop
+    shuffle_port = config.dynamic_allocation.shuffle_service_port
+    worker_hosts = ['localhost'] if config.mode == 'local' else [w.host for w in config.get_active_workers()]
+
+    for host in worker_hosts:
+        if wait_for_port(host, shuffle_port, timeout=60):
+            print(f"External shuffle service running on {host}:{shuffle_port}")
+        else:
+            print(f"WARNING: External shuffle service not reachable on {host}:{shuffle_port}")
+
+
+def start_metastore_server(config: SimpleSparkConfig):
+
+    metastore_command = [f"{config.get_package_home_directory('hive')}/bin/start-metastore"]
+    start_daemon(metastore_command, f"{config.run_directory}/metastore.pid", f"{config.run_directory}/metastore.log",
+                 env=SetupMetastoreServer.get_environment(config))
+
+    if wait_for_port(config.driver.host, config.metastore_server_config.port):
+        print(f"Started Hive metastore server at {config.metastore_uri}")
+    else:
+        raise Exception(f"Hive metastore server did not start, check {config.run_directory}/metastore.log")
+
+
+def start_thrift_server(config: SimpleSparkConfig):
+
+    thrift_arguments = ""
+    if os.path.exists(config.thrift_server_args_path):
+        with open(config.thrift_server_args_path, 'r') as f:
+            thrift_arguments = " ".join(line.strip() for line in f if line.strip())
+
+    os.system(f"bash $SPARK_HOME/sbin/start-thriftserver.sh {thrift_arguments}")
+    print(f"Started JDBC/ODBC Thrift server on {config.driver.host}:{config.thrift_config.port}")
+
+    # Cached tables live in the shared cache manager so every JDBC session reuses them
+    if config.thrift_config.cached_tables:
+
+        if not wait_for_port(config.driver.host, config.thrift_config.port):
+            print("Thrift server did not come up, skipping table caching")
+            return
+
+        cache_statements = ";".join(f"CACHE TABLE {t}" for t in config.thrift_config.cached_tables)
+        print(f"Caching tables: {', '.join(config.thrift_config.cached_tables)}")
+        # Argument list, table names from config never pass through a shell
+        result = subprocess.run(["bash", f"{config.spark_home}/bin/beeline", "-u", config.thrift_jdbc_url,
+                                 "-e", cache_statements])
+        if result.returncode != 0:
+            raise Exception(f"Caching tables failed, beeline exited with {result.returncode}")
+
+
+@app.command()
+def stop():
+
+    config = get_active_config()
+
+    if not config.daemonless:
+        stop_cluster(config)
 
     if config.driver.connect_server:
-        os.system("bash $SPARK_HOME/sbin/start-connect-server.sh")
-        print(f"Started Spark Connect server on {config.driver.host}")
+        os.system("bash $SPARK_HOME/sbin/stop-connect-server.sh")
+        print(f"Stopped Spark Connect server on {config.driver.host}")
 
     if config.driver.thrift_server:
-        os.system("bash $SPARK_HOME/sbin/start-thriftserver.sh")
-        print(f"Started JDBC/ODBC Thrift server on {config.driver.host}")
+        os.system("bash $SPARK_HOME/sbin/stop-thriftserver.sh")
+        print(f"Stopped JDBC/ODBC Thrift server on {config.driver.host}")
+
+    if config.driver.history_server:
+        os.system("bash $SPARK_HOME/sbin/stop-history-server.sh")
+        print(f"Stopped history server on {config.driver.host}")
+
+    if config.driver.metastore_server:
+        stop_daemon(f"{config.run_directory}/metastore.pid")
+        print(f"Stopped Hive metastore server on {config.driver.host}")
+
+    if config.uses_remote_shuffle():
+        stop_remote_shuffle(config)
 
 
 @app.command()
-def stop():
+def thrift_bench(query: str, concurrency: int = 4, iterations: int = 10, session_pools: bool = False):
 
-    environment_name = os.environ.get("SIMPLESPARK_ENVIRONMENT_NAME", None)
-    if environment_name is None:
-        raise Exception("Environment not activated, activate environment using `source <name>.env`")
-    config = SimpleSparkConfig.get_simplespark_config(environment_name)
+    config = get_active_config()
+
+    if not config.driver.thrift_server:
+        raise Exception("Thrift server not enabled for environment, set `driver.thrift_server`")
+
+    # Each session in its own scheduler pool, compare with the shared pool to measure fair sharing
+    if session_pools:
+        jdbc_urls = [config.get_thrift_session_url(f"bench-{i}") for i in range(concurrency)]
+    else:
+        jdbc_urls = [config.thrift_jdbc_url] * concurrency
+
+    print(f"Running {concurrency} sessions x {iterations} queries against {config.thrift_jdbc_url}")
+    result = run_bench(f"{config.spark_home}/bin/beeline", jdbc_urls, query, iterations)
+    print(result.summary())
+
+
+@app.command()
+def native_check():
+
+    config = get_active_config()
+
+    if not config.has_package('hadoop'):
+        raise Exception("Hadoop package not in environment, add `hadoop` to packages and rebuild")
+
+    environment = dict(os.environ, JAVA_HOME=config.get_package_home_directory('java'),
+                       HADOOP_HOME=config.get_package_home_directory('hadoop'))
+    outputs = {config.driver.host: run_checknative(config.get_package_home_directory('hadoop'), environment)}
+
+    if config.mode == 'standalone':
+        for w in config.workers:
+            if w.host != config.driver.host:
+                lines = []
+                run_worker_action(config, w.host, "native-check", on_output=lines.append)
+                outputs[w.host] = "".join(lines)
+
+    for host, output in outputs.items():
+        libraries = parse_checknative_output(output)
+        if not libraries:
+            print(f"{host}: checknative failed\n{output}")
+            continue
+        loaded = [name for name, (ok, _) in libraries.items() if ok]
+        missing = [name for name, (ok, _) in libraries.items() if not ok]
+        print(f"{host}: loaded {', '.join(loaded) or 'none'}; missing {', '.join(missing) or 'none'}")
+
+
+def submit_script(config: SimpleSparkConfig, shell: ShellManager, script_name: str, script: str,
+                  arguments: str) -> CommandReturn:
+    """Copy a built in PySpark script to the driver's run directory and `spark-submit` it"""
+
+    script_path = f"{config.run_directory}/{script_name}"
+    with tempfile.NamedTemporaryFile('w', suffix=f"-{script_name}") as f:
+        f.write(script)
+        f.flush()
+        shell.copy_file(f.name, script_path)
+
+    return shell.run_command(f"{config.spark_home}/bin/spark-submit --master {config.spark_master} "
+                             f"{script_path} {arguments}")
+
+
+@delta_app.command("maintain")
+def delta_maintain(tables: str = None, schedule: bool = False, unschedule: bool = False):
+    """Run OPTIMIZE and VACUUM on `delta.tables` (or comma separated `--tables`), `--schedule` installs a cron entry"""
+
+    config = get_active_config()
+    if not config.has_package('delta'):
+        raise Exception("Delta package not in environment, add `delta` to packages and rebuild")
+
+    shell = ShellManager(config)
+
+    if schedule and not config.delta.schedule:
+        raise Exception("Set `delta.schedule` to a cron expression, ex. `0 3 * * *`")
+
+    if schedule or unschedule:
+        result = shell.run_command(generate_cron_command(config, None if unschedule else config.delta.schedule))
+        if result.returncode != 0:
+            raise Exception(f"Failed to update crontab on {config.driver.host}")
+        print("Removed delta maintain schedule" if unschedule else f"Scheduled delta maintain: {config.delta.schedule}")
+        return
+
+    table_names = tables.split(',') if tables else config.delta.tables
+    if not table_names:
+        raise Exception("No tables to maintain, set `delta.tables` or pass `--tables`")
+
+    result = submit_script(config, shell, "delta_maintain.py", MAINTAIN_SCRIPT,
+                           generate_maintain_arguments(config, table_names))
+
+    for table in parse_maintain_output(result.stdout):
+        if "error" in table:
+            print(f"{table['table']}: FAILED {table['error']}")
+        else:
+            print(f"{table['table']}: {table['files_removed']} files compacted into {table['files_added']} "
+                  f"in {table['optimize_seconds']:.1f}s, vacuum {table['vacuum_seconds']:.1f}s")
+
+    if result.returncode != 0:
+        raise Exception(f"Delta maintenance failed with exit code {result.returncode}")
+
+
+@app.command()
+def object_store_check(path: str):
+    """Write and read back a small table under `path` (ex. `s3a://bucket/tmp`) and report the committer used"""
+
+    config = get_active_config()
+    if config.object_store is None:
+        raise Exception("No `object_store` section in config, add one and rebuild")
+
+    result = submit_script(config, ShellManager(config), "object_store_check.py", CHECK_SCRIPT, shlex.quote(path))
+    check = parse_check_output(result.stdout)
+    if result.returncode != 0 or check is None:
+        raise Exception(f"Object store check failed with exit code {result.returncode}")
+
+    print(f"Wrote and read {check['rows']} rows at {check['path']}")
+    print(f"Write {check['write_seconds']:.1f}s, read {check['read_seconds']:.1f}s, committer {check['committer']}")
+    if check['committer'] != config.object_store.committer:
+        raise Exception(f"Expected S3A {config.object_store.committer} committer but job used {check['committer']}, "
+                        "check that the environment jars are on the class path")
+
+
+@app.command()
+def logs(app_id: str = None, since: str = None, until: str = None, output_dir: str = None,
+         follow: bool = False, interval: float = 2.0):
+
+    config = get_active_config()
+    output_dir = output_dir or config.collected_logs_directory
+
+    hosts = [config.driver.host] + [w.host for w in config.workers or [] if w.host != config.driver.host]
+    shells = [open_host_shell(config, host) for host in hosts]
+    list_command = generate_list_command(app_id, since, until)
+
+    try:
+        if follow:
+            print(f"Following logs on {len(hosts)} hosts, copies written to {output_dir}")
+            follow_logs(shells, list_command, output_dir, interval)
+        else:
+            collect_logs(shells, list_command, output_dir)
+            print(f"Logs written to {output_dir}")
+    finally:
+        for shell in shells:
+            shell.close()
+
+
+def stop_cluster(config: SimpleSparkConfig):
 
     os.system("bash $SPARK_HOME/sbin/stop-master.sh")
 
@@ -110,20 +599,227 @@ def stop():
         os.system("bash $SPARK_HOME/sbin/stop-worker.sh localhost")
     else:
         for w in config.workers:
-            ssh = SSHUtils(w.host)
-            i,o,e = ssh.run(f". {config.bash_profile_file}; "
-                            f"source {config.activate_script_path}; "
-                            f"$SPARK_HOME/sbin/stop-worker.sh")
-            for line in o.readlines():
-                print(line)
+            run_worker_action(config, w.host, "stop-worker")
 
-    if config.driver.connect_server:
-        os.system("bash $SPARK_HOME/sbin/stop-connect-server.sh")
-        print(f"Stopped Spark Connect server on {config.driver.host}")
 
-    if config.driver.thrift_server:
-        os.system("bash $SPARK_HOME/sbin/stop-thriftserver.sh")
-        print(f"Stopped JDBC/ODBC Thrift server on {config.driver.host}")
+@scale_app.command("add")
+def scale_add(host: str, cores: int = None, memory: str = None, instances: int = None, image: str = None):
+
+    config = get_active_config()
+    if config.mode != 'standalone':
+        raise Exception(f"Scaling workers requires standalone mode, environment is {config.mode}")
+    if config.get_worker_config(host) is not None:
+        raise Exception(f"Worker {host} already defined in config")
+
+    # Unspecified settings are copied from an existing worker so new nodes match the fleet
+    new_worker = replace(config.workers[0], host=host, excluded=False) if config.workers else WorkerConfig(host)
+    for field_name, value in [('cores', cores), ('memory', memory), ('instances', instances)]:
+        if value is not None:
+            setattr(new_worker, field_name, value)
+
+    if config.workers is None:
+        config.workers = []
+    config.workers.append(new_worker)
+    config.write()
+
+    print(f'Building worker over SSH: {host}')
+    build_worker_via_ssh(config, host, copy_packages=image is None, image=image)
+
+    if config.uses_remote_shuffle():
+        print(f'Starting Celeborn worker {host}')
+        run_worker_action(config, host, "start-shuffle-worker")
+
+    print(f'Starting worker {host}')
+    run_worker_action(config, host, "start-worker")
+
+
+@scale_app.command("remove")
+def scale_remove(host: str, timeout: int = 600):
+
+    config = get_active_config()
+    worker_config = config.get_worker_config(host)
+    if worker_config is None:
+        raise Exception(f"Worker {host} not defined in config")
+
+    if config.uses_decommission():
+        print(f'Decommissioning worker {host}, migrating shuffle and RDD blocks')
+        run_worker_action(config, host, "decommission-worker")
+        wait_for_worker_drain(config, host, timeout)
+    else:
+        print(f'WARNING: `decommission` not enabled, executors on {host} will be killed')
+
+    # Celeborn master stops assigning shuffle partitions to the host once its worker leaves
+    if config.uses_remote_shuffle():
+        print(f'Stopping Celeborn worker {host}')
+        run_worker_action(config, host, "stop-shuffle-worker")
+
+    run_worker_action(config, host, "stop-worker")
+
+    config.workers.remove(worker_config)
+    config.write()
+    print(f'Removed worker {host}')
+
+
+def wait_for_worker_drain(config: SimpleSparkConfig, host: str, timeout: int):
+
+    deadline = time.monotonic() + timeout
+    workers = []
+    while time.monotonic() < deadline:
+        workers = get_host_workers(config.spark_master_ui_url, host)
+        # No match means the master reports the host under another name, not that it drained
+        if workers and all(w['state'] != 'ALIVE' and w['coresused'] == 0 for w in workers):
+            print(f'Worker {host} drained')
+            return
+        time.sleep(5)
+
+    if not workers:
+        raise Exception(f"Worker {host} not found in master state at {config.spark_master_ui_url}")
+    raise Exception(f"Worker {host} still running executors after {timeout}s")
+
+
+@app.command()
+def restart(rolling: bool = False, batch_size: int = 1, batch_percent: float = None,
+            rebuild: bool = False, timeout: int = 300):
+
+    config = get_active_config()
+
+    if not rolling:
+        stop()
+        start()
+        return
+
+    if config.mode != 'standalone':
+        raise Exception(f"Rolling restart requires standalone mode, environment is {config.mode}")
+
+    workers = config.get_active_workers()
+    if batch_percent is not None:
+        batch_size = max(1, math.floor(len(workers) * batch_percent / 100))
+
+    batches = [workers[i:i + batch_size] for i in range(0, len(workers), batch_size)]
+    print(f'Rolling restart of {len(workers)} workers in {len(batches)} batches of up to {batch_size}')
+
+    for batch_number, batch in enumerate(batches, start=1):
+
+        batch_hosts = [w.host for w in batch]
+        print(f'Restarting batch {batch_number}/{len(batches)}: {", ".join(batch_hosts)}')
+
+        previous_worker_ids = {w['id'] for host in batch_hosts
+                               for w in get_host_workers(config.spark_master_ui_url, host)}
+
+        # Decommission whole batch first so executors migrate blocks in parallel
+        if config.uses_decommission():
+            for host in batch_hosts:
+                run_worker_action(config, host, "decommission-worker")
+
+        for host in batch_hosts:
+            if config.uses_decommission():
+                wait_for_worker_drain(config, host, timeout)
+            run_worker_action(config, host, "stop-worker")
+
+        for host in batch_hosts:
+            if rebuild:
+                print(f'Rebuilding worker: {host}')
+                rebuild_worker(config, host)
+            run_worker_action(config, host, "start-worker")
+
+        wait_for_worker_registration(config, batch, previous_worker_ids, timeout)
+
+    print('Rolling restart complete')
+
+
+def wait_for_worker_registration(config: SimpleSparkConfig, workers: list[WorkerConfig],
+                                 previous_worker_ids: set[str], timeout: int):
+
+    deadline = time.monotonic() + timeout
+    pending_hosts = [w.host for w in workers]
+
+    while time.monotonic() < deadline:
+        for worker_config in workers:
+            if worker_config.host not in pending_hosts:
+                continue
+            new_workers = [w for w in get_host_workers(config.spark_master_ui_url, worker_config.host)
+                           if w['state'] == 'ALIVE' and w['id'] not in previous_worker_ids]
+            if len(new_workers) >= (worker_config.instances or 1):
+                print(f'Worker {worker_config.host} re-registered with master')
+                pending_hosts.remove(worker_config.host)
+
+        if not pending_hosts:
+            return
+        time.sleep(5)
+
+    raise Exception(f"Workers did not re-register within {timeout}s, stopping rolling restart: "
+                    f"{', '.join(pending_hosts)}")
+
+
+@agent_app.command("serve")
+def agent_serve(host: str):
+
+    config = get_active_config()
+    if not config.uses_agent():
+        raise Exception("Agent not enabled for environment, set `agent.enabled`")
+
+    server = AgentServer(config.agent.bind_host, config.agent.port, read_token(config.agent_token_path),
+                         create_agent_action_handler(config, host))
+    print(f"Agent for {host} listening on {config.agent.bind_host}:{config.agent.port}")
+    server.serve_forever()
+
+
+@agent_app.command("start")
+def agent_start(local: bool = False, host: str = None):
+
+    config = get_active_config()
+
+    if local:
+        pid = start_daemon([sys.argv[0], "agent", "serve", host or socket.gethostname()],
+                           f"{config.run_directory}/agent.pid", f"{config.run_directory}/agent.log")
+        print(f"Started agent with PID {pid}")
+        return
+
+    for w in config.workers:
+        print(f'Starting agent on {w.host}')
+        run_on_worker(config, w.host, f"simplespark agent start --local --host {w.host}")
+
+
+@agent_app.command("stop")
+def agent_stop(local: bool = False):
+
+    config = get_active_config()
+
+    if local:
+        stop_daemon(f"{config.run_directory}/agent.pid")
+        return
+
+    for w in config.workers:
+        print(f'Stopping agent on {w.host}')
+        run_on_worker(config, w.host, "simplespark agent stop --local")
+
+
+@agent_app.command("status")
+def agent_status():
+
+    config = get_active_config()
+
+    for w in config.workers:
+        client = get_agent_client(config, w.host)
+        print(f"{w.host}: agent {'connected' if client else 'unavailable'}")
+        if client:
+            client.run("status", on_output=lambda output: print(f"  {output}", end=''))
+
+
+@image_app.command("export")
+def image_export(environment_name: str, output_path: str):
+
+    config = SimpleSparkConfig.get_simplespark_config(environment_name)
+    checksum = export_image(config, output_path)
+    print(f"Wrote image {output_path} sha256 {checksum}")
+
+
+@image_app.command("import")
+def image_import(archive_path: str, simplespark_home: str = None, checksum: str = None):
+
+    manifest = import_image(archive_path, simplespark_home, checksum)
+    print(f"Imported environment {manifest['name']} into {manifest['simplespark_home']}")
+    print(f"Run `source {manifest['name']}.spark` to activate environment")
 
 
 @app.command()
@@ -0,0 +1,72 @@
+from functools import lru_cache
+import os
+
+from simplespark.environment.config import SimpleSparkConfig
+from simplespark.utils.network import is_port_open
+
+
+@lru_cache(maxsize=None)
+def load_config(environment_name: str) -> SimpleSparkConfig:
+    """Read environment config once per process"""
+    return SimpleSparkConfig.get_simplespark_config(environment_name)
+
+
+@lru_cache(maxsize=None)
+def load_spark_defaults(spark_conf_file_path: str) -> dict[str, str]:
+    """Parse generated `spark-defaults.conf` into a settings dictionary"""
+
+    settings = {}
+    if not os.path.exists(spark_conf_file_path):
+        return settings
+
+    with open(spark_conf_file_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                continue
+            key, _, value = line.partition(' ')
+            settings[key] = value.strip()
+
+    return settings
+
+
+def session(environment_name: str = None, app_name: str = None, conf: dict[str, str] = None):
+    """
+    Build a SparkSession for a simplespark environment with all generated settings applied.
+
+    Attaches to the environment's Spark Connect server when `driver.connect_server` is enabled
+    and the server is reachable, otherwise launches a driver JVM using the environment's packages.
+    """
+
+    try:
+        from pyspark.sql import SparkSession
+    except ImportError:
+        raise Exception("`pyspark` must be installed to create a Spark session")
+
+    if environment_name is None:
+        environment_name = os.environ.get("SIMPLESPARK_ENVIRONMENT_NAME", None)
+    if environment_name is None:
+        raise Exception("No environment name given and no environment activated")
+
+    config = load_config(environment_name)
+
+    if config.driver.connect_server and is_port_open(config.driver.host, config.spark_connect_port, timeout=0.5):
+        # Static settings already live on the server, only explicit overrides are sent
+        builder = SparkSession.builder.remote(config.spark_connect_url)
+        settings = {}
+    else:
+        # Point PySpark at the environment's JVM and generated conf directory
+        os.environ.setdefault("JAVA_HOME", config.get_package_home_directory('java'))
+        os.environ.setdefault("SPARK_HOME", config.spark_home)
+        os.environ.setdefault("SPARK_CONF_DIR", config.spark_conf_directory)
+        builder = SparkSession.builder
+        settings = load_spark_defaults(config.spark_conf_file_path).copy()
+
+    settings |= conf or {}
+    for key, value in settings.items():
+        builder = builder.config(key, value)
+
+    if app_name:
+        builder = builder.appName(app_name)
+
+    return builder.getOrCreate()
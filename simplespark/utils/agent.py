@@ -0,0 +1,193 @@
+"""
+Newline delimited JSON protocol between simplespark CLI and worker agents.
+
+1. Server sends `{"nonce": ...}`, client answers `{"auth": HMAC-SHA256(token, nonce)}`
+2. Client sends requests `{"id": 1, "action": "...", "args": {...}}`, several may be in flight
+3. Server streams `{"id": 1, "output": "..."}` lines and finishes with `{"id": 1, "exit": 0}`
+"""
+
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import queue
+import secrets
+import socket
+import socketserver
+import threading
+from typing import Callable
+
+
+# Seconds without any output or exit message before a request is treated as lost
+RESPONSE_TIMEOUT = 1800.0
+
+
+class AgentError(Exception):
+    pass
+
+
+def sign(token: str, nonce: str) -> str:
+    return hmac.new(token.encode(), nonce.encode(), hashlib.sha256).hexdigest()
+
+
+def read_token(token_path: str) -> str:
+    with open(token_path, 'r') as f:
+        return f.read().strip()
+
+
+def write_token(token_path: str):
+    with open(token_path, 'w') as f:
+        f.write(secrets.token_hex(32))
+    os.chmod(token_path, 0o600)
+
+
+class AgentRequestHandler(socketserver.StreamRequestHandler):
+
+    def send(self, message: dict):
+        with self.write_lock:
+            self.wfile.write((json.dumps(message) + "\n").encode())
+            self.wfile.flush()
+
+    def handle(self):
+
+        self.write_lock = threading.Lock()
+
+        nonce = secrets.token_hex(16)
+        self.send({"nonce": nonce})
+
+        auth = json.loads(self.rfile.readline() or b'{}')
+        if not hmac.compare_digest(auth.get("auth", ""), sign(self.server.token, nonce)):
+            self.send({"error": "authentication failed"})
+            return
+        self.send({"ok": True})
+
+        # Each request runs in its own thread so long commands don't block others on the channel
+        for line in self.rfile:
+            request = json.loads(line)
+            threading.Thread(target=self.execute, args=(request,), daemon=True).start()
+
+    def execute(self, request: dict):
+
+        request_id = request.get("id")
+        try:
+            exit_code = self.server.handle_action(
+                request["action"], request.get("args", {}),
+                lambda output: self.send({"id": request_id, "output": output})
+            )
+        except Exception as e:
+            self.send({"id": request_id, "output": f"Agent error: {e}\n"})
+            exit_code = 1
+
+        self.send({"id": request_id, "exit": exit_code})
+
+
+class AgentServer(socketserver.ThreadingTCPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, bind_host: str, port: int, token: str,
+                 handle_action: Callable[[str, dict, Callable[[str], None]], int]):
+        super().__init__((bind_host, port), AgentRequestHandler)
+        self.token = token
+        self.handle_action = handle_action
+
+
+class AgentClient:
+    """Single authenticated connection to an agent, safe to share between threads"""
+
+    def __init__(self, channel, token: str):
+
+        self.channel = channel
+        self.reader = channel.makefile('rb')
+        self.write_lock = threading.Lock()
+        self.request_ids = itertools.count(1)
+        self.responses: dict[int, queue.Queue] = {}
+        self.responses_lock = threading.Lock()
+        self.closed = False
+
+        nonce = self._read_message()["nonce"]
+        self._send({"auth": sign(token, nonce)})
+        if not self._read_message().get("ok"):
+            raise AgentError("Agent authentication failed")
+
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    @staticmethod
+    def connect(host: str, port: int, token: str, ssh=None, timeout: float = 5.0):
+        """Connect directly or, when `ssh` client is provided, through an SSH tunnel to agent on the host"""
+
+        if ssh is None:
+            channel = socket.create_connection((host, port), timeout=timeout)
+            channel.settimeout(None)
+        else:
+            transport = ssh.ssh.get_transport()
+            channel = transport.open_channel("direct-tcpip", ("127.0.0.1", port), ("127.0.0.1", 0),
+                                             timeout=timeout)
+
+        return AgentClient(channel, token)
+
+    def _send(self, message: dict):
+        with self.write_lock:
+            self.channel.sendall((json.dumps(message) + "\n").encode())
+
+    def _read_message(self) -> dict:
+        line = self.reader.readline()
+        if not line:
+            raise AgentError("Agent closed connection")
+        return json.loads(line)
+
+    def _dispatch(self):
+        try:
+            while True:
+                message = self._read_message()
+                with self.responses_lock:
+                    response_queue = self.responses.get(message["id"])
+                # Replies to requests that already timed out are dropped
+                if response_queue is not None:
+                    response_queue.put(message)
+        except Exception:
+            pass
+        finally:
+            # Any failure ends the reader, requests registered after this see `closed` instead of waiting forever
+            with self.responses_lock:
+                self.closed = True
+                for response_queue in self.responses.values():
+                    response_queue.put({"exit": None})
+
+    def run(self, action: str, args: dict = None, on_output: Callable[[str], None] = None,
+            timeout: float = RESPONSE_TIMEOUT) -> int:
+
+        if on_output is None:
+            on_output = lambda output: print(output, end='')
+
+        request_id = next(self.request_ids)
+        with self.responses_lock:
+            if self.closed:
+                raise AgentError(f"Agent connection closed, cannot run {action}")
+            self.responses[request_id] = queue.Queue()
+
+        try:
+            self._send({"id": request_id, "action": action, "args": args or {}})
+
+            while True:
+                try:
+                    message = self.responses[request_id].get(timeout=timeout)
+                except queue.Empty:
+                    raise AgentError(f"No response from agent for {timeout:.0f}s while running {action}")
+                if "output" in message:
+                    on_output(message["output"])
+                elif "exit" in message:
+                    if message["exit"] is None:
+                        raise AgentError(f"Connection lost while running {action}")
+                    return message["exit"]
+
+        except OSError as e:
+            raise AgentError(f"Failed to send {action} to agent: {e}")
+        finally:
+            with self.responses_lock:
+                del self.responses[request_id]
+
+    def close(self):
+        self.channel.close()
@@ -0,0 +1,34 @@
+import os
+import tarfile
+
+
+def _inside(directory: str, path: str) -> bool:
+    return os.path.commonpath([directory, path]) == directory
+
+
+def check_member(member: tarfile.TarInfo, destination: str):
+    """Raise for members that would be written, or link, outside `destination`"""
+
+    destination = os.path.realpath(destination)
+    target = os.path.realpath(os.path.join(destination, member.name))
+
+    if os.path.isabs(member.name) or not _inside(destination, target):
+        raise Exception(f"Archive member {member.name} points outside {destination}")
+
+    if member.issym():
+        link_target = os.path.realpath(os.path.join(os.path.dirname(target), member.linkname))
+        if os.path.isabs(member.linkname) or not _inside(destination, link_target):
+            raise Exception(f"Archive symlink {member.name} -> {member.linkname} points outside {destination}")
+    elif member.islnk():
+        if not _inside(destination, os.path.realpath(os.path.join(destination, member.linkname))):
+            raise Exception(f"Archive hard link {member.name} -> {member.linkname} points outside {destination}")
+    elif member.isdev():
+        raise Exception(f"Archive member {member.name} is a device file")
+
+
+def safe_members(archive: tarfile.TarFile, destination: str):
+    """Archive members checked one at a time, works with streaming (`r|gz`) archives"""
+
+    for member in archive:
+        check_member(member, destination)
+        yield member
@@ -0,0 +1,77 @@
+import json
+import os
+from urllib.request import Request, urlopen
+
+from simplespark.utils.locking import FileLock
+
+
+# Bytes per second assumed until a build on this host records real numbers
+DEFAULT_THROUGHPUT: dict[str, float] = {
+    "download": 20 * 1024 * 1024,
+    "extract": 150 * 1024 * 1024,
+    "transfer": 50 * 1024 * 1024,
+}
+
+# Weight of the latest measurement in the recorded moving average
+THROUGHPUT_WEIGHT = 0.5
+
+
+class BuildStats:
+    """
+    Download sizes and measured throughput recorded by builds, used by `build --plan` for estimates.
+
+    Stored as JSON in SIMPLESPARK_HOME, updates hold a lock since builds for several environments may run at once.
+    """
+
+    def __init__(self, stats_path: str):
+        self.stats_path = stats_path
+        self.sizes: dict[str, int] = {}
+        self.throughput: dict[str, float] = {}
+
+        if os.path.exists(stats_path):
+            with open(stats_path, 'r') as f:
+                stats = json.load(f)
+            self.sizes = stats.get("sizes", {})
+            self.throughput = stats.get("throughput", {})
+
+    def bytes_per_second(self, kind: str) -> float:
+        return self.throughput.get(kind, DEFAULT_THROUGHPUT[kind])
+
+    def estimate_seconds(self, kind: str, num_bytes: int) -> float:
+        return num_bytes / self.bytes_per_second(kind) if num_bytes else 0.0
+
+    def get_size(self, url: str) -> int | None:
+        """Size of a download from recorded builds, otherwise from a HEAD request, `None` when unavailable"""
+
+        if url in self.sizes:
+            return self.sizes[url]
+
+        try:
+            with urlopen(Request(url, method="HEAD"), timeout=10) as response:
+                length = response.headers.get("Content-Length")
+        except Exception as e:
+            print(f"HEAD request failed for {url}: {e}")
+            return None
+
+        if length is not None:
+            self.sizes[url] = int(length)
+        return self.sizes.get(url)
+
+    @staticmethod
+    def record(stats_path: str, kind: str, num_bytes: int, seconds: float, url: str = None):
+        """Add a throughput measurement, and the download size when `url` is given"""
+
+        with FileLock(f"{stats_path}.lock"):
+
+            stats = BuildStats(stats_path)
+            if seconds > 0 and num_bytes > 0:
+                measured = num_bytes / seconds
+                previous = stats.throughput.get(kind)
+                stats.throughput[kind] = measured if previous is None else \
+                    THROUGHPUT_WEIGHT * measured + (1 - THROUGHPUT_WEIGHT) * previous
+            if url is not None:
+                stats.sizes[url] = num_bytes
+
+            with open(f"{stats_path}.part", 'w') as f:
+                json.dump({"sizes": stats.sizes, "throughput": stats.throughput}, f, indent=2)
+            os.replace(f"{stats_path}.part", stats_path)
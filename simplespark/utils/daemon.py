@@ -0,0 +1,60 @@
+import os
+import signal
+import subprocess
+import time
+
+
+def read_pid(pid_file: str) -> int | None:
+
+    if not os.path.exists(pid_file):
+        return None
+
+    with open(pid_file, 'r') as f:
+        pid = int(f.read().strip())
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+
+    return pid
+
+
+def start_daemon(command: list[str], pid_file: str, log_file: str, env: dict[str, str] = None) -> int:
+    """Start `command` detached from the current session, writing its PID to `pid_file`"""
+
+    running_pid = read_pid(pid_file)
+    if running_pid is not None:
+        print(f"Already running with PID {running_pid}")
+        return running_pid
+
+    for path in [pid_file, log_file]:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(log_file, 'a') as log:
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                   env=env, start_new_session=True)
+
+    with open(pid_file, 'w') as f:
+        f.write(str(process.pid))
+
+    return process.pid
+
+
+def stop_daemon(pid_file: str, timeout: float = 30.0):
+    """Send SIGTERM to daemon process group, escalating to SIGKILL after `timeout` seconds"""
+
+    pid = read_pid(pid_file)
+    if pid is None:
+        print(f"No running process found for {pid_file}")
+    else:
+        os.killpg(pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while read_pid(pid_file) is not None and time.monotonic() < deadline:
+            time.sleep(0.5)
+        if read_pid(pid_file) is not None:
+            print(f"Process {pid} did not stop after {timeout}s, killing")
+            os.killpg(pid, signal.SIGKILL)
+
+    if os.path.exists(pid_file):
+        os.remove(pid_file)
@@ -0,0 +1,73 @@
+import json
+import shlex
+
+from simplespark.environment.config import SimpleSparkConfig
+
+
+RESULT_MARKER = "SIMPLESPARK_DELTA_MAINTAIN "
+
+# Submitted with `spark-submit <script> <retention hours> <tables json>`, one result line per table
+MAINTAIN_SCRIPT = r'''
+import json, sys, time
+from pyspark.sql import SparkSession
+
+retention_hours, tables = int(sys.argv[1]), json.loads(sys.argv[2])
+spark = SparkSession.builder.appName("simplespark-delta-maintain").getOrCreate()
+failed = 0
+
+for table in tables:
+    name = table["name"]
+    identifier = f"delta.`{name}`" if "/" in name else name
+    zorder = f" ZORDER BY ({', '.join(table['zorder_by'])})" if table.get("zorder_by") else ""
+    try:
+        start = time.monotonic()
+        metrics = spark.sql(f"OPTIMIZE {identifier}{zorder}").collect()[0]["metrics"]
+        optimize_seconds = time.monotonic() - start
+        start = time.monotonic()
+        spark.sql(f"VACUUM {identifier} RETAIN {retention_hours} HOURS").collect()
+        result = {"table": name, "files_added": metrics["numFilesAdded"], "files_removed": metrics["numFilesRemoved"],
+                  "optimize_seconds": optimize_seconds, "vacuum_seconds": time.monotonic() - start}
+    except Exception as e:
+        failed += 1
+        result = {"table": name, "error": str(e).strip().splitlines()[0]}
+    print("SIMPLESPARK_DELTA_MAINTAIN " + json.dumps(result), flush=True)
+
+spark.stop()
+sys.exit(1 if failed else 0)
+'''
+
+
+def generate_maintain_arguments(config: SimpleSparkConfig, tables: list[str]) -> str:
+    """Script arguments, tables are catalog names or paths with optional `zorder_by` columns from config"""
+
+    zorder_by = config.delta.zorder_by or {}
+    table_specs = [{"name": t, "zorder_by": zorder_by.get(t)} for t in tables]
+
+    return f"{config.delta.vacuum_retention_hours} {shlex.quote(json.dumps(table_specs))}"
+
+
+def parse_maintain_output(output: str) -> list[dict]:
+
+    return [json.loads(line[len(RESULT_MARKER):]) for line in output.splitlines() if line.startswith(RESULT_MARKER)]
+
+
+def generate_cron_command(config: SimpleSparkConfig, schedule: str = None) -> str:
+    """
+    Shell command replacing this environment's `delta maintain` crontab entry, removing it without `schedule`.
+
+    Entry is marked with the environment name so other crontab lines are left untouched.
+    """
+
+    marker = f"# simplespark-delta-maintain-{config.name}"
+    keep_others = f"crontab -l 2>/dev/null | grep -vF {shlex.quote(marker)}"
+
+    if schedule is None:
+        return f"({keep_others}) | crontab -"
+
+    log_path = f"{config.run_directory}/delta-maintain.log"
+    entry = (f"{schedule} . {config.bash_profile_file}; . {config.activate_script_path}; "
+             f"$SIMPLESPARK delta maintain >> {log_path} 2>&1 {marker}")
+
+    # Binary path resolved when installing, cron runs with a minimal PATH
+    return (f'SIMPLESPARK=$(command -v simplespark || echo simplespark); mkdir -p {config.run_directory}; '
+            f'({keep_others}; echo "{entry}") | crontab -')
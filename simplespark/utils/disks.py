@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+import subprocess
+
+
+# Filesystems that back real data disks, anything else (tmpfs, overlay, nfs, ...) is ignored by discovery
+DATA_FILESYSTEM_TYPES = {"ext3", "ext4", "xfs", "btrfs", "zfs"}
+EXCLUDED_MOUNT_PREFIXES = ("/boot", "/snap", "/var/lib/docker", "/var/lib/kubelet")
+
+SIZE_UNITS = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+
+
+@dataclass
+class MountedDisk:
+    device: str
+    fs_type: str
+    mount_point: str
+    available_bytes: int
+
+
+def parse_size(size: str) -> int:
+    """Convert a Spark style size string (ex. `512m`, `20g`) into bytes"""
+
+    size = size.strip().lower().removesuffix("b")
+    if size[-1] in SIZE_UNITS:
+        return int(float(size[:-1]) * SIZE_UNITS[size[-1]])
+    return int(size)
+
+
+def format_size(num_bytes: float) -> str:
+    """Spark style size string in the largest unit not above the value, ex. `1.5g`, `512.0m`, `100b`"""
+
+    for unit in ("t", "g", "m", "k"):
+        if abs(num_bytes) >= SIZE_UNITS[unit]:
+            return f"{num_bytes / SIZE_UNITS[unit]:.1f}{unit}"
+    return f"{num_bytes:.0f}b"
+
+
+def parse_df_output(output: str) -> list[MountedDisk]:
+    """Parse output of `df -PTk` into mounted disks, skipping the header line"""
+
+    disks = []
+    for line in output.strip().splitlines()[1:]:
+        parts = line.split()
+        if len(parts) < 7:
+            continue
+        device, fs_type, _, _, available_kb, _ = parts[:6]
+        mount_point = " ".join(parts[6:])
+        disks.append(MountedDisk(device, fs_type, mount_point, int(available_kb) * 1024))
+    return disks
+
+
+def list_mounted_disks() -> list[MountedDisk]:
+    """List mounted filesystems on the local machine, discovery runs inside each host's build"""
+
+    output = subprocess.run(["df", "-PTk"], capture_output=True, text=True, check=True).stdout
+    return parse_df_output(output)
+
+
+def is_excluded_mount(mount_point: str) -> bool:
+    """Root and system mounts, prefixes match whole path components so `/bootstrap` is kept"""
+
+    return mount_point == "/" or any(mount_point == prefix or mount_point.startswith(f"{prefix}/")
+                                     for prefix in EXCLUDED_MOUNT_PREFIXES)
+
+
+def discover_data_disks() -> list[MountedDisk]:
+    """Find mounted data disks, excluding root/system mounts and duplicate mounts of the same device"""
+
+    data_disks = []
+    seen_devices = set()
+
+    for disk in list_mounted_disks():
+        if disk.fs_type not in DATA_FILESYSTEM_TYPES:
+            continue
+        if is_excluded_mount(disk.mount_point):
+            continue
+        if disk.device in seen_devices:
+            continue
+        seen_devices.add(disk.device)
+        data_disks.append(disk)
+
+    return data_disks
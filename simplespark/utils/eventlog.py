@@ -0,0 +1,388 @@
+from array import array
+from dataclasses import dataclass, asdict, field
+import glob
+import io
+import json
+import os
+import re
+from typing import Iterator
+
+from simplespark.utils.disks import format_size
+
+# Optional faster JSON parsing and vectorized aggregation, results are identical without them
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Rolling event logs are directories `eventlog_v2_<app id>` holding `events_<index>_<app id>[.codec]` files
+ROLLING_DIRECTORY_PREFIX = "eventlog_v2_"
+ROLLING_FILE_INDEX = re.compile(r"^events_(\d+)_")
+
+CODEC_SUFFIXES = (".zstd", ".lz4", ".snappy", ".lzf")
+
+EVENT_NAME_MARKER = b'"Event"'
+
+# Executors whose mean task time exceeds the stage's median executor by this factor are stragglers
+STRAGGLER_FACTOR = 1.5
+
+
+@dataclass
+class EventLogSummary:
+    app_id: str = None
+    app_name: str = None
+    duration_ms: int = None
+    executors: int = 0
+    jobs: int = 0
+    stages: int = 0
+    failed_stages: int = 0
+    tasks: int = 0
+    failed_tasks: int = 0
+    executor_run_time_ms: int = 0
+    executor_cpu_time_ms: int = 0
+    gc_time_ms: int = 0
+    shuffle_read_bytes: int = 0
+    shuffle_write_bytes: int = 0
+    memory_spilled_bytes: int = 0
+    disk_spilled_bytes: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def find_event_log(event_log_directory: str, app_id: str) -> str | None:
+    """Path of rolling directory or single event log file for `app_id`, including in progress logs"""
+
+    rolling_directory = f"{event_log_directory}/{ROLLING_DIRECTORY_PREFIX}{app_id}"
+    if os.path.isdir(rolling_directory):
+        return rolling_directory
+
+    for suffix in ("",) + CODEC_SUFFIXES:
+        for path in (f"{event_log_directory}/{app_id}{suffix}", f"{event_log_directory}/{app_id}{suffix}.inprogress"):
+            if os.path.isfile(path):
+                return path
+
+    return None
+
+
+def find_latest_event_log(event_log_directory: str, since: float = 0.0) -> str | None:
+    """Most recently modified event log created after `since`, used when the application ID is unknown"""
+
+    candidates = [p for p in glob.glob(f"{event_log_directory}/*") if os.path.getmtime(p) >= since]
+
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+
+def event_log_files(path: str) -> list[str]:
+
+    if not os.path.isdir(path):
+        return [path]
+
+    files = [f for f in os.listdir(path) if ROLLING_FILE_INDEX.match(f)]
+    files.sort(key=lambda f: int(ROLLING_FILE_INDEX.match(f).group(1)))
+
+    return [f"{path}/{f}" for f in files]
+
+
+def open_event_log_file(path: str) -> io.BufferedIOBase:
+    """Open event log file as a decompressed binary stream, zstd and lz4 need optional packages"""
+
+    codec_path = path.removesuffix(".inprogress")
+
+    if codec_path.endswith(".zstd"):
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception("Reading zstd event logs requires the `zstandard` package, `pip install zstandard`")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True,
+                                                            closefd=True)
+        return io.BufferedReader(reader, buffer_size=1024 * 1024)
+
+    if codec_path.endswith(".lz4"):
+        try:
+            import lz4.frame
+        except ImportError:
+            raise Exception("Reading lz4 event logs requires the `lz4` package, `pip install lz4`")
+        return lz4.frame.open(path, 'rb')
+
+    if codec_path.endswith((".snappy", ".lzf")):
+        raise Exception(f"Unsupported event log codec for {path}, use zstd or lz4")
+
+    return open(path, 'rb')
+
+
+def read_event_log_lines(path: str) -> Iterator[bytes]:
+    """Raw JSON lines of a single or rolling event log, read sequentially without loading whole files"""
+
+    for file_path in event_log_files(path):
+        with open_event_log_file(file_path) as stream:
+            yield from stream
+
+
+def iter_events(path: str, event_types: set[bytes]) -> Iterator[tuple[bytes, dict]]:
+    """
+    Parsed events of the given types, other lines are skipped before JSON parsing.
+
+    The event name is read straight from the raw line, so the many block/executor metric updates
+    in large logs never hit the JSON parser.
+    """
+
+    for line in read_event_log_lines(path):
+        start = line.find(EVENT_NAME_MARKER)
+        if start < 0:
+            continue
+        start = line.find(b'"', start + len(EVENT_NAME_MARKER)) + 1
+        event_type = line[start:line.find(b'"', start)]
+        if event_type in event_types:
+            yield event_type, loads(line)
+
+
+SUMMARY_EVENTS = {
+    b"SparkListenerApplicationStart", b"SparkListenerApplicationEnd", b"SparkListenerExecutorAdded",
+    b"SparkListenerJobEnd", b"SparkListenerStageCompleted", b"SparkListenerTaskEnd",
+}
+
+
+def summarize_event_log(path: str) -> EventLogSummary:
+
+    summary = EventLogSummary()
+    start_time = end_time = None
+
+    for event_type, event in iter_events(path, SUMMARY_EVENTS):
+
+        event_type = event_type.decode()
+
+        if event_type == "SparkListenerApplicationStart":
+            summary.app_id = event.get("App ID")
+            summary.app_name = event.get("App Name")
+            start_time = event.get("Timestamp")
+
+        elif event_type == "SparkListenerApplicationEnd":
+            end_time = event.get("Timestamp")
+
+        elif event_type == "SparkListenerExecutorAdded":
+            summary.executors += 1
+
+        elif event_type == "SparkListenerJobEnd":
+            summary.jobs += 1
+
+        elif event_type == "SparkListenerStageCompleted":
+            summary.stages += 1
+            if event["Stage Info"].get("Failure Reason"):
+                summary.failed_stages += 1
+
+        elif event_type == "SparkListenerTaskEnd":
+            summary.tasks += 1
+            if event.get("Task Info", {}).get("Failed"):
+                summary.failed_tasks += 1
+
+            metrics = event.get("Task Metrics")
+            if not metrics:
+                continue
+            shuffle_read = metrics.get("Shuffle Read Metrics", {})
+            summary.executor_run_time_ms += metrics.get("Executor Run Time", 0)
+            summary.executor_cpu_time_ms += metrics.get("Executor CPU Time", 0) // 1_000_000
+            summary.gc_time_ms += metrics.get("JVM GC Time", 0)
+            summary.shuffle_read_bytes += (shuffle_read.get("Remote Bytes Read", 0)
+                                           + shuffle_read.get("Local Bytes Read", 0))
+            summary.shuffle_write_bytes += metrics.get("Shuffle Write Metrics", {}).get("Shuffle Bytes Written", 0)
+            summary.memory_spilled_bytes += metrics.get("Memory Bytes Spilled", 0)
+            summary.disk_spilled_bytes += metrics.get("Disk Bytes Spilled", 0)
+            summary.input_bytes += metrics.get("Input Metrics", {}).get("Bytes Read", 0)
+            summary.output_bytes += metrics.get("Output Metrics", {}).get("Bytes Written", 0)
+
+    if start_time is not None and end_time is not None:
+        summary.duration_ms = end_time - start_time
+
+    return summary
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Linear interpolation between closest ranks, same definition as `numpy.percentile`"""
+
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+@dataclass
+class StageReport:
+    stage_id: int
+    attempt: int
+    name: str = None
+    complete: bool = False
+    failed: bool = False
+    duration_ms: int = None
+    tasks: int = 0
+    failed_tasks: int = 0
+    task_p50_ms: float = 0.0
+    task_p95_ms: float = 0.0
+    task_max_ms: float = 0.0
+    skew: float = 0.0
+    gc_time_ms: int = 0
+    gc_ratio: float = 0.0
+    memory_spilled_bytes: int = 0
+    disk_spilled_bytes: int = 0
+    shuffle_read_bytes: int = 0
+    shuffle_write_bytes: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+    stragglers: list[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class StageBuffer:
+    """Columnar task metrics of one running stage attempt, released as soon as the stage completes"""
+
+    def __init__(self):
+        self.durations = array('d')
+        self.run_times = array('d')
+        self.gc_times = array('d')
+        self.executor_durations: dict[str, list[float]] = {}
+        self.failed_tasks = 0
+        self.memory_spilled_bytes = 0
+        self.disk_spilled_bytes = 0
+        self.shuffle_read_bytes = 0
+        self.shuffle_write_bytes = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+
+    def add_task(self, event: dict):
+
+        info = event.get("Task Info", {})
+        duration = info.get("Finish Time", 0) - info.get("Launch Time", 0)
+        self.durations.append(duration)
+        if info.get("Failed"):
+            self.failed_tasks += 1
+
+        # Executor totals are kept as [task count, duration sum] so memory grows with executors, not tasks
+        executor = self.executor_durations.setdefault(info.get("Executor ID"), [0, 0.0])
+        executor[0] += 1
+        executor[1] += duration
+
+        metrics = event.get("Task Metrics")
+        if not metrics:
+            self.run_times.append(0)
+            self.gc_times.append(0)
+            return
+
+        shuffle_read = metrics.get("Shuffle Read Metrics", {})
+        self.run_times.append(metrics.get("Executor Run Time", 0))
+        self.gc_times.append(metrics.get("JVM GC Time", 0))
+        self.memory_spilled_bytes += metrics.get("Memory Bytes Spilled", 0)
+        self.disk_spilled_bytes += metrics.get("Disk Bytes Spilled", 0)
+        self.shuffle_read_bytes += shuffle_read.get("Remote Bytes Read", 0) + shuffle_read.get("Local Bytes Read", 0)
+        self.shuffle_write_bytes += metrics.get("Shuffle Write Metrics", {}).get("Shuffle Bytes Written", 0)
+        self.input_bytes += metrics.get("Input Metrics", {}).get("Bytes Read", 0)
+        self.output_bytes += metrics.get("Output Metrics", {}).get("Bytes Written", 0)
+
+    def report(self, stage_id: int, attempt: int) -> StageReport:
+
+        report = StageReport(stage_id, attempt, tasks=len(self.durations), failed_tasks=self.failed_tasks,
+                             memory_spilled_bytes=self.memory_spilled_bytes,
+                             disk_spilled_bytes=self.disk_spilled_bytes,
+                             shuffle_read_bytes=self.shuffle_read_bytes, shuffle_write_bytes=self.shuffle_write_bytes,
+                             input_bytes=self.input_bytes, output_bytes=self.output_bytes)
+        if not self.durations:
+            return report
+
+        if numpy is not None:
+            durations = numpy.frombuffer(self.durations, dtype=numpy.float64)
+            report.task_p50_ms, report.task_p95_ms = (float(p) for p in numpy.percentile(durations, [50, 95]))
+            report.task_max_ms = float(durations.max())
+            run_time = float(numpy.frombuffer(self.run_times, dtype=numpy.float64).sum())
+            report.gc_time_ms = int(numpy.frombuffer(self.gc_times, dtype=numpy.float64).sum())
+        else:
+            durations = sorted(self.durations)
+            report.task_p50_ms = percentile(durations, 50)
+            report.task_p95_ms = percentile(durations, 95)
+            report.task_max_ms = durations[-1]
+            run_time = sum(self.run_times)
+            report.gc_time_ms = int(sum(self.gc_times))
+
+        report.skew = report.task_max_ms / report.task_p50_ms if report.task_p50_ms > 0 else 0.0
+        report.gc_ratio = report.gc_time_ms / run_time if run_time > 0 else 0.0
+
+        executor_means = {e: total / count for e, (count, total) in self.executor_durations.items()}
+        if len(executor_means) > 1:
+            ordered = sorted(executor_means.values())
+            median = ordered[len(ordered) // 2]
+            report.stragglers = sorted(e for e, mean in executor_means.items() if mean > median * STRAGGLER_FACTOR)
+
+        return report
+
+
+ANALYZE_EVENTS = {b"SparkListenerStageSubmitted", b"SparkListenerStageCompleted", b"SparkListenerTaskEnd"}
+
+
+def analyze_event_log(path: str) -> list[StageReport]:
+    """
+    Stage level task statistics in a single pass over the event log.
+
+    Only stages still running keep per task columns, so memory follows the widest set of concurrent
+    stages rather than the log size. Stages missing a completion event are reported as incomplete.
+    """
+
+    buffers: dict[tuple[int, int], StageBuffer] = {}
+    names: dict[tuple[int, int], str] = {}
+    reports = []
+
+    for event_type, event in iter_events(path, ANALYZE_EVENTS):
+
+        if event_type == b"SparkListenerTaskEnd":
+            key = (event["Stage ID"], event.get("Stage Attempt ID", 0))
+            buffers.setdefault(key, StageBuffer()).add_task(event)
+            continue
+
+        info = event["Stage Info"]
+        key = (info["Stage ID"], info.get("Stage Attempt ID", 0))
+
+        if event_type == b"SparkListenerStageSubmitted":
+            names[key] = info.get("Stage Name")
+            continue
+
+        report = buffers.pop(key, StageBuffer()).report(*key)
+        report.name = info.get("Stage Name") or names.pop(key, None)
+        report.complete = True
+        report.failed = bool(info.get("Failure Reason"))
+        if info.get("Submission Time") is not None and info.get("Completion Time") is not None:
+            report.duration_ms = info["Completion Time"] - info["Submission Time"]
+        reports.append(report)
+
+    for key, buffer in buffers.items():
+        report = buffer.report(*key)
+        report.name = names.get(key)
+        reports.append(report)
+
+    return sorted(reports, key=lambda r: (r.stage_id, r.attempt))
+
+
+def format_stage_table(reports: list[StageReport]) -> str:
+
+    header = (f"{'STAGE':>9}  {'TASKS':>6}  {'TIME':>8}  {'P50':>7}  {'P95':>7}  {'MAX':>7}  {'SKEW':>5}  "
+              f"{'GC%':>4}  {'SPILL':>7}  {'SHUF R':>7}  {'SHUF W':>7}  STRAGGLERS / NAME")
+    lines = [header]
+
+    for r in reports:
+        duration = f"{r.duration_ms / 1000:.1f}s" if r.duration_ms is not None else "-" if r.complete else "running"
+        status = " FAILED" if r.failed else ""
+        lines.append(
+            f"{r.stage_id:>6}.{r.attempt:<2}  {r.tasks:>6}  {duration:>8}  {r.task_p50_ms / 1000:>6.1f}s  "
+            f"{r.task_p95_ms / 1000:>6.1f}s  {r.task_max_ms / 1000:>6.1f}s  {r.skew:>5.1f}  {r.gc_ratio:>4.0%}  "
+            f"{format_size(r.disk_spilled_bytes):>7}  {format_size(r.shuffle_read_bytes):>7}  "
+            f"{format_size(r.shuffle_write_bytes):>7}  {','.join(r.stragglers) or '-'} / {(r.name or '')[:40]}{status}"
+        )
+
+    return "\n".join(lines)
@@ -0,0 +1,25 @@
+import os
+import re
+
+
+def find_jar_version(jars_directory: str, artifact_id: str) -> str | None:
+    """Version of `artifact_id` bundled in a jars directory, ex. `hadoop-client-api-3.3.4.jar` -> `3.3.4`"""
+
+    pattern = re.compile(rf"^{re.escape(artifact_id)}-(\d[\w.\-]*)\.jar$")
+
+    for file_name in sorted(os.listdir(jars_directory)):
+        match = pattern.match(file_name)
+        if match:
+            return match.group(1)
+
+    return None
+
+
+def find_scala_binary_version(jars_directory: str) -> str:
+    """Scala binary version Spark was built with, ex. `2.12` from `scala-library-2.12.18.jar`"""
+
+    scala_version = find_jar_version(jars_directory, "scala-library")
+    if scala_version is None:
+        raise Exception(f"No scala-library jar found in {jars_directory}")
+
+    return ".".join(scala_version.split(".")[:2])
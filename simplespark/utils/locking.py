@@ -0,0 +1,33 @@
+import fcntl
+import os
+
+
+class FileLock:
+    """
+    Exclusive cross-process lock backed by `flock` on a file in the shared SIMPLESPARK_HOME.
+
+    The lock is released by the OS when the holding process exits, so a crashed build never
+    leaves a stale lock behind.
+    """
+
+    def __init__(self, lock_path: str):
+        self.lock_path = lock_path
+        self._lock_file = None
+
+    def __enter__(self):
+
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        self._lock_file = open(self.lock_path, 'a+')
+
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print(f"Waiting for lock {self.lock_path} held by another process")
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._lock_file.close()
+        self._lock_file = None
@@ -0,0 +1,263 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import json
+import os
+import re
+import shlex
+import subprocess
+import threading
+import time
+import zlib
+from typing import Callable, IO
+
+from simplespark.utils.ssh import SSHUtils
+
+
+APPLICATION_ID_PATTERN = re.compile(r"^[\w-]+$")
+
+# Transfer chunk size, memory per file stream stays bounded by this and `MAX_PARTIAL_LINE`
+CHUNK_SIZE = 64 * 1024
+MAX_PARTIAL_LINE = 64 * 1024
+
+OFFSETS_FILE_NAME = ".offsets.json"
+
+
+class HostShell:
+    """Runs commands on a host inside the activated environment, locally or over one reused SSH connection"""
+
+    def __init__(self, host: str, prefix: str, local: bool = False):
+        self.host = host
+        self.prefix = prefix
+        self.ssh = None if local else SSHUtils(host)
+
+    def stream(self, command: str) -> tuple[IO[bytes], Callable[[], int]]:
+        """Start `command`, returns its stdout stream and a function waiting for the exit code"""
+
+        if self.ssh is None:
+            process = subprocess.Popen(["bash", "-c", self.prefix + command], stdout=subprocess.PIPE,
+                                       stderr=subprocess.DEVNULL)
+            return process.stdout, process.wait
+
+        stdin, stdout, stderr = self.ssh.run(self.prefix + command)
+        return stdout, stdout.channel.recv_exit_status
+
+    def close(self):
+        if self.ssh is not None:
+            self.ssh.close()
+
+
+@dataclass
+class RemoteLogFile:
+    kind: str
+    size: int
+    relative_path: str
+    path: str
+
+    @property
+    def local_path(self) -> str:
+        return f"daemon/{self.relative_path}" if self.kind == "daemon" else self.relative_path
+
+
+def generate_list_command(app_id: str = None, since: str = None, until: str = None) -> str:
+    """
+    Shell command listing daemon `.out` logs and executor stdout/stderr as `kind size relative path` lines.
+
+    Time filters apply to file modification times, `since`/`until` accept anything `find -newermt` does.
+    Daemon logs are skipped when filtering by application since they are shared by every application.
+    """
+
+    if app_id is not None and not APPLICATION_ID_PATTERN.match(app_id):
+        raise Exception(f"Invalid application ID {app_id}")
+
+    time_filters = ""
+    if since:
+        time_filters += f" -newermt {shlex.quote(since)}"
+    if until:
+        time_filters += f" ! -newermt {shlex.quote(until)}"
+
+    commands = [
+        'LOG_DIR="${SPARK_LOG_DIR:-$SPARK_HOME/logs}"',
+        'WORK_DIR="${SPARK_WORKER_DIR:-$SPARK_HOME/work}"',
+    ]
+    if app_id is None:
+        commands.append(f'find "$LOG_DIR" -maxdepth 1 -type f -name "*.out"{time_filters} '
+                        "-printf 'daemon\\t%s\\t%P\\t%p\\n' 2>/dev/null")
+    commands.append(f'find "$WORK_DIR" -mindepth 3 -maxdepth 3 -type f \\( -name stderr -o -name stdout \\) '
+                    f'-path "$WORK_DIR/{app_id or "app-*"}/*"{time_filters} '
+                    "-printf 'work\\t%s\\t%P\\t%p\\n' 2>/dev/null")
+
+    return "; ".join(commands) + "; true"
+
+
+def list_log_files(shell: HostShell, list_command: str) -> list[RemoteLogFile]:
+
+    stdout, wait = shell.stream(list_command)
+    output = stdout.read().decode()
+    wait()
+
+    log_files = []
+    for line in output.splitlines():
+        parts = line.split('\t')
+        if len(parts) == 4:
+            log_files.append(RemoteLogFile(parts[0], int(parts[1]), parts[2], parts[3]))
+
+    return log_files
+
+
+def fetch_log_bytes(shell: HostShell, log_file: RemoteLogFile, offset: int, length: int,
+                    sink: Callable[[bytes], None]) -> int:
+    """Stream `length` bytes from `offset` gzip compressed in transit, returns number of bytes received"""
+
+    stdout, wait = shell.stream(f"tail -c +{offset + 1} {shlex.quote(log_file.path)} | head -c {length} | gzip -c -1")
+
+    decompressor = zlib.decompressobj(wbits=31)
+    received = 0
+    for chunk in iter(lambda: stdout.read(CHUNK_SIZE), b''):
+        data = decompressor.decompress(chunk)
+        received += len(data)
+        sink(data)
+    data = decompressor.flush()
+    received += len(data)
+    sink(data)
+    wait()
+
+    return received
+
+
+def read_offsets(output_directory: str) -> dict[str, dict[str, int]]:
+
+    offsets_path = f"{output_directory}/{OFFSETS_FILE_NAME}"
+    if not os.path.exists(offsets_path):
+        return {}
+
+    with open(offsets_path, 'r') as f:
+        return json.load(f)
+
+
+def write_offsets(output_directory: str, offsets: dict[str, dict[str, int]]):
+
+    offsets_path = f"{output_directory}/{OFFSETS_FILE_NAME}"
+    with open(f"{offsets_path}.part", 'w') as f:
+        json.dump(offsets, f, indent=2)
+    os.replace(f"{offsets_path}.part", offsets_path)
+
+
+def collect_host_logs(shell: HostShell, list_command: str, output_directory: str, offsets: dict[str, int],
+                      max_bytes: int = None, on_data: Callable[[str, bytes], None] = None) -> tuple[int, int]:
+    """
+    Append new bytes of each log file under `output_directory/<host>`, updating `offsets` in place.
+
+    Files smaller than their stored offset were rotated or truncated and are fetched again from the start.
+    Returns number of files and bytes transferred.
+    """
+
+    files, transferred = 0, 0
+
+    for log_file in list_log_files(shell, list_command):
+
+        offset = offsets.get(log_file.path, 0)
+        if log_file.size < offset:
+            offset = 0
+        length = log_file.size - offset
+        if max_bytes is not None:
+            length = min(length, max_bytes)
+        if length <= 0:
+            continue
+
+        local_path = f"{output_directory}/{shell.host}/{log_file.local_path}"
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+        with open(local_path, 'ab' if offset > 0 else 'wb') as f:
+
+            def sink(data: bytes):
+                f.write(data)
+                if on_data is not None:
+                    on_data(log_file.local_path, data)
+
+            received = fetch_log_bytes(shell, log_file, offset, length, sink)
+
+        offsets[log_file.path] = offset + received
+        files += 1
+        transferred += received
+
+    return files, transferred
+
+
+def collect_logs(shells: list[HostShell], list_command: str, output_directory: str):
+    """Collect new log bytes from every host concurrently, offsets are persisted once all hosts finish"""
+
+    os.makedirs(output_directory, exist_ok=True)
+    offsets = read_offsets(output_directory)
+
+    def collect(shell: HostShell) -> tuple[int, int]:
+        try:
+            return collect_host_logs(shell, list_command, output_directory, offsets[shell.host])
+        except Exception as e:
+            print(f"Failed to collect logs from {shell.host}: {e}")
+            return 0, 0
+
+    # Host entries are created up front so worker threads never resize the shared dict
+    for shell in shells:
+        offsets.setdefault(shell.host, {})
+
+    with ThreadPoolExecutor(max_workers=min(len(shells), 16) or 1) as executor:
+        results = list(executor.map(collect, shells))
+
+    write_offsets(output_directory, offsets)
+
+    for shell, (files, transferred) in zip(shells, results):
+        print(f"{shell.host}: {files} files, {transferred} new bytes")
+
+
+class LinePrinter:
+    """Prints complete lines per host/file with a prefix, holding at most `MAX_PARTIAL_LINE` of partial data"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.partial: dict[tuple[str, str], bytes] = {}
+
+    def write(self, host: str, path: str, data: bytes):
+
+        key = (host, path)
+        buffer = self.partial.get(key, b'') + data
+        lines = buffer.split(b'\n')
+        remainder = lines.pop()
+        if len(remainder) > MAX_PARTIAL_LINE:
+            lines.append(remainder)
+            remainder = b''
+        self.partial[key] = remainder
+
+        if lines:
+            with self.lock:
+                for line in lines:
+                    print(f"[{host}:{path}] {line.decode(errors='replace')}")
+
+
+def follow_logs(shells: list[HostShell], list_command: str, output_directory: str, interval: float = 2.0,
+                max_bytes: int = 1024 * 1024):
+    """Tail logs on all hosts, files without a stored offset start at their current end"""
+
+    os.makedirs(output_directory, exist_ok=True)
+    offsets = read_offsets(output_directory)
+    printer = LinePrinter()
+
+    for shell in shells:
+        host_offsets = offsets.setdefault(shell.host, {})
+        for log_file in list_log_files(shell, list_command):
+            host_offsets.setdefault(log_file.path, log_file.size)
+
+    def poll(shell: HostShell):
+        try:
+            collect_host_logs(shell, list_command, output_directory, offsets[shell.host], max_bytes,
+                              lambda path, data: printer.write(shell.host, path, data))
+        except Exception as e:
+            print(f"Failed to follow logs on {shell.host}: {e}")
+
+    with ThreadPoolExecutor(max_workers=min(len(shells), 16) or 1) as executor:
+        try:
+            while True:
+                list(executor.map(poll, shells))
+                write_offsets(output_directory, offsets)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            write_offsets(output_directory, offsets)
@@ -0,0 +1,30 @@
+import json
+import socket
+from urllib.request import urlopen
+
+
+def get_master_state(master_ui_url: str, timeout: float = 10.0) -> dict:
+    """Fetch standalone master state (workers, applications) from the master web UI JSON endpoint"""
+
+    with urlopen(f"{master_ui_url}/json/", timeout=timeout) as response:
+        return json.load(response)
+
+
+def resolve_host_names(host: str) -> set[str]:
+
+    names = {host}
+    try:
+        names.add(socket.gethostbyname(host))
+    except socket.gaierror:
+        pass
+
+    return names
+
+
+def get_host_workers(master_ui_url: str, host: str) -> list[dict]:
+    """List workers registered with the master for `host`, matching either host name or IP address"""
+
+    host_names = resolve_host_names(host)
+    state = get_master_state(master_ui_url)
+
+    return [w for w in state.get("workers", []) if w.get("host") in host_names]
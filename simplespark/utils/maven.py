@@ -1,3 +1,4 @@
+import os
 
 from urllib.request import urlretrieve
 
@@ -12,13 +13,23 @@ class MavenDownloader:
         package_url = f"{maven_jar.group_id.replace('.','/')}/{maven_jar.artifact_id}/{maven_jar.version}"
         return f"{MavenDownloader.BASE_URL}/{package_url}"
 
+    @staticmethod
+    def jar_url(maven_jar: MavenConfig) -> str:
+        return f"{MavenDownloader.maven_url(maven_jar)}/{maven_jar.artifact_id}-{maven_jar.version}.jar"
+
     @staticmethod
     def download_jar(maven_jar: MavenConfig, download_folder: str):
 
-        maven_url = MavenDownloader.maven_url(maven_jar)
         jar_filename = f"{maven_jar.artifact_id}-{maven_jar.version}.jar"
-        maven_jar_path = f"{maven_url}/{jar_filename}"
+        maven_jar_path = MavenDownloader.jar_url(maven_jar)
         download_path = f"{download_folder}/{jar_filename}"
 
+        if os.path.exists(download_path):
+            print(f'JAR already downloaded at {download_path}')
+            return
+
+        # Download under process specific name so concurrent builds never see a partial JAR
         print(f'Downloading JAR from {maven_jar_path} to {download_path}')
-        urlretrieve(maven_jar_path, download_path)
+        partial_path = f"{download_path}.{os.getpid()}.part"
+        urlretrieve(maven_jar_path, partial_path)
+        os.replace(partial_path, download_path)
@@ -0,0 +1,26 @@
+import re
+import subprocess
+
+
+CHECKNATIVE_LINE = re.compile(r"^\s*([\w-]+)\s*:\s*(true|false)\b(.*)$")
+
+
+def parse_checknative_output(output: str) -> dict[str, tuple[bool, str]]:
+    """Parse `hadoop checknative -a` lines like `zlib:  true /lib/libz.so.1` into {library: (loaded, detail)}"""
+
+    libraries = {}
+    for line in output.splitlines():
+        match = CHECKNATIVE_LINE.match(line)
+        if match:
+            libraries[match.group(1)] = (match.group(2) == "true", match.group(3).strip())
+
+    return libraries
+
+
+def run_checknative(hadoop_home: str, environment: dict = None) -> str:
+    """Run `hadoop checknative -a` locally, exit code is non zero whenever any library is missing"""
+
+    result = subprocess.run([f"{hadoop_home}/bin/hadoop", "checknative", "-a"], capture_output=True,
+                            text=True, env=environment)
+
+    return result.stdout + result.stderr
@@ -1,5 +1,6 @@
 
 import socket
+import time
 
 
 def get_host_ip():
@@ -14,3 +15,22 @@ def get_host_ip():
     finally:
         s.close()
     return IP
+
+
+def is_port_open(host: str, port: int, timeout: float = 1.0) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def wait_for_port(host: str, port: int, timeout: float = 120.0, interval: float = 1.0) -> bool:
+    """Poll until `host:port` accepts connections, returns `False` if `timeout` seconds pass first"""
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if is_port_open(host, port):
+            return True
+        time.sleep(interval)
+    return False
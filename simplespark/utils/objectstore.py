@@ -0,0 +1,44 @@
+import json
+
+
+RESULT_MARKER = "SIMPLESPARK_OBJECT_STORE_CHECK "
+
+# Submitted with `spark-submit <script> <path>`, writes and reads back a small table and reports the committer
+CHECK_SCRIPT = r'''
+import json, sys, time
+from pyspark.sql import SparkSession
+
+spark = SparkSession.builder.appName("simplespark-object-store-check").getOrCreate()
+path = f"{sys.argv[1].rstrip('/')}/simplespark-check-{int(time.time())}"
+
+start = time.monotonic()
+spark.range(0, 1000000, numPartitions=8).selectExpr("id", "id % 10 AS bucket") \
+    .write.partitionBy("bucket").parquet(path)
+write_seconds = time.monotonic() - start
+
+start = time.monotonic()
+rows = spark.read.parquet(path).count()
+read_seconds = time.monotonic() - start
+
+# S3A committers write JSON into `_SUCCESS`, the rename based committer leaves it empty
+success = spark.read.text(f"{path}/_SUCCESS", wholetext=True).collect()
+committer = json.loads(success[0][0]).get("committer") if success and success[0][0] else "file"
+
+hadoop_path = spark._jvm.org.apache.hadoop.fs.Path(path)
+hadoop_path.getFileSystem(spark._jsc.hadoopConfiguration()).delete(hadoop_path, True)
+
+print("SIMPLESPARK_OBJECT_STORE_CHECK " + json.dumps({
+    "path": path, "rows": rows, "committer": committer,
+    "write_seconds": write_seconds, "read_seconds": read_seconds,
+}), flush=True)
+spark.stop()
+'''
+
+
+def parse_check_output(output: str) -> dict | None:
+
+    for line in output.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+
+    return None
@@ -0,0 +1,264 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import shlex
+import statistics
+import subprocess
+import time
+
+from simplespark.utils.ssh import SSHUtils
+
+
+# Runs on each host with `python3 - <mode> ...`, only standard library so nothing needs installing
+PROBE_SCRIPT = r'''
+import hashlib, json, mmap, multiprocessing, os, random, socket, sys, time
+
+def hash_rate(seconds):
+    data, count, deadline = os.urandom(1 << 20), 0, time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        hashlib.sha256(data).digest()
+        count += 1
+    return count / seconds
+
+def drop_cache(fd, offset=0, length=0):
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+
+def random_iops(path, size_mb, seconds):
+    # O_DIRECT bypasses the page cache, needs an aligned buffer which mmap provides
+    direct = getattr(os, "O_DIRECT", 0)
+    try:
+        fd = os.open(path, os.O_RDONLY | direct)
+    except OSError:
+        direct, fd = 0, os.open(path, os.O_RDONLY)
+    buffer = mmap.mmap(-1, 4096)
+    try:
+        reads, deadline = 0, time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            offset = random.randrange(size_mb * 256) * 4096
+            os.preadv(fd, [buffer], offset)
+            # Without O_DIRECT (ex. tmpfs) evict each page so repeated offsets are not served from memory
+            if not direct:
+                drop_cache(fd, offset, 4096)
+            reads += 1
+    finally:
+        os.close(fd)
+        buffer.close()
+    return reads / seconds
+
+def local_probe(directory, size_mb, seconds):
+    cores = os.cpu_count()
+    with multiprocessing.get_context("fork").Pool(cores) as pool:
+        all_cores = sum(pool.map(hash_rate, [seconds] * cores))
+    memory = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            key, value = line.split(":")
+            memory[key] = int(value.split()[0]) * 1024
+
+    path = os.path.join(directory, ".simplespark-probe")
+    block = os.urandom(1 << 20)
+    fd = os.open(path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+    try:
+        start = time.monotonic()
+        for _ in range(size_mb):
+            os.write(fd, block)
+        os.fsync(fd)
+        write_seconds = time.monotonic() - start
+        drop_cache(fd)
+    finally:
+        os.close(fd)
+
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        start = time.monotonic()
+        while os.read(fd, 1 << 20):
+            pass
+        read_seconds = time.monotonic() - start
+        drop_cache(fd)
+    finally:
+        os.close(fd)
+
+    try:
+        iops = random_iops(path, size_mb, seconds)
+    finally:
+        os.remove(path)
+
+    return {
+        "cores": cores,
+        "memory_bytes": memory.get("MemTotal"),
+        "cpu_single_mb_s": hash_rate(seconds),
+        "cpu_all_mb_s": all_cores,
+        "disk_write_mb_s": size_mb / write_seconds,
+        "disk_read_mb_s": size_mb / read_seconds,
+        "disk_random_iops": iops,
+    }
+
+def receive(port, seconds):
+    server = socket.create_server(("0.0.0.0", port))
+    server.settimeout(seconds + 30)
+    print(json.dumps({"listening": port}), flush=True)
+    connection, _ = server.accept()
+    received, start = 0, time.monotonic()
+    while True:
+        data = connection.recv(1 << 20)
+        if not data:
+            break
+        received += len(data)
+    return {"network_mb_s": received / (1 << 20) / (time.monotonic() - start)}
+
+def send(host, port, seconds):
+    connection = socket.create_connection((host, port), timeout=30)
+    block, deadline = os.urandom(1 << 20), time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        connection.sendall(block)
+    connection.close()
+    return {}
+
+mode, args = sys.argv[1], sys.argv[2:]
+if mode == "local":
+    result = local_probe(args[0], int(args[1]), float(args[2]))
+elif mode == "receive":
+    result = receive(int(args[0]), float(args[1]))
+else:
+    result = send(args[0], int(args[1]), float(args[2]))
+print(json.dumps(result), flush=True)
+'''
+
+# Metrics where higher is better, hosts below the fleet median by the threshold are flagged
+PROBE_METRICS = ["cpu_single_mb_s", "cpu_all_mb_s", "disk_write_mb_s", "disk_read_mb_s",
+                 "disk_random_iops", "network_mb_s"]
+
+
+class ProbeProcess:
+    """Probe script running on a host, locally or over SSH, with JSON results read line by line"""
+
+    def __init__(self, host: str, python: str, args: list[str], local: bool = False):
+
+        command = [python, "-", *args]
+        self.ssh = None
+
+        if local:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            stderr=subprocess.PIPE, text=True)
+            self.process.stdin.write(PROBE_SCRIPT)
+            self.process.stdin.close()
+            self.stdout, self.stderr = self.process.stdout, self.process.stderr
+        else:
+            self.ssh = SSHUtils(host)
+            stdin, self.stdout, self.stderr = self.ssh.run(shlex.join(command))
+            stdin.write(PROBE_SCRIPT)
+            stdin.channel.shutdown_write()
+
+    def read_json(self) -> dict:
+
+        line = self.stdout.readline()
+        if not line:
+            # Paramiko streams return bytes, the local subprocess returns text
+            error = self.stderr.read()
+            if isinstance(error, bytes):
+                error = error.decode(errors="replace")
+            raise Exception(f"Probe failed: {error.strip()}")
+
+        return json.loads(line)
+
+    def close(self):
+        if self.ssh is not None:
+            self.ssh.close()
+        else:
+            # Receivers may still be waiting on a sender that failed
+            if self.process.poll() is None:
+                self.process.terminate()
+            self.process.wait()
+            self.process.stdout.close()
+            self.process.stderr.close()
+
+
+def probe_host(host: str, python: str, directory: str, local: bool, size_mb: int = 256,
+               seconds: float = 2.0) -> dict:
+
+    process = ProbeProcess(host, python, ["local", directory, str(size_mb), str(seconds)], local)
+    try:
+        return process.read_json()
+    finally:
+        process.close()
+
+
+def probe_network_ring(hosts: list[str], python: str, local_hosts: set[str], port: int = 7399,
+                       seconds: float = 5.0) -> dict[str, dict]:
+    """Every host sends to the next host in the ring at the same time, throughput is measured by receivers"""
+
+    if len(hosts) < 2:
+        return {}
+
+    receivers = {h: ProbeProcess(h, python, ["receive", str(port), str(seconds)], h in local_hosts) for h in hosts}
+    senders = []
+    try:
+        for receiver in receivers.values():
+            receiver.read_json()
+
+        for i, host in enumerate(hosts):
+            target = hosts[(i + 1) % len(hosts)]
+            senders.append(ProbeProcess(host, python, ["send", target, str(port), str(seconds)], host in local_hosts))
+
+        return {h: receiver.read_json() for h, receiver in receivers.items()}
+    finally:
+        for process in senders + list(receivers.values()):
+            process.close()
+
+
+def run_probe(hosts: list[str], python: str, directories: dict[str, str], local_hosts: set[str],
+              size_mb: int = 256, seconds: float = 2.0) -> dict[str, dict]:
+    """CPU and disk probes on all hosts concurrently, followed by the network ring"""
+
+    def probe(host: str) -> dict:
+        try:
+            return probe_host(host, python, directories[host], host in local_hosts, size_mb, seconds)
+        except Exception as e:
+            print(f"Probe failed on {host}: {e}")
+            return {}
+
+    with ThreadPoolExecutor(max_workers=min(len(hosts), 32) or 1) as executor:
+        results = dict(zip(hosts, executor.map(probe, hosts)))
+
+    try:
+        for host, network in probe_network_ring(hosts, python, local_hosts, seconds=seconds * 2).items():
+            results[host].update(network)
+    except Exception as e:
+        print(f"Network probe failed: {e}")
+
+    timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    for result in results.values():
+        result["probed_at"] = timestamp
+
+    return results
+
+
+def find_outliers(results: dict[str, dict], threshold: float = 0.3) -> dict[str, list[str]]:
+    """Metrics per host that fall more than `threshold` below the fleet median"""
+
+    outliers = {}
+
+    for metric in PROBE_METRICS:
+        values = {h: r[metric] for h, r in results.items() if r.get(metric) is not None}
+        if len(values) < 2:
+            continue
+        median = statistics.median(values.values())
+        for host, value in values.items():
+            if value < median * (1 - threshold):
+                outliers.setdefault(host, []).append(metric)
+
+    return outliers
+
+
+def format_probe_table(results: dict[str, dict], outliers: dict[str, list[str]]) -> str:
+
+    lines = [f"{'HOST':24}  {'CORES':>5}  {'CPU1':>7}  {'CPU*':>8}  {'WRITE':>7}  {'READ':>7}  "
+             f"{'IOPS':>7}  {'NET':>7}  OUTLIER"]
+
+    for host, r in results.items():
+        values = [r.get(m) for m in PROBE_METRICS]
+        cells = [f"{v:>7.0f}" if v is not None else f"{'-':>7}" for v in values]
+        lines.append(f"{host:24}  {r.get('cores', '-'):>5}  {cells[0]}  {cells[1]:>8}  {cells[2]}  {cells[3]}  "
+                     f"{cells[4]}  {cells[5]}  {','.join(outliers.get(host, [])) or '-'}")
+
+    return "\n".join(lines)
@@ -0,0 +1,130 @@
+from dataclasses import dataclass
+import json
+import sqlite3
+import statistics
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    environment TEXT NOT NULL,
+    job TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    code_hash TEXT,
+    config_hash TEXT,
+    wall_seconds REAL,
+    exit_code INTEGER,
+    app_id TEXT,
+    executor_run_time_ms INTEGER,
+    shuffle_bytes INTEGER,
+    metrics TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_job ON runs (environment, job, id);
+"""
+
+
+@dataclass
+class RunRecord:
+    environment: str
+    job: str
+    started_at: str
+    code_hash: str = None
+    config_hash: str = None
+    wall_seconds: float = None
+    exit_code: int = None
+    app_id: str = None
+    executor_run_time_ms: int = None
+    shuffle_bytes: int = None
+    metrics: dict = None
+    id: int = None
+
+
+@dataclass
+class Regression:
+    job: str
+    metric: str
+    baseline: float
+    latest: float
+    run_id: int
+
+    @property
+    def change(self) -> float:
+        return (self.latest - self.baseline) / self.baseline
+
+
+class RunStore:
+    """SQLite history of submitted jobs, one row per `spark-submit`"""
+
+    def __init__(self, database_path: str):
+        self.connection = sqlite3.connect(database_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, record: RunRecord) -> int:
+
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (environment, job, started_at, code_hash, config_hash, wall_seconds, exit_code, "
+                "app_id, executor_run_time_ms, shuffle_bytes, metrics) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (record.environment, record.job, record.started_at, record.code_hash, record.config_hash,
+                 record.wall_seconds, record.exit_code, record.app_id, record.executor_run_time_ms,
+                 record.shuffle_bytes, json.dumps(record.metrics) if record.metrics else None)
+            )
+
+        return cursor.lastrowid
+
+    @staticmethod
+    def _to_record(row: sqlite3.Row) -> RunRecord:
+        values = dict(row)
+        values["metrics"] = json.loads(values["metrics"]) if values["metrics"] else None
+        return RunRecord(**values)
+
+    def list_runs(self, environment: str, job: str = None, limit: int = 20) -> list[RunRecord]:
+
+        query = "SELECT * FROM runs WHERE environment = ?"
+        parameters = [environment]
+        if job is not None:
+            query += " AND job = ?"
+            parameters.append(job)
+        query += " ORDER BY id DESC LIMIT ?"
+        parameters.append(limit)
+
+        return [self._to_record(row) for row in self.connection.execute(query, parameters)]
+
+    def jobs(self, environment: str) -> list[str]:
+        rows = self.connection.execute("SELECT DISTINCT job FROM runs WHERE environment = ? ORDER BY job",
+                                       (environment,))
+        return [row["job"] for row in rows]
+
+    def find_regressions(self, environment: str, threshold: float, baseline_runs: int = 5,
+                         job: str = None) -> list[Regression]:
+        """
+        Compare latest successful run of each job against the median of its previous successful runs.
+
+        A metric regresses when it grew by more than `threshold`, e.g. `0.2` for 20%.
+        """
+
+        regressions = []
+
+        for job_name in [job] if job else self.jobs(environment):
+
+            rows = self.connection.execute(
+                "SELECT * FROM runs WHERE environment = ? AND job = ? AND exit_code = 0 ORDER BY id DESC LIMIT ?",
+                (environment, job_name, baseline_runs + 1)
+            ).fetchall()
+            if len(rows) < 2:
+                continue
+
+            latest, previous = rows[0], rows[1:]
+            for metric in ("wall_seconds", "executor_run_time_ms", "shuffle_bytes"):
+                values = [r[metric] for r in previous if r[metric] is not None]
+                if latest[metric] is None or not values:
+                    continue
+                baseline = statistics.median(values)
+                if baseline > 0 and latest[metric] > baseline * (1 + threshold):
+                    regressions.append(Regression(job_name, metric, baseline, latest[metric], latest["id"]))
+
+        return regressions
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+import hashlib
 import os
 import pathlib
 import shutil
@@ -32,43 +33,66 @@ class ShellManager:
 
 
     def run_command(self, command: str) -> CommandReturn:
+        """Run command inside the activated environment, streaming output while it runs"""
+
+        activate = f". {self.config.activate_script_path}; "
+        output = []
 
         if self.config.mode == 'local':
-            result = subprocess.Popen(command, text=True)
-            return_code = result.returncode
-            stdout = result.stdout.read()
-            stderr = result.stderr.read()
+            process = subprocess.Popen(activate + command, shell=True, text=True,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            for line in process.stdout:
+                print(line, end='')
+                output.append(line)
+            return_code = process.wait()
         else:
-            stdin, stdout, stderr = self.ssh.run(command)
-            return_code = 0 # TODO
-
+            stdin, stdout, stderr = self.ssh.run(f". {self.config.bash_profile_file}; {activate}{command}")
+            stdout.channel.set_combine_stderr(True)
+            for line in stdout:
+                print(line, end='')
+                output.append(line)
+            return_code = stdout.channel.recv_exit_status()
+
+        # stderr is merged into stdout to keep log lines in order
         return CommandReturn(
             command=command,
             returncode=return_code,
-            stdout=stdout,
-            stderr=stderr
+            stdout=''.join(output),
+            stderr=''
         )
 
-    def archive_and_copy(self, local_package_directory: str, package_destination: str):
+    def archive_and_copy(self, local_package_directory: str, package_destination: str) -> str:
+        """Zip code directory to destination, returns hash of file paths and contents (not zip timestamps)"""
 
         directory = pathlib.Path(local_package_directory)
         temp_archive = ".temp.zip"
+        code_hash = hashlib.sha256()
 
         with zipfile.ZipFile(temp_archive, mode="w") as archive:
 
-            for file_path in directory.rglob("*"):
+            for file_path in sorted(directory.rglob("*")):
                 archive.write(file_path, arcname = file_path.relative_to(directory))
+                if file_path.is_file():
+                    code_hash.update(str(file_path.relative_to(directory)).encode())
+                    code_hash.update(file_path.read_bytes())
+
+        self.copy_file(temp_archive, package_destination)
+        os.remove(temp_archive)
+
+        return code_hash.hexdigest()
+
+    def copy_file(self, local_path: str, destination: str):
 
         if self.config.mode == "local":
-            shutil.copy(temp_archive, package_destination)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.copy(local_path, destination)
         else:
-            self.ssh.copy(temp_archive, package_destination)
-
-        os.remove(temp_archive)
+            self.ssh.create_directory(os.path.dirname(destination))
+            self.ssh.copy(local_path, destination)
 
     def spark_submit_python(self, main_file: str, include_packages: str, application_arguments: str = '') -> CommandReturn:
 
-        spark_submit = f"""spark-submit --master spark://{self.config.driver.host}:7077 \
+        spark_submit = f"""{self.config.spark_home}/bin/spark-submit --master {self.config.spark_master} \
         --py-files={include_packages} \
         {main_file} \
         {application_arguments}
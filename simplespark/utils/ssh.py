@@ -1,4 +1,6 @@
 import os
+import tarfile
+import tempfile
 
 from paramiko.client import SSHClient
 
@@ -51,6 +53,35 @@ class SSHUtils:
                 # print(f'Copying {local_sub_path} to {remote_sub_path}')
                 self.copy(local_sub_path, remote_sub_path)
 
+    def copy_archive(self, local_archive: str, remote_directory: str):
+        """Copy `.tar.gz` archive to host and extract it into `remote_directory`"""
+
+        remote_archive = f"{remote_directory}/.{os.path.basename(local_archive)}"
+
+        self.run(f"mkdir -p {remote_directory}")[1].channel.recv_exit_status()
+        self.copy(local_archive, remote_archive)
+        stdin, stdout, stderr = self.run(f"tar -xzf {remote_archive} -C {remote_directory} && rm {remote_archive}")
+        if stdout.channel.recv_exit_status() != 0:
+            raise Exception(f"Failed to extract {remote_archive} on {self.host}: {stderr.read().decode()}")
+
+    def copy_directory_archive(self, local_path: str, remote_path: str):
+        """Copy directory as single compressed archive, much faster than per file SFTP for large trees"""
+
+        with tempfile.NamedTemporaryFile(suffix='.tar.gz') as archive_file:
+
+            with tarfile.open(archive_file.name, 'w:gz') as archive:
+                archive.add(local_path, arcname=os.path.basename(remote_path))
+
+            self.copy_archive(archive_file.name, os.path.dirname(remote_path))
+
+    def directory_exists(self, remote_path: str) -> bool:
+        stdin, stdout, stderr = self.run(f"test -d {remote_path}")
+        return stdout.channel.recv_exit_status() == 0
+
+    def file_exists(self, remote_path: str) -> bool:
+        stdin, stdout, stderr = self.run(f"test -f {remote_path}")
+        return stdout.channel.recv_exit_status() == 0
+
     def exists(self, remote_path: str) -> bool:
 
         path_parts = remote_path.split('/')
@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import os
+import re
+import statistics
+import subprocess
+import tempfile
+import time
+
+
+# Beeline reports server side statement time as `N rows selected (0.123 seconds)`
+STATEMENT_TIME_PATTERN = re.compile(r"\((\d+(?:\.\d+)?) seconds\)")
+
+
+@dataclass
+class BenchResult:
+    concurrency: int
+    queries: int
+    failures: int
+    wall_seconds: float
+    latencies: list[float]
+
+    @property
+    def throughput(self) -> float:
+        return self.queries / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+    def percentile(self, p: float) -> float:
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> str:
+
+        lines = [
+            f"Concurrency: {self.concurrency}",
+            f"Queries: {self.queries} ({self.failures} failed sessions)",
+            f"Wall time: {self.wall_seconds:.2f}s",
+            f"Throughput: {self.throughput:.2f} queries/s",
+        ]
+        if self.latencies:
+            lines.extend([
+                f"Latency min: {min(self.latencies):.3f}s",
+                f"Latency p50: {statistics.median(self.latencies):.3f}s",
+                f"Latency p95: {self.percentile(95):.3f}s",
+                f"Latency p99: {self.percentile(99):.3f}s",
+                f"Latency max: {max(self.latencies):.3f}s",
+            ])
+
+        return "\n".join(lines)
+
+
+def run_session(beeline_path: str, jdbc_url: str, query: str, iterations: int) -> list[float] | None:
+    """Run `query` repeatedly in a single Beeline session, returns per query latencies or `None` on failure"""
+
+    statement = query.strip().rstrip(';') + ';\n'
+
+    with tempfile.NamedTemporaryFile('w', suffix='.sql', delete=False) as script:
+        script.write(statement * iterations)
+
+    try:
+        result = subprocess.run(
+            [beeline_path, "-u", jdbc_url, "--silent=false", "--outputformat=tsv2",
+             "--showHeader=false", "--incremental=true", "-f", script.name],
+            capture_output=True, text=True
+        )
+    finally:
+        os.remove(script.name)
+
+    if result.returncode != 0:
+        print(result.stderr)
+        return None
+
+    return [float(t) for t in STATEMENT_TIME_PATTERN.findall(result.stdout + result.stderr)]
+
+
+def run_bench(beeline_path: str, jdbc_urls: list[str], query: str, iterations: int) -> BenchResult:
+    """Run one concurrent Beeline session per JDBC URL"""
+
+    concurrency = len(jdbc_urls)
+    start_time = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        sessions = list(executor.map(
+            lambda jdbc_url: run_session(beeline_path, jdbc_url, query, iterations), jdbc_urls
+        ))
+
+    wall_seconds = time.monotonic() - start_time
+
+    latencies = [latency for session in sessions if session for latency in session]
+
+    return BenchResult(
+        concurrency=concurrency,
+        queries=len(latencies),
+        failures=len([s for s in sessions if s is None]),
+        wall_seconds=wall_seconds,
+        latencies=latencies
+    )